@@ -1,53 +1,264 @@
+import time
+# Taken before anything else is imported so the startup timing includes imports
+STARTED = time.perf_counter()
 import sys
-import json
 import os
-import csv
-import subprocess
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QTextEdit, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QComboBox, QTabWidget, QFileDialog, QAbstractItemView
+import html
+import datetime
+import threading
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QTextEdit, QPushButton, QTableView, QHeaderView, QComboBox, QTabWidget, QFileDialog, QAbstractItemView, QStyle, QStyleOptionButton, QProgressDialog, QDialog, QTableWidget, QTableWidgetItem, QGroupBox, QGridLayout, QDateEdit, QSpinBox, QSplitter, QTreeWidget, QTreeWidgetItem, QCheckBox
 from PyQt5.QtGui import QFont, QPalette, QColor, QPixmap
-from PyQt5.QtCore import Qt
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from PyQt5.QtWidgets import QStyledItemDelegate, QMessageBox
-
-def install_dependencies():
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
-    except subprocess.CalledProcessError:
-        print("Failed to install required dependencies.")
-        sys.exit(1)
-
-def check_dependencies():
-    try:
-        import PyQt5
-        import reportlab
-    except ImportError:
-        return False
-    return True
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QObject, QThread, QThreadPool, QTimer, QDate, QDateTime, pyqtSignal
+from PyQt5.QtWidgets import QAbstractItemDelegate, QStyledItemDelegate, QMessageBox
+from leads_db import (
+    LEAD_STATUSES, JOB_TYPES, CHOICE_FIELDS, FIELD_DEFAULTS, LEAD_ID, LEAD_FIELDS, LEAD_VERSION, Lead,
+    TaskCancelled, open_leads_store, write_leads_csv, write_leads_pdf, write_leads_txt,
+    import_leads_csv, LeadsIndex, DuplicateIndex, build_lead_indexes, merge_lead_fields,
+    SortKeys, load_sort_keys, PipelineStats, load_pipeline_stats, instrumentation, instrumented,
+    NotesIndex, notes_match, notes_snippet, rank_notes, NOTES_MATCH_START, NOTES_MATCH_END,
+    AreaIndex, load_area_index, OPEN_STATUSES, VISIT_BATCH_SIZE,
+    FOLLOW_UP_FIELD, FollowUpQueue, load_follow_up_queue, normalize_follow_up, follow_up_key, follow_ups_due_by,
+)
+
+# Columns shown in the leads table, in display order. "Actions" has no backing field.
+TABLE_COLUMNS = ["Lead Status", "Follow Up", "First Name", "Last Name", "Address Line 1", "Address Line 2", "City", "State", "Zip", "Phone", "Email", "Notes", "Job Type", "Referred By", "Referred To", "Actions"]
+ACTIONS_COLUMN = TABLE_COLUMNS.index("Actions")
+# Columns edited with a dropdown rather than free text
+COMBO_COLUMNS = CHOICE_FIELDS
+
+# Sorted columns remembered as tie-breakers when the order has to be rebuilt
+SORT_COLUMNS_KEPT = 3
+
+# Row removals row_for_id allows for before it rebuilds its lookup
+ROWS_REMOVED_BEFORE_REBUILD = 1000
+
+# Item data role carrying a row's LEAD_ID
+LeadIdRole = Qt.UserRole + 1
+
+# Number of leads the table pulls from the store at a time
+LEADS_PAGE_SIZE = 500
+
+# How long inline edits wait for more edits before they are written together
+WRITE_BEHIND_DELAY_MS = 500
+
+# How often the table asks the store for changes other clients have made
+CHANGE_POLL_MS = 2000
+
+# How long the notes search waits for more typing before it searches
+NOTES_SEARCH_DELAY_MS = 250
+
+# How long the dashboard waits for more changes before redrawing its counts
+DASHBOARD_REFRESH_DELAY_MS = 300
+# Rows shown for the open-ended breakdowns (Referred By, City/State)
+DASHBOARD_ROWS = 100
+
+# Largest visit batch the area view offers
+MAX_VISIT_BATCH_SIZE = 50
+
+# How often the follow-up reminders check whether the next one is due
+REMINDER_CHECK_MS = 30 * 1000
+# Most due follow-ups the reminder window lists at once
+REMINDER_ROWS = 500
+
+# Most changes the history dialog lists for a date range, newest first
+HISTORY_ROWS = 1000
+# Days back the history dialog's date range starts
+HISTORY_DAYS = 7
+
+LOGO_PATH = "logo.png"
+LOGO_WIDTH = 150
+
+# Startup is expected to reach the first painted window within this many seconds
+STARTUP_TARGET_SECONDS = 1.0
+
+class StartupTimer:
+    # Records how long each startup phase takes. With LEADS_STARTUP_TIMING set
+    # the phases are printed once the window is first painted, with a warning
+    # when the total misses STARTUP_TARGET_SECONDS.
+    def __init__(self, started=None):
+        self.started = self.last = started or time.perf_counter()
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def total(self):
+        return self.last - self.started
+
+    def report(self, file=None):
+        file = file or sys.stderr
+        for phase, seconds in self.phases:
+            print(f"{phase:>12}: {seconds * 1000:7.1f} ms", file=file)
+        print(f"{'total':>12}: {self.total() * 1000:7.1f} ms", file=file)
+        if self.total() > STARTUP_TARGET_SECONDS:
+            print(f"Startup took longer than the {STARTUP_TARGET_SECONDS:.1f}s target", file=file)
+
+def load_logo(path=LOGO_PATH, width=LOGO_WIDTH):
+    # Smooth-scaling the full-size logo is slow, so the scaled copy is saved
+    # next to it and reused until the logo changes
+    if not os.path.exists(path):
+        return QPixmap()
+    cache_path = f"{os.path.splitext(path)[0]}.{width}px.png"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        pixmap = QPixmap(cache_path)
+        if not pixmap.isNull():
+            return pixmap
+    pixmap = QPixmap(path).scaledToWidth(width, Qt.SmoothTransformation)
+    # Saving can fail in a read-only install; the logo is then scaled on every launch
+    pixmap.save(cache_path)
+    return pixmap
+
+class Task(QObject):
+    # Runs func(store, *args, report_progress=..., is_cancelled=...) on one of
+    # the scheduler's pool threads against its own handle for the store.
+    # Signals arrive on the GUI thread; connect them before calling start().
+    progress = pyqtSignal(int, int)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self, scheduler, pool, func, *args):
+        super().__init__(scheduler)
+        self.scheduler = scheduler
+        self.pool = pool
+        self.func = func
+        self.args = args
+        self.cancel_requested = threading.Event()
+
+    def start(self):
+        self.pool.start(self.run)
+
+    def cancel(self):
+        self.cancel_requested.set()
+
+    def is_cancelled(self):
+        return self.cancel_requested.is_set()
+
+    def run(self):
+        handle = self.scheduler.store.for_worker_thread()
+        try:
+            result = self.func(handle, *self.args, report_progress=self.progress.emit, is_cancelled=self.is_cancelled)
+        except TaskCancelled:
+            self.cancelled.emit()
+        except Exception as error:
+            self.failed.emit(str(error))
+        else:
+            self.succeeded.emit(result)
+        finally:
+            if handle is not self.scheduler.store:
+                handle.close()
+            self.finished.emit()
+
+class TaskScheduler(QObject):
+    # Shared runner for everything too slow for the GUI thread. Tasks that only
+    # read the store (exports, index builds) run side by side on a thread pool.
+    # Tasks that write to it (imports) go through a one-thread pool, so they
+    # run one at a time in the order they were started.
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.pool = QThreadPool(self)
+        # Exports spend much of their time in file and SQLite I/O, so several
+        # can make progress together even on a single core
+        self.pool.setMaxThreadCount(max(4, QThread.idealThreadCount()))
+        self.write_pool = QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+        # Tasks created and not yet finished
+        self.tasks = []
+
+    def create_task(self, func, *args, writes=False):
+        task = Task(self, self.write_pool if writes else self.pool, func, *args)
+        self.tasks.append(task)
+        task.finished.connect(lambda: self.tasks.remove(task))
+        task.finished.connect(task.deleteLater)
+        return task
+
+    def shutdown(self):
+        # Cancels running tasks and waits for them, so the store can be closed
+        for task in self.tasks:
+            task.cancel()
+        self.pool.waitForDone()
+        self.write_pool.waitForDone()
+
+class WriteBehindQueue(QObject):
+    # Holds inline edits for a short while and writes them in one transaction.
+    # Repeated edits to the same lead and field collapse into the last value.
+    # Each lead is written against the version it was read at; edits a shared
+    # store refuses because another client got there first are sent out with
+    # conflicted.
+    conflicted = pyqtSignal(object)  # {lead id: {field: refused value}}
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.pending = {}
+        # The leads with pending edits, whose versions go with the write
+        self.leads = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(WRITE_BEHIND_DELAY_MS)
+        self.timer.timeout.connect(self.flush)
+
+    def queue(self, lead, field, value):
+        # Re-inserting moves the key to the end, so writes keep edit order
+        lead_id = lead[LEAD_ID]
+        self.pending.pop((lead_id, field), None)
+        self.pending[(lead_id, field)] = value
+        self.leads[lead_id] = lead
+        self.timer.start()
+
+    def discard_lead(self, lead_id):
+        for key in [key for key in self.pending if key[0] == lead_id]:
+            del self.pending[key]
+        self.leads.pop(lead_id, None)
+
+    def flush(self):
+        self.timer.stop()
+        if not self.pending:
+            return
+        changes = [(lead_id, field, value) for (lead_id, field), value in self.pending.items()]
+        pending, leads = self.pending, self.leads
+        self.pending, self.leads = {}, {}
+        versions = {lead_id: lead.get(LEAD_VERSION) for lead_id, lead in leads.items()}
+        instrumentation.count("writes flushed", len(changes))
+        refused = instrumentation.call("flush_writes", self.store.update_leads, changes, versions)
+        for lead_id, lead in leads.items():
+            if lead_id not in refused and versions[lead_id] is not None:
+                lead[LEAD_VERSION] = versions[lead_id] + 1
+        if refused:
+            conflicts = {lead_id: {} for lead_id in refused}
+            for (lead_id, field), value in pending.items():
+                if lead_id in conflicts:
+                    conflicts[lead_id][field] = value
+            self.conflicted.emit(conflicts)
 
 class ContractorLeadsApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, startup_timer=None):
         super().__init__()
+        self.startup_timer = startup_timer or StartupTimer()
         self.setWindowTitle("Contractor Leads Database by REA")
         self.setGeometry(100, 100, 1600, 800)
 
-        if not check_dependencies():
-            install_dependencies()
-
         self.central_widget = QWidget(self)
         self.setCentralWidget(self.central_widget)
 
+        self.store = open_leads_store()
+        self.scheduler = TaskScheduler(self.store, self)
+        # Nothing is read up front; the table model fetches leads page by page as it scrolls
         self.leads = []
-        self.load_leads_data()
+        self.startup_timer.mark("open store")
 
         self.setup_ui()
 
     def setup_ui(self):
-        self.tabs = TabWidget(self, self.leads)
+        self.tabs = TabWidget(self, self.leads, self.store, self.scheduler)
+        self.startup_timer.mark("build tabs")
         self.logo_label = QLabel()
-        self.logo_pixmap = QPixmap("logo.png")
-        self.logo_pixmap = self.logo_pixmap.scaledToWidth(150, Qt.SmoothTransformation)
+        self.logo_pixmap = load_logo()
+        self.startup_timer.mark("load logo")
         self.logo_label.setPixmap(self.logo_pixmap)
         self.logo_label.setAlignment(Qt.AlignCenter)
 
@@ -56,8 +267,37 @@ class ContractorLeadsApp(QMainWindow):
         layout.addWidget(self.tabs)
         self.central_widget.setLayout(layout)
 
+        self.create_debug_menu()
         self.set_dark_theme()
 
+    def create_debug_menu(self):
+        # Instrumentation controls for diagnosing slowness reported from the field
+        debug_menu = self.menuBar().addMenu("Debug")
+        self.record_timings_action = debug_menu.addAction("Record Timings")
+        self.record_timings_action.setCheckable(True)
+        self.record_timings_action.setChecked(instrumentation.enabled)
+        self.record_timings_action.toggled.connect(self.set_recording_timings)
+        profile_menu = debug_menu.addMenu("Profile Next")
+        for name in sorted(instrumentation.operations):
+            profile_menu.addAction(name).triggered.connect(lambda checked, name=name: instrumentation.profile(name))
+        debug_menu.addAction("Show Timings...").triggered.connect(self.show_timings)
+        debug_menu.addAction("Reset Timings").triggered.connect(instrumentation.reset)
+
+    def set_recording_timings(self, enabled):
+        if enabled:
+            instrumentation.enable()
+        else:
+            instrumentation.disable()
+
+    def show_timings(self):
+        summary = instrumentation.summary()
+        if not summary:
+            QMessageBox.information(self, "Timings", "No timings recorded yet. Turn on Debug > Record Timings first.")
+            return
+        message_box = QMessageBox(QMessageBox.Information, "Timings", f"Timings are also written to {instrumentation.log_path}", QMessageBox.Ok, self)
+        message_box.setDetailedText("\n".join(summary))
+        message_box.exec_()
+
     def set_dark_theme(self):
         app = QApplication.instance()
         app.setStyle("Fusion")
@@ -83,45 +323,141 @@ class ContractorLeadsApp(QMainWindow):
         # Set the font for all widgets to improve readability
         app_font = QFont("Arial", 10)
         app.setFont(app_font)
+        self.startup_timer.mark("theme")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.startup_timer is not None:
+            # Runs once the event loop has painted the window
+            QTimer.singleShot(0, self.startup_finished)
+
+    def startup_finished(self):
+        if self.startup_timer is None:
+            return
+        self.startup_timer.mark("first paint")
+        if os.environ.get("LEADS_STARTUP_TIMING"):
+            self.startup_timer.report()
+        if instrumentation.enabled:
+            instrumentation.log("Startup " + ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in self.startup_timer.phases))
+        self.startup_timer = None
+        self.tabs.reminders.start()
 
     def closeEvent(self, event):
+        self.tabs.flush_writes()
+        self.tabs.stop_polling()
+        self.scheduler.shutdown()
         self.save_leads_data()
+        self.store.close()
+        if instrumentation.enabled:
+            instrumentation.log_summary()
         event.accept()
 
     def save_leads_data(self):
-        with open("leads_data.json", "w") as file:
-            json.dump(self.leads, file)
-
-    def load_leads_data(self):
-        if os.path.exists("leads_data.json"):
-            try:
-                with open("leads_data.json", "r") as file:
-                    self.leads = json.load(file)
-            except json.JSONDecodeError:
-                self.leads = []
-        else:
-            folder_path = os.path.dirname(os.path.abspath(__file__))
-            os.makedirs(folder_path, exist_ok=True)
-            self.leads = []
+        # Per-row backends have already written every change; the JSON backend saves here
+        self.store.save_leads()
 
 class TabWidget(QWidget):
-    def __init__(self, parent, leads_list):
+    def __init__(self, parent, leads_list, store, scheduler):
         super().__init__()
 
         self.leads_list = leads_list
+        self.store = store
+        self.scheduler = scheduler
 
         self.tabs = QTabWidget(self)
 
         self.contractor_input_tab = ContractorInputTab(self.leads_list, self)
-        self.leads_table_tab = LeadsTableTab(self.leads_list)  # Remove the second argument
+        # The table tab is built the first time it is shown or used, so startup
+        # doesn't wait on its model, indexes and delegates
+        self._leads_table_tab = None
+        self.leads_table_page = QWidget()
+        page_layout = QVBoxLayout()
+        page_layout.setContentsMargins(0, 0, 0, 0)
+        self.leads_table_page.setLayout(page_layout)
+        # Likewise the dashboard, which counts changes made through the table tab
+        self._dashboard_tab = None
+        self.dashboard_page = QWidget()
+        page_layout = QVBoxLayout()
+        page_layout.setContentsMargins(0, 0, 0, 0)
+        self.dashboard_page.setLayout(page_layout)
+        # And the visit batches, kept current the same way
+        self._area_batches_tab = None
+        self.area_batches_page = QWidget()
+        page_layout = QVBoxLayout()
+        page_layout.setContentsMargins(0, 0, 0, 0)
+        self.area_batches_page.setLayout(page_layout)
 
         self.tabs.addTab(self.contractor_input_tab, "Contractor Leads Input")
-        self.tabs.addTab(self.leads_table_tab, "Leads Table View")
+        self.tabs.addTab(self.leads_table_page, "Leads Table View")
+        self.tabs.addTab(self.dashboard_page, "Pipeline Dashboard")
+        self.tabs.addTab(self.area_batches_page, "Batch by Area")
+        self.tabs.currentChanged.connect(self.tab_changed)
+
+        # Follow-ups are watched from startup; ContractorLeadsApp starts them
+        # once the window is up
+        self.reminders = FollowUpReminders(self.scheduler, self)
+        self.reminders.due.connect(self.show_reminders)
+        self.reminder_dialog = None
 
         layout = QVBoxLayout()
         layout.addWidget(self.tabs)
         self.setLayout(layout)
 
+    @property
+    def leads_table_tab(self):
+        if self._leads_table_tab is None:
+            self._leads_table_tab = LeadsTableTab(self.leads_list, self.store, self.scheduler)
+            self.leads_table_page.layout().addWidget(self._leads_table_tab)
+            self.reminders.watch(self._leads_table_tab)
+        return self._leads_table_tab
+
+    @property
+    def dashboard_tab(self):
+        if self._dashboard_tab is None:
+            self._dashboard_tab = DashboardTab(self.leads_table_tab, self.scheduler)
+            self.dashboard_page.layout().addWidget(self._dashboard_tab)
+        return self._dashboard_tab
+
+    @property
+    def area_batches_tab(self):
+        if self._area_batches_tab is None:
+            self._area_batches_tab = AreaBatchesTab(self.leads_table_tab, self.scheduler)
+            self.area_batches_page.layout().addWidget(self._area_batches_tab)
+        return self._area_batches_tab
+
+    def tab_changed(self, index):
+        if self.tabs.widget(index) is self.leads_table_page:
+            self.leads_table_tab.show()
+        elif self.tabs.widget(index) is self.dashboard_page:
+            self.dashboard_tab.show()
+        elif self.tabs.widget(index) is self.area_batches_page:
+            self.area_batches_tab.show()
+
+    def flush_writes(self):
+        if self._leads_table_tab is not None:
+            self._leads_table_tab.model.writes.flush()
+
+    def stop_polling(self):
+        self.reminders.stop()
+        if self._leads_table_tab is not None:
+            self._leads_table_tab.model.poll_timer.stop()
+
+    def show_reminders(self, due):
+        # A closed reminder window starts over with the newly due follow-ups
+        if self.reminder_dialog is not None and not self.reminder_dialog.isVisible():
+            self.reminder_dialog.deleteLater()
+            self.reminder_dialog = None
+        if self.reminder_dialog is None:
+            self.reminder_dialog = ReminderDialog(self)
+        self.reminder_dialog.add_reminders(due)
+        self.reminder_dialog.show()
+        self.reminder_dialog.raise_()
+        QApplication.alert(self.window())
+
+    def show_due_today(self):
+        self.tabs.setCurrentWidget(self.leads_table_page)
+        self.leads_table_tab.due_filter.setChecked(True)
+
 class ContractorInputTab(QWidget):
     def __init__(self, leads_list, parent):
         super().__init__()
@@ -165,7 +501,11 @@ class ContractorInputTab(QWidget):
         
         self.job_type_label = QLabel("Job Type:")
         self.job_type_dropdown = QComboBox()
-        self.job_type_dropdown.addItems(["Residential", "Commercial", "Unknown"])
+        self.job_type_dropdown.addItems(JOB_TYPES)
+
+        self.follow_up_label = QLabel("Follow Up:")
+        self.follow_up_input = QLineEdit()
+        self.follow_up_input.setPlaceholderText("YYYY-MM-DD or YYYY-MM-DD HH:MM (optional)")
         
         self.submit_button = QPushButton("Submit")
         self.submit_button.clicked.connect(self.add_lead)
@@ -195,10 +535,13 @@ class ContractorInputTab(QWidget):
         layout.addWidget(self.referred_by_input)
         layout.addWidget(self.job_type_label)
         layout.addWidget(self.job_type_dropdown)
+        layout.addWidget(self.follow_up_label)
+        layout.addWidget(self.follow_up_input)
         layout.addWidget(self.submit_button)
 
         self.setLayout(layout)
 
+    @instrumented("submit_lead")
     def add_lead(self):
         # Get the values from input fields
         first_name = self.first_name_input.text()
@@ -213,80 +556,13 @@ class ContractorInputTab(QWidget):
         notes = self.notes_input.toPlainText()
         referred_by = self.referred_by_input.text()
         job_type = self.job_type_dropdown.currentText()
+        try:
+            follow_up = normalize_follow_up(self.follow_up_input.text())
+        except ValueError as error:
+            QMessageBox.warning(self, "Invalid Follow Up", str(error))
+            return
 
-        # Create the widgets here
-        status_combo = QComboBox()
-        status_combo.addItems(["In System", "Good Lead", "Contact Later", "Bad Lead", "Passed Along", "Closed"])
-        status_combo.setCurrentText("In System")
-        status_combo.currentTextChanged.connect(self.status_changed)
-
-        first_name_item = QLineEdit(first_name)
-        first_name_item.editingFinished.connect(lambda: self.name_changed(first_name_item.text()))
-
-        last_name_item = QLineEdit(last_name)
-        last_name_item.editingFinished.connect(lambda: self.name_changed(last_name_item.text()))
-
-        address1_item = QLineEdit(address1)
-        address1_item.editingFinished.connect(lambda: self.address_changed(address1_item.text()))
-
-        address2_item = QLineEdit(address2)
-        address2_item.editingFinished.connect(lambda: self.address_changed(address2_item.text()))
-
-        city_state_zip_item = QLineEdit(f"{city}, {state}, {zip_code}")
-        city_state_zip_item.editingFinished.connect(lambda: self.address_changed(city_state_zip_item.text()))
-
-        phone_input = QLineEdit(phone)
-        phone_input.editingFinished.connect(lambda: self.phone_changed(phone_input.text()))
-
-        email_input = QLineEdit(email)
-        email_input.editingFinished.connect(lambda: self.email_changed(email_input.text()))
-
-        notes_input = QLineEdit(notes)
-        notes_input.editingFinished.connect(lambda: self.notes_changed(notes_input.text()))
-
-        job_type_combo = QComboBox()
-        job_type_combo.addItems(["Residential", "Commercial", "Unknown"])
-        job_type_combo.setCurrentText(job_type)
-        job_type_combo.currentTextChanged.connect(self.job_type_changed)
-
-        referred_by_input = QLineEdit(referred_by)
-        referred_by_input.editingFinished.connect(lambda: self.referred_by_changed(referred_by_input.text()))
-
-        delete_button = QPushButton("Delete")
-        delete_button.clicked.connect(self.delete_lead)
-
-        # Now add the widgets to the layout
-        layout = QVBoxLayout()
-        layout.addWidget(self.first_name_label)
-        layout.addWidget(self.first_name_input)
-        layout.addWidget(self.last_name_label)
-        layout.addWidget(self.last_name_input)
-        layout.addWidget(self.address1_label)
-        layout.addWidget(self.address1_input)
-        layout.addWidget(self.address2_label)
-        layout.addWidget(self.address2_input)
-        layout.addWidget(self.city_label)
-        layout.addWidget(self.city_input)
-        layout.addWidget(self.state_label)
-        layout.addWidget(self.state_input)
-        layout.addWidget(self.zip_label)
-        layout.addWidget(self.zip_input)
-        layout.addWidget(self.phone_label)
-        layout.addWidget(self.phone_input)
-        layout.addWidget(self.email_label)
-        layout.addWidget(self.email_input)
-        layout.addWidget(self.notes_label)
-        layout.addWidget(self.notes_input)
-        layout.addWidget(self.referred_by_label)
-        layout.addWidget(self.referred_by_input)
-        layout.addWidget(self.job_type_label)
-        layout.addWidget(self.job_type_dropdown)
-        layout.addWidget(self.submit_button)  # Move this line to the correct position
-
-        self.setLayout(layout)
-
-        # Append the lead data to the list
-        self.leads_list.append({
+        lead = Lead({
             "First Name": first_name,
             "Last Name": last_name,
             "Address Line 1": address1,
@@ -299,9 +575,29 @@ class ContractorInputTab(QWidget):
             "Notes": notes,
             "Referred By": referred_by,
             "Job Type": job_type,
-            "Lead Status": "In System"
+            "Lead Status": "In System",
+            "Follow Up": follow_up,
         })
 
+        # Warn before entering a contractor that is already in the database. The
+        # check waits for the duplicate index if it is still being built.
+        self.parent.leads_table_tab.when_indexed(lambda: self.confirm_and_add_lead(lead))
+
+    def confirm_and_add_lead(self, lead):
+        duplicates = self.parent.leads_table_tab.find_duplicates_of(lead)
+        if duplicates:
+            names = "\n".join(f"{other['First Name']} {other['Last Name']} ({other['Phone'] or other['Email'] or other['Zip']})" for other in duplicates[:5])
+            confirmation = QMessageBox.question(
+                self, "Possible Duplicate",
+                f"This lead looks like one already entered:\n{names}\n\nAdd it anyway?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+            )
+            if confirmation != QMessageBox.Yes:
+                return
+
+        # Append the lead data to the table, which inserts just this row
+        self.parent.leads_table_tab.model.append_lead(lead)
+
         # Clear input fields after adding the lead
         self.first_name_input.clear()
         self.last_name_input.clear()
@@ -315,38 +611,635 @@ class ContractorInputTab(QWidget):
         self.notes_input.clear()
         self.referred_by_input.clear()
         self.job_type_dropdown.setCurrentIndex(0)
+        self.follow_up_input.clear()
+
+
+class LeadsTableModel(QAbstractTableModel):
+    # Exposes leads_list to a QTableView. Cells are plain data; editors are only
+    # created by the delegate while a cell is being edited.
+    lead_added = pyqtSignal(object)  # lead
+    lead_updated = pyqtSignal(object, str, object)  # lead, field, old value
+    lead_removed = pyqtSignal(object)  # lead
+    # Edits the store refused because another client changed the lead first
+    write_conflicts = pyqtSignal(object)  # {lead id: {field: refused value}}
+    # Another client replaced the leads wholesale (an import), so reload everything
+    reload_needed = pyqtSignal()
+
+    def __init__(self, leads_list, store, parent=None):
+        super().__init__(parent)
+        self.leads_list = leads_list
+        self.store = store
+        self.edit_mode = False
+        # Inline edits reach the store through this queue; anything that reads
+        # the store back flushes it first
+        self.writes = WriteBehindQueue(store, self)
+        self.writes.conflicted.connect(self.writes_refused)
+        # Called with a newly added lead while an order is set; False hides it
+        self.accepts_lead = None
+        # The notes search in effect; Notes cells then show the matching part
+        self.notes_query = ""
+
+        # Leads carry a stable id from the store; remember where each one lives
+        self._rows_by_id = None
+        # Rows removed since _rows_by_id was built (see row_for_id)
+        self._rows_removed = 0
+        # leads_list holds the pages fetched so far. _order is the list of ids to
+        # show, or None to show every lead in id order.
+        self._total = self.store.count_leads()
+        self._order = None
+
+        # Other clients of a shared store are caught up with by polling its
+        # change log; only the leads they touched are fetched again
+        self.change_seq = self.store.latest_change()
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(CHANGE_POLL_MS)
+        self.poll_timer.timeout.connect(self.poll_changes)
+        self.poll_timer.start()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.leads_list)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(TABLE_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return TABLE_COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == LeadIdRole:
+            return self.leads_list[index.row()][LEAD_ID]
+        if column == ACTIONS_COLUMN:
+            return "Delete" if role == Qt.DisplayRole else None
+        if role in (Qt.DisplayRole, Qt.EditRole, Qt.ToolTipRole):
+            field = TABLE_COLUMNS[column]
+            value = self.leads_list[index.row()].get(field, FIELD_DEFAULTS.get(field, ""))
+            if field == "Notes" and self.notes_query and role != Qt.EditRole:
+                return self.notes_text(value, role)
+            return value
+        return None
+
+    def notes_text(self, notes, role):
+        # The cell shows the words around the match; the tooltip shows the
+        # whole note with every match in bold
+        if role == Qt.DisplayRole:
+            return notes_snippet(notes, self.notes_query).replace(NOTES_MATCH_START, "").replace(NOTES_MATCH_END, "")
+        text = html.escape(notes_snippet(notes, self.notes_query, words=None))
+        return "<qt>" + text.replace(NOTES_MATCH_START, "<b>").replace(NOTES_MATCH_END, "</b>") + "</qt>"
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if not index.isValid() or index.column() == ACTIONS_COLUMN:
+            return flags
+        # Dropdown columns are always editable, text columns only in edit mode
+        if TABLE_COLUMNS[index.column()] in COMBO_COLUMNS or self.edit_mode:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    @instrumented("edit_cell")
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() == ACTIONS_COLUMN:
+            return False
+        field = TABLE_COLUMNS[index.column()]
+        if field == FOLLOW_UP_FIELD:
+            # Kept in one sortable form; anything that isn't a date is dropped
+            try:
+                value = normalize_follow_up(value)
+            except ValueError:
+                return False
+        return self.update_lead(self.leads_list[index.row()][LEAD_ID], field, value)
+
+    def update_lead(self, lead_id, field, value):
+        # Edits one field of a lead, whether or not its row has been fetched yet
+        row = self.row_for_id(lead_id)
+        if row >= 0:
+            lead = self.leads_list[row]
+        else:
+            self.writes.flush()
+            found = self.store.fetch_leads_by_ids([lead_id])
+            if not found:
+                return False
+            lead = found[0]
+        if lead.get(field) == value:
+            return False
+        old_value = lead.get(field, FIELD_DEFAULTS.get(field, ""))
+        lead[field] = value
+        self.writes.queue(lead, field, value)
+        if row >= 0 and field in TABLE_COLUMNS:
+            index = self.index(row, TABLE_COLUMNS.index(field))
+            self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.lead_updated.emit(lead, field, old_value)
+        return True
+
+    def set_edit_mode(self, enabled):
+        self.edit_mode = enabled
+
+    def _row_limit(self):
+        return self._total if self._order is None else len(self._order)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and len(self.leads_list) < self._row_limit()
+
+    @instrumented("fetch_rows")
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        self.writes.flush()
+        first = len(self.leads_list)
+        if self._order is None:
+            after_id = self.leads_list[-1][LEAD_ID] if self.leads_list else 0
+            page = self.store.fetch_leads(after_id, LEADS_PAGE_SIZE)
+        else:
+            lead_ids = self._order[first:first + LEADS_PAGE_SIZE]
+            page = self.store.fetch_leads_by_ids(lead_ids)
+            if len(page) < len(lead_ids):
+                # Drop ids that were deleted from the store behind our back
+                found = {lead[LEAD_ID] for lead in page}
+                self._order[first:first + LEADS_PAGE_SIZE] = [lead_id for lead_id in lead_ids if lead_id in found]
+        if not page:
+            if self._order is None:
+                self._total = first
+            return
+        instrumentation.count("rows fetched", len(page))
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self.leads_list.extend(page)
+        if self._rows_by_id is not None:
+            for row, lead in enumerate(page, first):
+                self._rows_by_id[lead[LEAD_ID]] = row
+        self.endInsertRows()
+
+    def refresh(self):
+        # Drop the fetched pages and start again from the store
+        self.writes.flush()
+        instrumentation.count("rows rebuilt", len(self.leads_list))
+        self.beginResetModel()
+        del self.leads_list[:]
+        self._rows_by_id = None
+        self._total = self.store.count_leads()
+        self.endResetModel()
+
+    def set_order(self, lead_ids):
+        # Show only these leads, in this order; None goes back to every lead
+        instrumentation.count("rows rebuilt", len(self.leads_list))
+        self.beginResetModel()
+        del self.leads_list[:]
+        self._rows_by_id = None
+        self._order = None if lead_ids is None else list(lead_ids)
+        self.endResetModel()
+
+    def row_for_id(self, lead_id):
+        # Removing a row shifts every later row up one. Rather than rebuild the
+        # lookup on each removal, a lead's row may be up to _rows_removed
+        # ahead of where it is now, and is found with a short scan back.
+        if self._rows_by_id is None or self._rows_removed > ROWS_REMOVED_BEFORE_REBUILD:
+            self._rows_by_id = {lead[LEAD_ID]: row for row, lead in enumerate(self.leads_list)}
+            self._rows_removed = 0
+        row = self._rows_by_id.get(lead_id, -1)
+        for row in range(min(row, len(self.leads_list) - 1), max(row - self._rows_removed, 0) - 1, -1):
+            if self.leads_list[row][LEAD_ID] == lead_id:
+                return row
+        return -1
+
+    @instrumented("add_lead")
+    def append_lead(self, lead):
+        self.store.add_lead(lead)
+        return self._insert_lead(lead)
+
+    def _insert_lead(self, lead):
+        # Shows a lead that is already in the store; new leads sort last
+        self._total += 1
+        self.lead_added.emit(lead)
+        if self._order is not None:
+            if self.accepts_lead is not None and not self.accepts_lead(lead):
+                return lead[LEAD_ID]
+            self._order.append(lead[LEAD_ID])
+        if len(self.leads_list) < self._row_limit() - 1:
+            # The lead sorts last, so it will arrive with the final page
+            return lead[LEAD_ID]
+        row = len(self.leads_list)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.leads_list.append(lead)
+        if self._rows_by_id is not None:
+            self._rows_by_id[lead[LEAD_ID]] = row
+        self.endInsertRows()
+        return lead[LEAD_ID]
+
+    @instrumented("delete_lead")
+    def remove_lead(self, lead_id):
+        self.writes.discard_lead(lead_id)
+        row = self.row_for_id(lead_id)
+        if row < 0:
+            # Not fetched yet, so there is no row to remove from the view
+            found = self.store.fetch_leads_by_ids([lead_id])
+            if not found:
+                return None
+            self.store.delete_lead(lead_id)
+            self._total -= 1
+            if self._order is not None and lead_id in self._order:
+                self._order.remove(lead_id)
+            self.lead_removed.emit(found[0])
+            return found[0]
+        self.store.delete_lead(lead_id)
+        lead = self._remove_row(row)
+        self.lead_removed.emit(lead)
+        return lead
+
+    def _remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        lead = self.leads_list.pop(row)
+        self._total -= 1
+        if self._order is not None:
+            del self._order[row]
+        # Rows after the removed one shift up; row_for_id allows for that
+        self._rows_by_id.pop(lead[LEAD_ID], None)
+        self._rows_removed += 1
+        self.endRemoveRows()
+        return lead
+
+    def _refresh_row(self, row, fresh, old_values=None):
+        # Copies a lead as the store has it now into its row, telling
+        # listeners about each field that really changed. A store that hands
+        # out the table's own leads (JSON) has already changed them in place,
+        # so their values from before the change come from old_values.
+        lead = self.leads_list[row]
+        logged = old_values if lead is fresh and old_values else {}
+        changed = []
+        for field in LEAD_FIELDS:
+            old_value = logged.get(field, lead.get(field, FIELD_DEFAULTS.get(field, "")))
+            value = fresh.get(field, FIELD_DEFAULTS.get(field, ""))
+            if value != old_value:
+                lead[field] = value
+                changed.append((field, old_value))
+        lead[LEAD_VERSION] = fresh.get(LEAD_VERSION)
+        if changed:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, ACTIONS_COLUMN - 1), [Qt.DisplayRole, Qt.EditRole])
+        for field, old_value in changed:
+            self.lead_updated.emit(lead, field, old_value)
+
+    def writes_refused(self, conflicts):
+        # Another client changed these leads first, and their version stands.
+        # Show what the store has now in place of the refused edits.
+        fresh = {lead[LEAD_ID]: lead for lead in self.store.fetch_leads_by_ids(list(conflicts))}
+        for lead_id, fields in conflicts.items():
+            row = self.row_for_id(lead_id)
+            lead = fresh.get(lead_id)
+            if lead is None and row >= 0:
+                self.lead_removed.emit(self._remove_row(row))
+            elif lead is None:
+                self._forget_lead(lead_id, Lead({LEAD_ID: lead_id}))
+            elif row >= 0:
+                self._refresh_row(row, lead)
+            else:
+                # Listeners last saw the refused values, so those are the old ones
+                for field, value in fields.items():
+                    self.lead_updated.emit(lead, field, value)
+        self.write_conflicts.emit(conflicts)
+
+    def _forget_lead(self, lead_id, lead):
+        # A lead that was deleted elsewhere before its row was fetched
+        self._total -= 1
+        if self._order is not None and lead_id in self._order:
+            self._order.remove(lead_id)
+        self.lead_removed.emit(lead)
+
+    def poll_changes(self):
+        seq, changes = self.store.changes_since(self.change_seq)
+        if seq == self.change_seq:
+            return
+        self.change_seq = seq
+        if changes is None:
+            self.reload_needed.emit()
+        elif changes:
+            # Pending edits to these leads are written, or refused, before the
+            # leads are read back
+            self.writes.flush()
+            self.apply_changes(changes)
+
+    @instrumented("apply_changes")
+    def apply_changes(self, changes):
+        # Catches up with other clients' adds, edits and deletes. Each lead
+        # they touched is fetched once, however many changes it had.
+        by_lead = {}
+        for lead_id, op, data in changes:
+            by_lead.setdefault(lead_id, []).append((op, data))
+        fresh = {lead[LEAD_ID]: lead for lead in self.store.fetch_leads_by_ids(list(by_lead))}
+        for lead_id, lead_changes in by_lead.items():
+            lead = fresh.get(lead_id)
+            row = self.row_for_id(lead_id)
+            added = lead_changes[0][0] == "add"
+            # The log holds each field's value from before the change
+            old_values = {}
+            for op, data in lead_changes:
+                for field, value in data.items():
+                    old_values.setdefault(field, value)
+            if lead is None and row >= 0:
+                self.lead_removed.emit(self._remove_row(row))
+            elif lead is None:
+                if not added:
+                    # The log keeps a deleted lead's last values
+                    self._forget_lead(lead_id, Lead(lead_changes[-1][1]))
+            elif row >= 0:
+                self._refresh_row(row, lead, old_values)
+            elif added:
+                self._insert_lead(lead)
+            else:
+                for field, value in old_values.items():
+                    if field in LEAD_FIELDS and lead.get(field) != value:
+                        self.lead_updated.emit(lead, field, value)
+
+
+class DuplicatesDialog(QDialog):
+    # Lists groups of likely duplicates, one lead per line, and merges the
+    # ticked leads of the selected group
+    def __init__(self, table_tab, groups):
+        super().__init__(table_tab)
+        self.setWindowTitle("Duplicate Leads")
+        self.resize(700, 400)
+        self.table_tab = table_tab
+
+        self.summary_label = QLabel()
+        self.groups_tree = QTreeWidget()
+        self.groups_tree.setHeaderLabels(["Lead", "Phone", "Email", "Address", "Zip"])
+        self.merge_button = QPushButton("Merge Selected")
+        self.merge_button.clicked.connect(self.merge_selected)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.accept)
+
+        for number, group in enumerate(groups, 1):
+            group_item = QTreeWidgetItem([f"Group {number}"])
+            for lead in table_tab.store.fetch_leads_by_ids(group):
+                item = QTreeWidgetItem([f"{lead['First Name']} {lead['Last Name']}", lead["Phone"], lead["Email"], lead["Address Line 1"], lead["Zip"]])
+                item.setData(0, Qt.UserRole, lead[LEAD_ID])
+                item.setCheckState(0, Qt.Checked)
+                group_item.addChild(item)
+            self.groups_tree.addTopLevelItem(group_item)
+            group_item.setExpanded(True)
+        self.update_summary()
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.merge_button)
+        button_layout.addWidget(self.close_button)
 
-        # Update the table view in the other tab
-        self.parent.leads_table_tab.populate_table()
+        layout = QVBoxLayout()
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.groups_tree)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def update_summary(self):
+        self.summary_label.setText(
+            f"{self.groups_tree.topLevelItemCount()} groups of possible duplicates. "
+            "Untick any lead that is not a duplicate; the oldest ticked lead is kept.")
+
+    def merge_selected(self):
+        item = self.groups_tree.currentItem()
+        if item is None:
+            return
+        group_item = item.parent() or item
+        members = [group_item.child(row) for row in range(group_item.childCount())]
+        lead_ids = [member.data(0, Qt.UserRole) for member in members if member.checkState(0) == Qt.Checked]
+        if len(lead_ids) < 2:
+            QMessageBox.information(self, "Merge Leads", "Tick at least two leads to merge.")
+            return
+        confirmation = QMessageBox.question(
+            self, "Merge Leads",
+            f"Merge {len(lead_ids)} leads into the oldest one? The others are deleted.",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if confirmation != QMessageBox.Yes or not self.table_tab.merge_duplicates(lead_ids):
+            return
+        self.groups_tree.takeTopLevelItem(self.groups_tree.indexOfTopLevelItem(group_item))
+        self.update_summary()
+
+
+class HistoryDialog(QDialog):
+    # One lead's timeline, oldest first, or every change between two dates
+    def __init__(self, table_tab, lead=None):
+        super().__init__(table_tab)
+        self.table_tab = table_tab
+        self.lead = lead
+        self.resize(800, 450)
+
+        self.from_date = QDateEdit(QDate.currentDate().addDays(-HISTORY_DAYS))
+        self.from_date.setCalendarPopup(True)
+        self.to_date = QDateEdit(QDate.currentDate())
+        self.to_date.setCalendarPopup(True)
+        self.show_button = QPushButton("Show")
+        self.show_button.clicked.connect(self.load)
+        self.summary_label = QLabel()
+        self.table = QTableWidget(0, 6)
+        self.table.setHorizontalHeaderLabels(["When", "Lead", "By", "Field", "Old Value", "New Value"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.accept)
+
+        range_layout = QHBoxLayout()
+        range_layout.addWidget(QLabel("From"))
+        range_layout.addWidget(self.from_date)
+        range_layout.addWidget(QLabel("To"))
+        range_layout.addWidget(self.to_date)
+        range_layout.addWidget(self.show_button)
+        range_layout.addStretch()
+
+        layout = QVBoxLayout()
+        if lead is None:
+            self.setWindowTitle("Lead History")
+            layout.addLayout(range_layout)
+        else:
+            self.setWindowTitle(f"History of {lead['First Name']} {lead['Last Name']}".strip())
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.table)
+        layout.addWidget(self.close_button, alignment=Qt.AlignRight)
+        self.setLayout(layout)
+        self.load()
+
+    def load(self):
+        store = self.table_tab.store
+        self.table_tab.model.writes.flush()
+        if self.lead is not None:
+            entries = store.lead_history(self.lead[LEAD_ID])
+            self.summary_label.setText(f"{len(entries)} changes")
+        else:
+            start = QDateTime(self.from_date.date()).toSecsSinceEpoch()
+            end = QDateTime(self.to_date.date().addDays(1)).toSecsSinceEpoch()
+            entries = store.history_between(start, end, HISTORY_ROWS, newest_first=True)
+            self.summary_label.setText(f"The latest {len(entries)} changes" if len(entries) == HISTORY_ROWS else f"{len(entries)} changes")
+        names = {lead[LEAD_ID]: f"{lead['First Name']} {lead['Last Name']}".strip()
+                 for lead in store.fetch_leads_by_ids(list({entry[1] for entry in entries}))}
+        self.table.setRowCount(len(entries))
+        for row, (when, lead_id, user, field, old, new) in enumerate(entries):
+            values = [QDateTime.fromSecsSinceEpoch(int(when)).toString("yyyy-MM-dd hh:mm:ss"),
+                      names.get(lead_id) or f"Lead {lead_id}", user, field,
+                      "(new lead)" if old is None else old, "(deleted)" if new is None else new]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(str(value)))
 
 
 class CustomDelegate(QStyledItemDelegate):
+    delete_requested = pyqtSignal(int)  # lead id
+
     def createEditor(self, parent, option, index):
+        instrumentation.count("widgets created")
+        field = TABLE_COLUMNS[index.column()]
+        if field in COMBO_COLUMNS:
+            editor = QComboBox(parent)
+            editor.addItems(COMBO_COLUMNS[field])
+            editor.activated.connect(lambda: self.commitData.emit(editor))
+            return editor
         editor = super().createEditor(parent, option, index)
         if isinstance(editor, QLineEdit):
             editor.editingFinished.connect(lambda: self.commitData.emit(editor))
-        elif isinstance(editor, QComboBox):
-            editor.currentIndexChanged.connect(lambda: self.commitData.emit(editor))
+            if field == FOLLOW_UP_FIELD:
+                editor.setPlaceholderText("YYYY-MM-DD HH:MM")
         return editor
-        
+
+    def setEditorData(self, editor, index):
+        if isinstance(editor, QComboBox):
+            editor.setCurrentText(index.data(Qt.EditRole))
+        else:
+            super().setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentText(), Qt.EditRole)
+        else:
+            super().setModelData(editor, model, index)
+
+    def paint(self, painter, option, index):
+        if index.column() != ACTIONS_COLUMN:
+            super().paint(painter, option, index)
+            return
+        # Draw the delete button instead of creating a QPushButton per row
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QStyle.State_Enabled
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if index.column() == ACTIONS_COLUMN:
+            if event.type() == QEvent.MouseButtonRelease and option.rect.contains(event.pos()):
+                self.delete_requested.emit(index.data(LeadIdRole))
+                return True
+            return False
+        return super().editorEvent(event, model, option, index)
+
+
 class LeadsTableTab(QWidget):
-    def __init__(self, leads_list):
+    # Emitted when leads changed in the store without going through the model, e.g. an import
+    leads_reloaded = pyqtSignal()
+
+    def __init__(self, leads_list, store, scheduler):
         super().__init__()
         self.edit_mode = False
 
         self.leads_list = leads_list
-
-        # Create the table with additional columns
-        self.table = QTableWidget(self)
-        self.table.setColumnCount(15)  # Adjusted column count
-        self.table.setHorizontalHeaderLabels(
-            ["Lead Status", "First Name", "Last Name", "Address Line 1", "Address Line 2", "City", "State", "Zip", "Phone", "Email", "Notes", "Job Type", "Referred By", "Referred To", "Actions"])  # Adjusted header labels
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.store = store
+        self.scheduler = scheduler
+        self.model = LeadsTableModel(self.leads_list, store, self)
+        self.model.write_conflicts.connect(self.show_write_conflicts)
+        self.model.reload_needed.connect(self.reload_leads)
+
+        # The search and duplicate indexes are built together on the scheduler
+        # the first time either is needed, then kept current from model edits
+        self.search_index = LeadsIndex()
+        self.duplicate_index = DuplicateIndex()
+        self.index_task = None
+        # Model changes made while the indexes are being built, replayed into them on arrival
+        self.index_events = []
+        # Callbacks waiting for the indexes
+        self.index_waiters = []
+
+        # Sort keys for the sorted columns, loaded on the scheduler the first
+        # time a column is sorted. sorted_ids holds every lead id in the current
+        # sort order; clicking a column stably re-sorts it by that column, so
+        # earlier sorts break ties. New leads go to the bottom until the next sort.
+        self.sort_keys = SortKeys()
+        self.sort_columns = []
+        self.sorted_ids = None
+        self.sort_task = None
+        self.sort_events = []
+        # Lead ids matching the search and filters, or None for every lead
+        self.filtered_ids = None
+        # Ids matching the notes search, best first, or None without one.
+        # The search runs on the scheduler once typing pauses; notes_query is
+        # the text the ranking is for.
+        self.notes_ranking = None
+        self.notes_query = ""
+        self.notes_task = None
+        self.notes_timer = QTimer(self)
+        self.notes_timer.setSingleShot(True)
+        self.notes_timer.setInterval(NOTES_SEARCH_DELAY_MS)
+        self.notes_timer.timeout.connect(self.search_notes)
+        # Ids with a follow-up due today or earlier, soonest first, or None
+        # unless Due Today is ticked
+        self.due_order = None
+        self.model.lead_added.connect(lambda lead: self.update_indexes("add_lead", lead))
+        self.model.lead_updated.connect(lambda lead, field, old: self.update_indexes("update_lead", lead, field, old))
+        self.model.lead_removed.connect(lambda lead: self.update_indexes("remove_lead", lead))
+        self.model.accepts_lead = self.lead_matches_filters
+
+        # Create the search and filter bar
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search name, email or phone")
+        self.status_filter = QComboBox()
+        self.status_filter.addItems(["All Statuses"] + LEAD_STATUSES)
+        self.job_type_filter = QComboBox()
+        self.job_type_filter.addItems(["All Job Types"] + JOB_TYPES)
+        self.area_filter = QLineEdit()
+        self.area_filter.setPlaceholderText("City, State or Zip")
+        self.referred_by_filter = QLineEdit()
+        self.referred_by_filter.setPlaceholderText("Referred By")
+        self.notes_filter = QLineEdit()
+        self.notes_filter.setPlaceholderText("Search notes")
+        self.due_filter = QCheckBox("Due Today")
+        self.due_filter.setToolTip("Only leads with a follow-up due today or overdue, soonest first")
+
+        self.search_input.textChanged.connect(self.apply_filters)
+        self.status_filter.currentIndexChanged.connect(self.apply_filters)
+        self.job_type_filter.currentIndexChanged.connect(self.apply_filters)
+        self.area_filter.textChanged.connect(self.apply_filters)
+        self.referred_by_filter.textChanged.connect(self.apply_filters)
+        self.notes_filter.textChanged.connect(lambda: self.notes_timer.start())
+        self.due_filter.toggled.connect(self.apply_filters)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.search_input, 2)
+        filter_layout.addWidget(self.status_filter)
+        filter_layout.addWidget(self.job_type_filter)
+        filter_layout.addWidget(self.area_filter)
+        filter_layout.addWidget(self.referred_by_filter)
+        filter_layout.addWidget(self.notes_filter, 2)
+        filter_layout.addWidget(self.due_filter)
+
+        # Create the table view; only visible rows are ever painted
+        self.table = QTableView(self)
+        self.table.setModel(self.model)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Stretch)
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.sortIndicatorChanged.connect(self.sort_by_column)
         self.table.setHorizontalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.table.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked | QAbstractItemView.EditKeyPressed)
 
-        # Apply custom delegate to handle editing of cell widgets
-        delegate = CustomDelegate()
-        self.table.setItemDelegate(delegate)
+        # Apply custom delegate to handle editing of cells
+        self.delegate = CustomDelegate(self.table)
+        self.delegate.delete_requested.connect(self.delete_lead)
+        self.delegate.closeEditor.connect(self.editor_closed)
+        self.table.setItemDelegate(self.delegate)
 
         # Create the refresh button
         self.refresh_button = QPushButton("Refresh")
@@ -360,6 +1253,18 @@ class LeadsTableTab(QWidget):
         self.export_txt_button = QPushButton("Export to TXT")
         self.export_txt_button.clicked.connect(self.export_to_txt)
 
+        # Create the import button
+        self.import_csv_button = QPushButton("Import from CSV")
+        self.import_csv_button.clicked.connect(self.import_from_csv)
+
+        # Create the duplicates button
+        self.duplicates_button = QPushButton("Find Duplicates")
+        self.duplicates_button.clicked.connect(self.show_duplicates)
+
+        # Create the history button; it shows the selected lead, or changes by date
+        self.history_button = QPushButton("Lead History")
+        self.history_button.clicked.connect(self.show_history)
+
         # Create the toggle edit mode button
         self.toggle_edit_button = QPushButton("Toggle Edit Mode")
         self.toggle_edit_button.clicked.connect(self.toggle_edit_mode)
@@ -373,6 +1278,9 @@ class LeadsTableTab(QWidget):
         self.export_csv_button.setFixedSize(button_width, button_height)
         self.export_pdf_button.setFixedSize(button_width, button_height)
         self.export_txt_button.setFixedSize(button_width, button_height)
+        self.import_csv_button.setFixedSize(button_width, button_height)
+        self.duplicates_button.setFixedSize(button_width, button_height)
+        self.history_button.setFixedSize(button_width, button_height)
         self.toggle_edit_button.setFixedSize(button_width, button_height)
 
         # Create a layout for the export buttons
@@ -385,222 +1293,411 @@ class LeadsTableTab(QWidget):
         button_layout = QVBoxLayout()
         button_layout.addWidget(self.refresh_button)
         button_layout.addLayout(export_button_layout)
+        button_layout.addWidget(self.import_csv_button)
+        button_layout.addWidget(self.duplicates_button)
+        button_layout.addWidget(self.history_button)
         button_layout.addWidget(self.toggle_edit_button)
         button_layout.setAlignment(Qt.AlignCenter)
 
         # Create the main layout for the tab
         layout = QVBoxLayout()
+        layout.addLayout(filter_layout)
         layout.addWidget(self.table)
         layout.addLayout(button_layout)
 
         self.setLayout(layout)
 
-        self.populate_table()
-
     def toggle_edit_mode(self):
         self.edit_mode = not getattr(self, "edit_mode", False)
-        
-        for row in range(self.table.rowCount()):
-            for col in range(1, self.table.columnCount() - 1):
-                item = self.table.cellWidget(row, col)
-                if isinstance(item, QLineEdit):
-                    item.setReadOnly(not self.edit_mode)
-        
+        self.model.set_edit_mode(self.edit_mode)
         self.toggle_edit_button.setText("Editing Enabled" if self.edit_mode else "Editing Disabled")
 
-    def createEditor(self, parent, option, index):
-        if not self.edit_mode:
-            QMessageBox.warning(self, "Editing Mode Off", "Editing must be enabled to edit cell data.")
-            return None
-
-        editor = super().createEditor(parent, option, index)
-        if isinstance(editor, QLineEdit):
-            editor.editingFinished.connect(lambda: self.commitData.emit(editor))
-        elif isinstance(editor, QComboBox):
-            editor.currentIndexChanged.connect(lambda: self.commitData.emit(editor))
-        return editor
-
+    @instrumented("populate_table")
     def populate_table(self):
-        self.table.setRowCount(len(self.leads_list))  # Clear existing rows
-        for row, lead in enumerate(self.leads_list):
-
-            
-            # Add all the widgets to a layout to create a single line in each cell
-            layout = QHBoxLayout()
-            layout.addWidget(status_combo)
-            layout.addWidget(first_name_item)
-            layout.addWidget(last_name_item)
-            layout.addWidget(address1_item)
-            layout.addWidget(address2_item)
-            layout.addWidget(city_state_zip_item)
-            layout.addWidget(phone_input)
-            layout.addWidget(email_input)
-            layout.addWidget(notes_input)
-            layout.addWidget(job_type_combo)
-            layout.addWidget(referred_by_input)
-            layout.addWidget(referred_to_input)
-            layout.addWidget(delete_button)
-
-            # Create a container widget and set the layout
-            container = QWidget()
-            container.setLayout(layout)
-
-            # Set the container widget as the cell widget
-            self.table.setCellWidget(row, 0, container)
-
-            # Status Combo Box
-            status_combo = QComboBox()
-            status_combo.addItems(["In System", "Good Lead", "Contact Later", "Bad Lead", "Passed Along", "Closed"])
-            current_status = lead.get("Lead Status", "In System")
-            status_combo.setCurrentText(current_status)
-            status_combo.currentTextChanged.connect(lambda text, r=row: self.status_changed(r, text))
-            self.table.setCellWidget(row, 0, status_combo)
-
-            # Split First Name and Last Name
-            name_parts = lead["First Name"].split()
-            first_name = name_parts[0] if name_parts else ""
-            last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-            first_name_item = QLineEdit(first_name)
-            last_name_item = QLineEdit(last_name)
-            first_name_item.editingFinished.connect(lambda r=row, input_field=first_name_item: self.input_field_changed(r, "First Name", input_field.text()))
-            last_name_item.editingFinished.connect(lambda r=row, input_field=last_name_item: self.input_field_changed(r, "Last Name", input_field.text()))
-            self.table.setCellWidget(row, 1, first_name_item)
-            self.table.setCellWidget(row, 2, last_name_item)
-
-            # Split Address
-            address_parts = [lead["Address Line 1"], lead["Address Line 2"], lead["City"], lead["State"], lead["Zip"]]
-            address1 = address_parts[0] if address_parts else ""
-            address2 = address_parts[1] if len(address_parts) > 1 else ""
-            city_state_zip = ", ".join(address_parts[2:]) if len(address_parts) > 2 else ""
-            address1_item = QLineEdit(address1)
-            address2_item = QLineEdit(address2)
-            city_state_zip_item = QLineEdit(city_state_zip)
-            address1_item.editingFinished.connect(lambda r=row, input_field=address1_item: self.input_field_changed(r, "Address Line 1", input_field.text()))
-            address2_item.editingFinished.connect(lambda r=row, input_field=address2_item: self.input_field_changed(r, "Address Line 2", input_field.text()))
-            city_state_zip_item.editingFinished.connect(lambda r=row, input_field=city_state_zip_item: self.input_field_changed(r, "City, State, Zip", input_field.text()))
-            self.table.setCellWidget(row, 3, address1_item)
-            self.table.setCellWidget(row, 4, address2_item)
-            self.table.setCellWidget(row, 5, city_state_zip_item)
-        
-            phone_input = QLineEdit(lead["Phone"])
-            phone_input.editingFinished.connect(lambda r=row, input_field=phone_input: self.input_field_changed(r, "Phone", input_field.text()))
-            self.table.setCellWidget(row, 6, phone_input)
-
-            email_input = QLineEdit(lead["Email"])
-            email_input.editingFinished.connect(lambda r=row, input_field=email_input: self.input_field_changed(r, "Email", input_field.text()))
-            self.table.setCellWidget(row, 7, email_input)
-            
-            # Notes
-            notes_input = QLineEdit(lead["Notes"])
-            self.table.setCellWidget(row, 8, notes_input)
-
-            #Type, Referred to/by
-            self.table.setItem(row, 9, QTableWidgetItem(lead["Job Type"]))
-            self.table.setItem(row, 10, QTableWidgetItem(lead["Referred By"]))
-            self.table.setItem(row, 11, QTableWidgetItem(lead.get("Referred To", "")))
-
-            # Job Type Combo Box
-            job_type_combo = QComboBox()
-            job_type_combo.addItems(["Residential", "Commercial", "Other"])
-            current_job_type = lead.get("Job Type", "Unknown")
-            job_type_combo.setCurrentText(current_job_type)
-            job_type_combo.currentTextChanged.connect(lambda text, r=row: self.job_type_changed(r, text))
-            self.table.setCellWidget(row, 12, job_type_combo)
-
-            # Referred By, Referred To
-            referred_by_input = QLineEdit(lead.get("Referred By", ""))
-            referred_by_input.textChanged.connect(lambda text, r=row: self.referred_by_changed(r, text))
-            self.table.setCellWidget(row, 13, referred_by_input)
-            referred_to_input = QLineEdit(lead.get("Referred To", ""))
-            referred_to_input.textChanged.connect(lambda text, r=row: self.referred_to_changed(r, text))
-            self.table.setCellWidget(row, 14, referred_to_input)
-
-            # Delete Button
-            delete_button = QPushButton("Delete")
-            delete_button.clicked.connect(lambda _, r=row: self.delete_lead(r))
-            self.table.setCellWidget(row, 15, delete_button)
-
-            # Connect input field changes to corresponding functions
-            referred_by_input.textChanged.connect(lambda text, r=row: self.input_field_changed(r, "Referred By", text))
-            referred_to_input.textChanged.connect(lambda text, r=row: self.input_field_changed(r, "Referred To", text))
-            
-    def input_field_changed(self, row, field_name, new_value):
-        self.leads_list[row][field_name] = new_value
-
-    def status_changed(self, row, text):
-        self.leads_list[row]["Lead Status"] = text
-
-    def name_changed(self, row, text):
-        self.leads_list[row]["Name"] = text
-        
-    def address_changed(self, row, text):
-        self.leads_list[row]["Address"] = text
-        
-    def phone_changed(self, row, text):
-        self.leads_list[row]["Phone"] = text
-        
-    def email_changed(self, row, text):
-        self.leads_list[row]["Email"] = text
-        
-    def notes_changed(self, row, text):
-        self.leads_list[row]["Notes"] = text
-        
-    def referred_by_changed(self, row, text):
-        self.leads_list[row]["Referred By"] = text
+        # The view pulls rows from the model on demand, so a refresh is just a reset
+        self.model.refresh()
+
+    def current_filters(self):
+        filters = {
+            "Area": self.area_filter.text(),
+            "Referred By": self.referred_by_filter.text(),
+        }
+        if self.status_filter.currentIndex() > 0:
+            filters["Lead Status"] = self.status_filter.currentText()
+        if self.job_type_filter.currentIndex() > 0:
+            filters["Job Type"] = self.job_type_filter.currentText()
+        return filters
+
+    @instrumented("update_indexes")
+    def update_indexes(self, method, *args):
+        if self.index_task is not None:
+            self.index_events.append((method, args))
+        if self.sort_task is not None:
+            self.sort_events.append((method, args))
+        getattr(self.search_index, method)(*args)
+        getattr(self.duplicate_index, method)(*args)
+        getattr(self.sort_keys, method)(*args)
+        if self.sorted_ids is not None:
+            # Another client's lead can already be in sort keys loaded after it was added
+            if method == "add_lead" and args[0][LEAD_ID] not in self.sorted_ids:
+                self.sorted_ids.append(args[0][LEAD_ID])
+            elif method == "remove_lead":
+                try:
+                    self.sorted_ids.remove(args[0][LEAD_ID])
+                except ValueError:
+                    pass
+
+    def build_indexes(self):
+        if self.index_task is not None:
+            return
+        self.index_events = []
+        task = self.index_task = self.run_task("Indexing leads...", build_lead_indexes)
+        task.succeeded.connect(lambda indexes: self.indexes_built(task, indexes))
+        task.finished.connect(lambda: self.index_build_ended(task))
+
+    def indexes_built(self, task, indexes):
+        if task is not self.index_task:
+            return
+        search_index, duplicate_index = indexes
+        for method, args in self.index_events:
+            getattr(search_index, method)(*args)
+            getattr(duplicate_index, method)(*args)
+        self.search_index, self.duplicate_index = search_index, duplicate_index
+        if self.filtering():
+            self.apply_filters()
+
+    def index_build_ended(self, task):
+        if task is not self.index_task:
+            return
+        self.index_task = None
+        self.index_events = []
+        waiters, self.index_waiters = self.index_waiters, []
+        for callback in waiters:
+            callback()
+
+    def when_indexed(self, callback):
+        # Calls callback now if the indexes are built, otherwise once the build
+        # ends. If the build failed or was cancelled the indexes are still unbuilt
+        # then, and duplicate checks find nothing.
+        if self.search_index.built and self.duplicate_index.built:
+            callback()
+            return
+        if callback not in self.index_waiters:
+            self.index_waiters.append(callback)
+        self.build_indexes()
+
+    def reset_indexes(self):
+        # Drops both indexes; the next search or duplicate check rebuilds them
+        if self.index_task is not None:
+            self.index_task.cancel()
+            self.index_task = None
+        self.search_index = LeadsIndex()
+        self.duplicate_index = DuplicateIndex()
+        if self.index_waiters:
+            self.build_indexes()
+
+    def reset_sort(self):
+        # Drops the sort keys and order but keeps the sorted columns, so the
+        # next show_leads loads fresh keys and sorts again
+        if self.sort_task is not None:
+            self.sort_task.cancel()
+            self.sort_task = None
+        self.sort_keys = SortKeys()
+        self.sorted_ids = None
+
+    def sort_by_column(self, column, order):
+        field = TABLE_COLUMNS[column] if 0 <= column < len(TABLE_COLUMNS) else None
+        if field not in LEAD_FIELDS:
+            self.show_sort_indicator()
+            return
+        column_sort = (field, order == Qt.DescendingOrder)
+        self.sort_columns = [column_sort] + [sort for sort in self.sort_columns if sort[0] != field][:SORT_COLUMNS_KEPT - 1]
+        self.sort_leads()
+
+    def show_sort_indicator(self):
+        header = self.table.horizontalHeader()
+        header.blockSignals(True)
+        if self.sort_columns:
+            field, descending = self.sort_columns[0]
+            header.setSortIndicator(TABLE_COLUMNS.index(field), Qt.DescendingOrder if descending else Qt.AscendingOrder)
+        else:
+            header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.blockSignals(False)
+
+    @instrumented("sort")
+    def sort_leads(self):
+        # Re-sorts sorted_ids by the newest sorted column, or by all of them if
+        # there is no order yet, then shows the result. Missing keys are loaded
+        # on the scheduler first and sort_leads runs again once they arrive.
+        columns = self.sort_columns if self.sorted_ids is None else self.sort_columns[:1]
+        missing = [field for field, descending in columns if field not in self.sort_keys.keys]
+        if missing:
+            self.load_sort_keys(missing)
+            return
+        lead_ids = self.sorted_ids
+        if lead_ids is None:
+            lead_ids = sorted(self.sort_keys.keys[columns[0][0]])
+        self.sorted_ids = self.sort_keys.sort(lead_ids, columns)
+        self.show_leads()
+
+    def load_sort_keys(self, fields):
+        if self.sort_task is not None:
+            return
+        self.sort_events = []
+        task = self.sort_task = self.run_task("Sorting leads...", load_sort_keys, fields)
+        task.succeeded.connect(lambda keys: self.sort_keys_loaded(task, keys))
+        task.finished.connect(lambda: self.sort_keys_load_ended(task))
+
+    def sort_keys_loaded(self, task, keys):
+        if task is not self.sort_task:
+            return
+        sort_keys = SortKeys()
+        sort_keys.keys = keys
+        for method, args in self.sort_events:
+            getattr(sort_keys, method)(*args)
+        self.sort_keys.keys.update(sort_keys.keys)
+
+    def sort_keys_load_ended(self, task):
+        if task is not self.sort_task:
+            return
+        self.sort_task = None
+        self.sort_events = []
+        columns = self.sort_columns if self.sorted_ids is None else self.sort_columns[:1]
+        if any(field not in self.sort_keys.keys for field, descending in columns):
+            # Cancelled or failed, so fall back to the order the leads were added in
+            self.sort_columns = []
+            self.sorted_ids = None
+            self.show_sort_indicator()
+            self.show_leads()
+        else:
+            self.sort_leads()
+
+    def show_leads(self):
+        # Shows the leads matching the search and filters in the current sort order
+        if self.sort_columns and self.sorted_ids is None:
+            # sort_leads calls back here once the order is rebuilt
+            self.sort_leads()
+            return
+        lead_ids = self.filtered_ids
+        ranking = self.notes_ranking if self.notes_ranking is not None else self.due_order
+        if self.sorted_ids is None and ranking is not None:
+            # Unless a column is sorted, notes matches show best first and
+            # due follow-ups soonest first
+            self.model.set_order([lead_id for lead_id in ranking if lead_id in lead_ids])
+        elif self.sorted_ids is None:
+            self.model.set_order(None if lead_ids is None else sorted(lead_ids))
+        elif lead_ids is None:
+            self.model.set_order(self.sorted_ids)
+        else:
+            self.model.set_order([lead_id for lead_id in self.sorted_ids if lead_id in lead_ids])
+
+    def filtering(self):
+        return bool(self.search_index.search_terms(self.search_input.text()) or any(self.current_filters().values()))
+
+    @instrumented("apply_filters")
+    def apply_filters(self):
+        text, filters = self.search_input.text(), self.current_filters()
+        if not self.search_index.built and self.filtering():
+            # indexes_built filters again once the indexes arrive
+            self.build_indexes()
+            return
+        self.filtered_ids = self.search_index.query(text, filters)
+        # Uses the ranking from the last notes search, see search_notes
+        if self.notes_ranking is not None:
+            matches = set(self.notes_ranking)
+            self.filtered_ids = matches if self.filtered_ids is None else self.filtered_ids & matches
+        self.model.notes_query = self.notes_query
+        # Follow-ups are looked up in the store, which indexes the ones that are set
+        self.due_order = None
+        if self.due_filter.isChecked():
+            self.model.writes.flush()
+            self.due_order = [lead_id for follow_up, lead_id in self.store.follow_ups_due(follow_ups_due_by(datetime.date.today()))]
+            due = set(self.due_order)
+            self.filtered_ids = due if self.filtered_ids is None else self.filtered_ids & due
+        self.show_leads()
+
+    def search_notes(self):
+        # Searches the notes in the store, which keeps their full-text index,
+        # on the scheduler, then filters with the ranking it returns
+        self.notes_timer.stop()
+        if self.notes_task is not None:
+            self.notes_task.cancel()
+            self.notes_task = None
+        query = self.notes_filter.text()
+        if not NotesIndex.tokenize(query):
+            self.notes_ranking, self.notes_query = None, ""
+            self.apply_filters()
+            return
+        task = self.notes_task = self.run_task("Searching notes...", rank_notes, query)
+        task.succeeded.connect(lambda ranking: self.notes_searched(task, query, ranking))
+        task.finished.connect(lambda: self.notes_search_ended(task))
+
+    def notes_searched(self, task, query, ranking):
+        if task is not self.notes_task:
+            return
+        self.notes_ranking, self.notes_query = ranking, query
+        self.apply_filters()
+
+    def notes_search_ended(self, task):
+        if task is self.notes_task:
+            self.notes_task = None
+
+    def lead_matches_filters(self, lead):
+        if self.filtering() and not self.search_index.built:
+            # The lead is already in the store, so the indexes built for the
+            # search include it, and indexes_built filters again
+            self.build_indexes()
+            return False
+        follow_up = lead.get(FOLLOW_UP_FIELD) or ""
+        return (self.search_index.matches(lead[LEAD_ID], self.search_input.text(), self.current_filters())
+                and notes_match(lead.get("Notes", ""), self.notes_query)
+                and (not self.due_filter.isChecked() or "" < follow_up < follow_ups_due_by(datetime.date.today())))
 
-    def referred_to_changed(self, row, text):
-        self.leads_list[row]["Referred To"] = text
-        
     def export_to_csv(self):
         options = QFileDialog.Options()
         options |= QFileDialog.DontUseNativeDialog
         file_name, _ = QFileDialog.getSaveFileName(self, "Export to CSV", "", "CSV Files (*.csv);;All Files (*)", options=options)
         if file_name:
-            with open(file_name, "w", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                # Write the header
-                writer.writerow(["Name", "Address", "Phone", "Email", "Notes", "Job Type"])
-                # Write the data
-                for lead in self.leads_list:
-                    writer.writerow([lead["Name"], lead["Address"], lead["Phone"], lead["Email"], lead["Notes"], lead["Job Type"]])
+            self.run_task("Exporting to CSV...", write_leads_csv, file_name)
+
+    def import_from_csv(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_name, _ = QFileDialog.getOpenFileName(self, "Import from CSV", "", "CSV Files (*.csv);;All Files (*)", options=options)
+        if file_name:
+            rejects_file_name = os.path.splitext(file_name)[0] + "_rejects.csv"
+            task = self.run_task("Importing leads...", import_leads_csv, file_name, rejects_file_name, writes=True)
+            task.succeeded.connect(self.import_finished)
+            # Batches added before a failure stay in the store too
+            task.failed.connect(lambda error: self.reload_leads())
+
+    def find_duplicates_of(self, lead):
+        # Call through when_indexed so the duplicate index is built
+        self.model.writes.flush()
+        return self.duplicate_index.likely_duplicates(lead, self.store)
+
+    def show_duplicates(self):
+        self.when_indexed(self.open_duplicates_dialog)
+
+    def open_duplicates_dialog(self):
+        if self.duplicate_index.built:
+            self.model.writes.flush()
+            DuplicatesDialog(self, self.duplicate_index.duplicate_groups(self.store)).exec_()
+
+    def show_history(self):
+        index = self.table.currentIndex()
+        lead = self.model.leads_list[index.row()] if index.isValid() else None
+        HistoryDialog(self, lead).exec_()
+
+    def merge_duplicates(self, lead_ids):
+        # Keeps the oldest lead, fills its blanks from the others and deletes
+        # them, all in one store write; False if that was refused
+        self.model.writes.flush()
+        leads = self.store.fetch_leads_by_ids(sorted(lead_ids))
+        if len(leads) < 2:
+            return False
+        keep, others = leads[0], leads[1:]
+        changes = merge_lead_fields(keep, others)
+        # Taken first: the JSON store merges into the very lead objects the table holds
+        old_values = {field: keep.get(field, "") for field in changes}
+        versions = {lead[LEAD_ID]: lead.get(LEAD_VERSION) for lead in leads if lead.get(LEAD_VERSION) is not None}
+        if not self.store.merge_leads(keep[LEAD_ID], changes, [other[LEAD_ID] for other in others], versions):
+            QMessageBox.warning(self, "Merge Refused", "Another user changed or deleted one of these leads. Nothing was merged.")
+            self.model.poll_changes()
+            return False
+        # The store has the merge; catch the table and indexes up as they
+        # would with another client's changes
+        for other in others:
+            self.model.writes.discard_lead(other[LEAD_ID])
+        self.model.apply_changes([(keep[LEAD_ID], "update", old_values)]
+                                 + [(other[LEAD_ID], "delete", dict(other)) for other in others])
+        return True
+
+    def import_finished(self, result):
+        # Imported rows went straight to the store, so reload the table and indexes
+        self.reload_leads()
+        if result["cancelled"]:
+            title, message = "Import Cancelled", (
+                f"The import was cancelled. The {result['imported']} leads imported before then were kept, "
+                f"{result['rejected']} rows were rejected and the rest of the file was not read.")
+        else:
+            title, message = "Import Finished", f"Imported {result['imported']} leads, rejected {result['rejected']}."
+        if result["rejects_file"]:
+            message += f"\nRejected rows were written to {result['rejects_file']}"
+        QMessageBox.information(self, title, message)
+
+    def reload_leads(self):
+        self.reset_indexes()
+        self.reset_sort()
+        self.populate_table()
+        self.apply_filters()
+        if self.notes_ranking is not None:
+            # The ranking is from before the reload
+            self.search_notes()
+        self.leads_reloaded.emit()
+
+    def show_write_conflicts(self, conflicts):
+        # Not modal-blocking: conflicts are found inside flushes, which run
+        # from paints and fetches as well as from the edit timer
+        leads = {lead[LEAD_ID]: lead for lead in self.store.fetch_leads_by_ids(list(conflicts))}
+        details = []
+        for lead_id, fields in conflicts.items():
+            lead = leads.get(lead_id)
+            name = f"{lead['First Name']} {lead['Last Name']}".strip() if lead else "(deleted)"
+            details.append(f"{name or f'Lead {lead_id}'}: {', '.join(fields)}")
+        message_box = QMessageBox(
+            QMessageBox.Warning, "Edits Not Saved",
+            f"{len(conflicts)} lead(s) were changed by someone else before your edits were saved. "
+            "The table now shows their changes; make your edits again if they are still needed.",
+            QMessageBox.Ok, self)
+        message_box.setDetailedText("\n".join(details))
+        message_box.setAttribute(Qt.WA_DeleteOnClose)
+        message_box.open()
+
+    def editor_closed(self, editor, hint):
+        # Queued edits are written once the user stops editing. Tabbing on to
+        # the next cell keeps them queued, so a run of edits is one write.
+        if hint not in (QAbstractItemDelegate.EditNextItem, QAbstractItemDelegate.EditPreviousItem):
+            self.model.writes.flush()
+
+    def run_task(self, label, func, *args, writes=False):
+        # Runs func on the shared scheduler and shows its progress without
+        # blocking the window. Pass writes=True for tasks that change the store.
+        self.model.writes.flush()
+        task = self.scheduler.create_task(func, *args, writes=writes)
+        instrumentation.count("widgets created")
+        progress_dialog = QProgressDialog(label, "Cancel", 0, 0, self)
+        progress_dialog.setWindowModality(Qt.NonModal)
+        progress_dialog.setMinimumDuration(500)
+        progress_dialog.canceled.connect(task.cancel)
+        task.progress.connect(lambda done, total: (progress_dialog.setMaximum(total), progress_dialog.setValue(done)))
+        task.failed.connect(lambda error: QMessageBox.warning(self, "Task Failed", error))
+        task.finished.connect(progress_dialog.reset)
+        task.finished.connect(progress_dialog.deleteLater)
+        # Callers connect to the task after this returns, and a quick task can
+        # finish before they would if it started now
+        QTimer.singleShot(0, task.start)
+        return task
 
     def export_to_pdf(self):
         options = QFileDialog.Options()
         options |= QFileDialog.DontUseNativeDialog
         file_name, _ = QFileDialog.getSaveFileName(self, "Export to PDF", "", "PDF Files (*.pdf);;All Files (*)", options=options)
         if file_name:
-            doc = SimpleDocTemplate(file_name, pagesize=letter)
-            elements = []
-            data = [["Name", "Address", "Phone", "Email", "Notes", "Job Type"]]
-            for lead in self.leads_list:
-                data.append([lead["Name"], lead["Address"], lead["Phone"], lead["Email"], lead["Notes"], lead["Job Type"]])
-            t = Table(data)
-            t.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                                   ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                                   ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                                   ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                                   ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                                   ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                                   ('GRID', (0, 0), (-1, -1), 1, colors.black)]))
-            elements.append(t)
-            doc.build(elements)
+            # The status and job type chosen in the filter bar narrow the export
+            filters = self.current_filters()
+            statuses = [filters["Lead Status"]] if "Lead Status" in filters else None
+            job_types = [filters["Job Type"]] if "Job Type" in filters else None
+            self.run_task("Exporting to PDF...", write_leads_pdf, file_name, statuses, job_types)
 
     def export_to_txt(self):
         options = QFileDialog.Options()
         options |= QFileDialog.DontUseNativeDialog
         file_name, _ = QFileDialog.getSaveFileName(self, "Export to TXT", "", "Text Files (*.txt);;All Files (*)", options=options)
         if file_name:
-            with open(file_name, "w") as file:
-                for lead in self.leads_list:
-                    file.write(f"Name: {lead['Name']}\n")
-                    file.write(f"Address: {lead['Address']}\n")
-                    file.write(f"Phone: {lead['Phone']}\n")
-                    file.write(f"Email: {lead['Email']}\n")
-                    file.write(f"Notes: {lead['Notes']}\n")
-                    file.write(f"Job Type: {lead['Job Type']}\n")
-                    file.write("\n")
-
-    def delete_lead(self, row):
+            self.run_task("Exporting to TXT...", write_leads_txt, file_name)
+
+    def delete_lead(self, lead_id):
         confirmation = QMessageBox.question(
             self, "Confirm Deletion",
             "Are you sure you want to delete this lead?",
@@ -608,14 +1705,427 @@ class LeadsTableTab(QWidget):
         )
         
         if confirmation == QMessageBox.Yes:
-            del self.leads_list[row]
-            self.populate_table()  # Refresh the table
+            self.model.remove_lead(lead_id)
+
+
+class KeptCurrent(QObject):
+    # A summary of every lead (PipelineStats, AreaIndex, FollowUpQueue) that is
+    # loaded once on the scheduler and then kept current from the table
+    # model's change signals. value starts out unloaded, empty() makes the
+    # unloaded one a reload starts from, start_task() starts the task that
+    # loads one and is_wanted() says whether a reload should load straight
+    # away. Changes made while a load runs are replayed over its result. The
+    # summaries remember what each lead contributed, so replaying a change
+    # the load already saw is harmless.
+    loaded = pyqtSignal()
+    changed = pyqtSignal()
+    not_loaded = pyqtSignal()
+
+    def __init__(self, value, empty, start_task, is_wanted, parent=None):
+        super().__init__(parent)
+        self.value = value
+        self.empty = empty
+        self.start_task = start_task
+        self.is_wanted = is_wanted
+        self.task = None
+        # Model changes made while loading
+        self.events = []
+
+    def watch(self, table_tab):
+        model = table_tab.model
+        model.lead_added.connect(lambda lead: self.update("add_lead", lead))
+        model.lead_updated.connect(lambda lead, field, old: self.update("update_lead", lead, field, old))
+        model.lead_removed.connect(lambda lead: self.update("remove_lead", lead))
+        table_tab.leads_reloaded.connect(self.reload)
+
+    def load(self):
+        if self.task is not None:
+            return
+        self.events = []
+        task = self.task = self.start_task()
+        task.succeeded.connect(lambda value: self.value_loaded(task, value))
+        task.finished.connect(lambda: self.load_ended(task))
+
+    def value_loaded(self, task, value):
+        if task is not self.task:
+            return
+        for method, args in self.events:
+            getattr(value, method)(*args)
+        self.events = []
+        self.value = value
+
+    def load_ended(self, task):
+        if task is not self.task:
+            return
+        self.task = None
+        if self.value.built:
+            self.loaded.emit()
+        elif self.events and self.is_wanted() and not task.is_cancelled():
+            # Failed with changes pending; they may be what it tripped on
+            self.load()
+        else:
+            self.not_loaded.emit()
+
+    def reload(self):
+        self.cancel()
+        self.value = self.empty()
+        if self.is_wanted():
+            self.load()
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def update(self, method, *args):
+        if self.task is not None:
+            self.events.append((method, args))
+        if self.value.built:
+            getattr(self.value, method)(*args)
+            self.changed.emit()
+
+
+class DashboardTab(QWidget):
+    # Pipeline counts by Lead Status, Job Type, Referred By and City/State, with
+    # conversion rates per referral source. The counts are kept current by a
+    # KeptCurrent, so a redraw only sorts the handful of groups.
+    def __init__(self, table_tab, scheduler):
+        super().__init__()
+        self.table_tab = table_tab
+        self.scheduler = scheduler
+        self.stats = KeptCurrent(PipelineStats(), PipelineStats, self.start_load, self.isVisible, self)
+        self.stats.watch(table_tab)
+        self.stats.loaded.connect(self.refresh)
+        self.stats.changed.connect(self.schedule_refresh)
+        self.stats.not_loaded.connect(lambda: self.total_label.setText("Counts are not loaded."))
+
+        # Bursts of edits are drawn once, after they settle
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(DASHBOARD_REFRESH_DELAY_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+        self.total_label = QLabel()
+        self.status_table = self.create_table(["Lead Status", "Leads", "Share"])
+        self.job_type_table = self.create_table(["Job Type", "Leads", "Share"])
+        self.referral_table = self.create_table(["Referred By", "Leads", "Closed", "Conversion"])
+        self.area_table = self.create_table(["City/State", "Leads", "Share"])
+
+        grid = QGridLayout()
+        for position, (title, table) in enumerate((
+                ("By Lead Status", self.status_table), ("By Job Type", self.job_type_table),
+                ("Referral Sources", self.referral_table), ("By City/State", self.area_table))):
+            group_box = QGroupBox(title)
+            box_layout = QVBoxLayout()
+            box_layout.addWidget(table)
+            group_box.setLayout(box_layout)
+            grid.addWidget(group_box, position // 2, position % 2)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.total_label)
+        layout.addLayout(grid)
+        self.setLayout(layout)
+
+    def create_table(self, headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        return table
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.stats.value.built:
+            self.refresh()
+        else:
+            self.stats.load()
+
+    def start_load(self):
+        self.total_label.setText("Counting leads...")
+        return self.table_tab.run_task("Counting leads...", load_pipeline_stats)
+
+    def schedule_refresh(self):
+        if self.isVisible():
+            self.refresh_timer.start()
+
+    @instrumented("dashboard_refresh")
+    def refresh(self):
+        stats = self.stats.value
+        self.total_label.setText(f"{stats.total} leads")
+        share = lambda leads: f"{leads / stats.total:.1%}" if stats.total else ""
+        self.fill_table(self.status_table, [(group or "(blank)", leads, share(leads)) for group, leads in stats.breakdown("Lead Status")])
+        self.fill_table(self.job_type_table, [(group or "(blank)", leads, share(leads)) for group, leads in stats.breakdown("Job Type")])
+        self.fill_table(self.referral_table, [(source or "(none)", leads, converted, f"{rate:.1%}")
+                                              for source, leads, converted, rate in stats.conversion_rates()[:DASHBOARD_ROWS]])
+        self.fill_table(self.area_table, [(group or "(blank)", leads, share(leads)) for group, leads in stats.breakdown("City/State")[:DASHBOARD_ROWS]])
+
+    def fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, column, item)
+
+class AreaBatchesTab(QWidget):
+    # Open leads grouped by area into batches of site visits. Like the
+    # dashboard's counts, the AreaIndex is kept current by a KeptCurrent; it
+    # caches each area's batches, so a redraw or a new batch size only
+    # regroups what changed. Leads are read from the store only for the area
+    # being looked at.
+    BATCH_COLUMNS = ["Batch", "Name", "Address", "City", "Zip", "Phone", "Lead Status"]
+
+    def __init__(self, table_tab, scheduler):
+        super().__init__()
+        self.table_tab = table_tab
+        self.scheduler = scheduler
+        self.index = KeptCurrent(AreaIndex(), AreaIndex, self.start_load, self.isVisible, self)
+        self.index.watch(table_tab)
+        self.index.loaded.connect(self.index_loaded)
+        self.index.changed.connect(self.schedule_refresh)
+        self.index.not_loaded.connect(lambda: self.total_label.setText("Areas are not loaded."))
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(DASHBOARD_REFRESH_DELAY_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+        self.total_label = QLabel()
+        self.batch_size_input = QSpinBox()
+        self.batch_size_input.setRange(1, MAX_VISIT_BATCH_SIZE)
+        self.batch_size_input.setValue(VISIT_BATCH_SIZE)
+        self.batch_size_input.valueChanged.connect(self.batch_size_changed)
+
+        self.area_tree = QTreeWidget()
+        self.area_tree.setHeaderLabels(["Area", "Open Leads", "Batches"])
+        self.area_tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.area_tree.itemSelectionChanged.connect(self.show_area)
+
+        self.batch_table = QTableWidget(0, len(self.BATCH_COLUMNS))
+        self.batch_table.setHorizontalHeaderLabels(self.BATCH_COLUMNS)
+        self.batch_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.batch_table.verticalHeader().setVisible(False)
+        self.batch_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.total_label)
+        controls.addStretch()
+        controls.addWidget(QLabel("Visits per batch:"))
+        controls.addWidget(self.batch_size_input)
+
+        splitter = QSplitter(Qt.Horizontal)
+        splitter.addWidget(self.area_tree)
+        splitter.addWidget(self.batch_table)
+        splitter.setStretchFactor(1, 2)
+
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(splitter)
+        self.setLayout(layout)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.index.value.built:
+            self.refresh()
+        else:
+            self.index.load()
+
+    def start_load(self):
+        self.total_label.setText("Grouping leads...")
+        return self.table_tab.run_task("Grouping leads by area...", load_area_index)
+
+    def index_loaded(self):
+        self.index.value.set_batch_size(self.batch_size_input.value())
+        self.refresh()
+
+    def schedule_refresh(self):
+        if self.isVisible():
+            self.refresh_timer.start()
+
+    def batch_size_changed(self, batch_size):
+        self.index.value.set_batch_size(batch_size)
+        if self.index.value.built:
+            self.refresh()
+
+    def selected_area(self):
+        items = self.area_tree.selectedItems()
+        return items[0].data(0, Qt.UserRole) if items else None
+
+    @instrumented("area_batches_refresh")
+    def refresh(self):
+        index = self.index.value
+        selected = self.selected_area()
+        self.total_label.setText(f"{len(index.leads)} open leads ({', '.join(OPEN_STATUSES)}) in {len(index.areas)} areas")
+        self.area_tree.blockSignals(True)
+        self.area_tree.clear()
+        selected_item = None
+        for region, areas in index.regions():
+            region_item = QTreeWidgetItem([index.region_name(region), str(sum(leads for area, leads in areas)), ""])
+            for area, leads in areas:
+                item = QTreeWidgetItem([index.area_name(area), str(leads), str(len(index.batches(area)))])
+                item.setData(0, Qt.UserRole, area)
+                region_item.addChild(item)
+                if area == selected:
+                    selected_item = item
+            self.area_tree.addTopLevelItem(region_item)
+            region_item.setExpanded(True)
+        if selected_item is not None:
+            selected_item.setSelected(True)
+        self.area_tree.blockSignals(False)
+        self.show_area()
+
+    def show_area(self):
+        area = self.selected_area()
+        batches = self.index.value.batches(area) if area is not None else []
+        leads = {lead[LEAD_ID]: lead for lead in self.table_tab.store.fetch_leads_by_ids([lead_id for batch in batches for lead_id in batch])}
+        rows = []
+        for number, batch in enumerate(batches, 1):
+            for lead_id in batch:
+                lead = leads.get(lead_id)
+                if lead is None:
+                    continue
+                address = " ".join(part for part in (lead.get("Address Line 1", ""), lead.get("Address Line 2", "")) if part)
+                rows.append((f"Batch {number}", f"{lead.get('First Name', '')} {lead.get('Last Name', '')}".strip(), address,
+                             ", ".join(part for part in (lead.get("City", ""), lead.get("State", "")) if part),
+                             lead.get("Zip", ""), lead.get("Phone", ""), lead.get("Lead Status", "")))
+        self.batch_table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.batch_table.setItem(row, column, QTableWidgetItem(str(value)))
+
+class FollowUpReminders(QObject):
+    # Raises follow-ups as they come due. The FollowUpQueue is loaded once the
+    # window is up and kept current by a KeptCurrent, as the dashboard's
+    # counts are. Each tick only looks at the soonest pending follow-up,
+    # however many are waiting.
+    due = pyqtSignal(list)  # [(follow-up, lead id)], soonest first
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        # A reload keeps the follow-ups already raised
+        self.queue = KeptCurrent(FollowUpQueue(), lambda: FollowUpQueue(self.queue.value.raised), self.start_load, lambda: self.timer.isActive(), self)
+        self.queue.loaded.connect(self.check)
+        self.timer = QTimer(self)
+        self.timer.setInterval(REMINDER_CHECK_MS)
+        self.timer.timeout.connect(self.check)
+
+    def start(self):
+        self.timer.start()
+        self.queue.load()
+
+    def stop(self):
+        self.timer.stop()
+        self.queue.cancel()
+
+    def watch(self, table_tab):
+        self.queue.watch(table_tab)
+
+    def start_load(self):
+        # The worker gets its own copy of the follow-ups already raised
+        task = self.scheduler.create_task(load_follow_up_queue, dict(self.queue.value.raised))
+        QTimer.singleShot(0, task.start)
+        return task
+
+    @instrumented("follow_up_check")
+    def check(self):
+        if not self.queue.value.built:
+            return
+        due = self.queue.value.pop_due(follow_up_key(datetime.datetime.now()))
+        if due:
+            self.due.emit(due)
+
+class ReminderDialog(QDialog):
+    # Follow-ups that have come due. It stays open beside the main window, and
+    # follow-ups that come due while it is open are added to it.
+    COLUMNS = ["Follow Up", "Name", "Phone", "Lead Status", "Notes"]
+
+    def __init__(self, tabs):
+        super().__init__(tabs)
+        self.tabs = tabs
+        self.setWindowTitle("Follow-ups Due")
+        self.setWindowModality(Qt.NonModal)
+        self.resize(800, 400)
+        # Lead id of each row
+        self.lead_ids = []
+        # Due follow-ups left out once REMINDER_ROWS were listed
+        self.hidden = 0
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.more_label = QLabel()
+
+        snooze_button = QPushButton("Snooze Until Tomorrow")
+        snooze_button.clicked.connect(self.snooze)
+        done_button = QPushButton("Mark Done")
+        done_button.clicked.connect(self.mark_done)
+        due_today_button = QPushButton("Show Due Today")
+        due_today_button.clicked.connect(self.show_due_today)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.close)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(snooze_button)
+        button_layout.addWidget(done_button)
+        button_layout.addWidget(due_today_button)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addWidget(self.more_label)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def add_reminders(self, due):
+        due = [(follow_up, lead_id) for follow_up, lead_id in due if lead_id not in self.lead_ids]
+        shown = due[:max(0, REMINDER_ROWS - len(self.lead_ids))]
+        self.hidden += len(due) - len(shown)
+        leads = {lead[LEAD_ID]: lead for lead in self.tabs.store.fetch_leads_by_ids([lead_id for _, lead_id in shown])}
+        for follow_up, lead_id in shown:
+            lead = leads.get(lead_id)
+            if lead is None:
+                continue
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            values = [follow_up, f"{lead.get('First Name', '')} {lead.get('Last Name', '')}".strip(),
+                      lead.get("Phone", ""), lead.get("Lead Status", ""), lead.get("Notes", "")]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(str(value)))
+            self.lead_ids.append(lead_id)
+        self.more_label.setText(f"{self.hidden} more follow-ups are due; Show Due Today lists them all." if self.hidden else "")
+
+    def selected_rows(self):
+        return sorted({index.row() for index in self.table.selectionModel().selectedRows()}, reverse=True)
+
+    def set_follow_ups(self, value):
+        # Sets the follow-up of the selected leads and takes them off the list
+        model = self.tabs.leads_table_tab.model
+        for row in self.selected_rows():
+            model.update_lead(self.lead_ids[row], FOLLOW_UP_FIELD, value)
+            self.table.removeRow(row)
+            del self.lead_ids[row]
+
+    def snooze(self):
+        self.set_follow_ups((datetime.date.today() + datetime.timedelta(days=1)).isoformat())
+
+    def mark_done(self):
+        self.set_follow_ups("")
+
+    def show_due_today(self):
+        self.tabs.show_due_today()
 
-    def job_type_changed(self, row, text):
-        self.leads_list[row]["Job Type"] = text
-        
 if __name__ == "__main__":
+    startup_timer = StartupTimer(STARTED)
+    startup_timer.mark("imports")
+    instrumentation.configure()
     app = QApplication(sys.argv)
-    window = ContractorLeadsApp()
+    window = ContractorLeadsApp(startup_timer)
     window.show()
     sys.exit(app.exec_())
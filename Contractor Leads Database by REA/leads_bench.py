@@ -0,0 +1,378 @@
+"""Benchmarks for the Contractor Leads Database.
+
+    python leads_bench.py suite --output results.json
+    python leads_bench.py compare old.json new.json
+    python leads_bench.py memory --leads 100000
+
+suite: fills a scratch store with 1k/10k/100k/500k synthetic leads and times
+loading and saving it, building and scrolling the table, searching, finding
+duplicates, the CSV/TXT/PDF exports and edit/delete cycles. Qt runs
+offscreen. Results are written as JSON so two runs can be compared.
+
+compare: prints the change between two suite results and exits with status
+1 when anything got slower than --threshold allows.
+
+memory: loads the same synthetic leads_data.json contents as plain dicts
+(the old leads list) and as Lead records, and compares the memory each
+takes and how long reading every cell takes.
+"""
+import argparse
+import datetime
+import gc
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from leads_db import (
+    LEAD_STATUSES, JOB_TYPES, LEAD_ID, LEAD_FIELDS, Lead, JsonLeadsStore, SqliteLeadsStore, DuplicateIndex,
+    write_leads_csv, write_leads_txt, write_leads_pdf, load_pipeline_stats,
+    load_area_index, build_lead_indexes, INDEX_BUILD_GC_THRESHOLDS,
+)
+
+BENCH_SIZES = [1000, 10000, 100000, 500000]
+BENCH_STORES = ["sqlite", "json"]
+# Cells edited and leads deleted by the edit and delete cycles
+EDIT_CYCLE = 1000
+DELETE_CYCLE = 100
+# Benchmarks the suite runs, in order
+BENCHMARKS = ["load", "table_build", "table_fetch_all", "search_index_build", "search", "sort_keys_load",
+              "sort", "notes_search", "duplicates", "pipeline_stats", "area_index", "area_batches",
+              "edit_cycle", "delete_cycle", "export_csv", "export_txt", "export_pdf", "save"]
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "concrete leads input.py")
+
+def make_leads(count, seed=1):
+    # Synthetic leads in the add_lead schema, with values of realistic length
+    rng = random.Random(seed)
+    first_names = ["James", "Maria", "Robert", "Linda", "Michael", "Patricia", "David", "Jennifer"]
+    last_names = ["Smith", "Garcia", "Johnson", "Miller", "Davis", "Rodriguez", "Wilson", "Anderson"]
+    cities = [("Austin", "TX", "787"), ("Denver", "CO", "802"), ("Tampa", "FL", "336"), ("Columbus", "OH", "432")]
+    leads = []
+    for lead_id in range(1, count + 1):
+        first, last = rng.choice(first_names), rng.choice(last_names)
+        city, state, zip_prefix = rng.choice(cities)
+        leads.append({
+            "First Name": first,
+            "Last Name": f"{last}{lead_id}",
+            "Address Line 1": f"{rng.randint(1, 9999)} Main St",
+            "Address Line 2": "",
+            "City": city,
+            "State": state,
+            "Zip": f"{zip_prefix}{rng.randint(0, 99):02d}",
+            "Phone": f"({rng.randint(200, 999)}) 555-{rng.randint(0, 9999):04d}",
+            "Email": f"{first.lower()}.{last.lower()}{lead_id}@example.com",
+            "Notes": rng.choice(["", "", "Call after 5pm", "Wants a quote for a driveway pour"]),
+            "Referred By": rng.choice(["", "", "Home show", "Website"]),
+            "Referred To": "",
+            "Job Type": rng.choice(JOB_TYPES),
+            "Lead Status": rng.choice(LEAD_STATUSES),
+            LEAD_ID: lead_id,
+        })
+    return leads
+
+def measure_load(text, object_hook=None):
+    # Seconds to decode the leads, the memory they hold and the peak while decoding
+    start = time.perf_counter()
+    json.loads(text, object_hook=object_hook)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    leads = json.loads(text, object_hook=object_hook)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return leads, seconds, held, peak
+
+def time_reads(leads, fields):
+    # Every cell read once, as the table does while scrolling through the leads
+    start = time.perf_counter()
+    for lead in leads:
+        for field in fields:
+            lead.get(field, "")
+    return time.perf_counter() - start
+
+def memory_benchmark(count):
+    text = json.dumps(make_leads(count))
+    fields = list(LEAD_FIELDS) + [LEAD_ID]
+    results = {}
+    for name, object_hook in (("dict", None), ("Lead", Lead)):
+        leads, seconds, held, peak = measure_load(text, object_hook)
+        results[name] = {
+            "load_seconds": seconds,
+            "held_bytes": held,
+            "peak_bytes": peak,
+            "bytes_per_lead": held // count,
+            "read_seconds": time_reads(leads, fields),
+        }
+        del leads
+    return results
+
+def fill_store(backend, folder, count):
+    # Writes count synthetic leads to a new store of the given backend in folder
+    leads = make_leads(count)
+    if backend == "json":
+        with open(os.path.join(folder, "leads_data.json"), "w") as file:
+            json.dump(leads, file)
+        return
+    for lead in leads:
+        del lead[LEAD_ID]
+    store = SqliteLeadsStore(os.path.join(folder, "leads_data.db"), json_path=None)
+    store.add_leads(leads)
+    store.close()
+
+def open_store(backend, folder):
+    if backend == "json":
+        return JsonLeadsStore(os.path.join(folder, "leads_data.json"))
+    return SqliteLeadsStore(os.path.join(folder, "leads_data.db"), json_path=None)
+
+def load_app_module():
+    # The GUI script has a space in its name, so it can't be imported normally
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    spec = importlib.util.spec_from_file_location("leads_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if module.QApplication.instance() is None:
+        module.qt_app = module.QApplication(["leads_bench"])
+    return module
+
+def edit_cycle(app, tab):
+    model = tab.model
+    column = app.TABLE_COLUMNS.index("Notes")
+    for row in range(min(EDIT_CYCLE, model.rowCount())):
+        model.setData(model.index(row, column), f"Benchmark edit {row}", app.Qt.EditRole)
+    model.writes.flush()
+
+def delete_cycle(tab):
+    model = tab.model
+    for lead in list(model.leads_list[:DELETE_CYCLE]):
+        model.remove_lead(lead[LEAD_ID])
+
+def wait_for_tasks(app, scheduler):
+    while scheduler.tasks:
+        app.QApplication.processEvents()
+        time.sleep(0.001)
+
+def search(app, tab, text):
+    # The first search waits for the indexes to be built on the scheduler
+    tab.search_input.setText(text)
+    wait_for_tasks(app, tab.scheduler)
+    return tab.model.rowCount()
+
+def search_notes(app, tab, text):
+    # Searches straight away rather than after the typing delay
+    tab.notes_filter.setText(text)
+    tab.search_notes()
+    wait_for_tasks(app, tab.scheduler)
+    return tab.model.rowCount()
+
+def sort(app, tab, field, descending=False):
+    # The first sort of a column waits for its keys to be loaded on the scheduler
+    order = app.Qt.DescendingOrder if descending else app.Qt.AscendingOrder
+    tab.table.horizontalHeader().setSortIndicator(app.TABLE_COLUMNS.index(field), order)
+    wait_for_tasks(app, tab.scheduler)
+    return tab.model.rowCount()
+
+def find_duplicates(store):
+    index = DuplicateIndex()
+    index.build(store)
+    return index.duplicate_groups(store)
+
+def regroup_areas(index, batch_size):
+    # Every area split into batches of a new size
+    index.set_batch_size(batch_size)
+    return index.all_batches()
+
+def save(store):
+    store.update_lead(1, "Notes", "Benchmark save")
+    store.save_leads()
+
+def gc_benchmark(count, backend="sqlite"):
+    # Index builds at the default garbage collector thresholds and at the
+    # raised ones build_lead_indexes uses, with the collections each ran
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        fill_store(backend, folder, count)
+        store = open_store(backend, folder)
+        pauses = []
+        started = []
+
+        def record(phase, info):
+            if phase == "start":
+                started.append(time.perf_counter())
+            else:
+                pauses.append(time.perf_counter() - started.pop())
+
+        gc.callbacks.append(record)
+        try:
+            for name, thresholds in (("default", None), ("raised", INDEX_BUILD_GC_THRESHOLDS)):
+                gc.collect()
+                del pauses[:]
+                start = time.perf_counter()
+                indexes = build_lead_indexes(store, gc_thresholds_during=thresholds)
+                seconds = time.perf_counter() - start
+                results[name] = {
+                    "build_seconds": seconds,
+                    "collections": len(pauses),
+                    "collection_seconds": sum(pauses),
+                    "longest_pause": max(pauses, default=0),
+                }
+                del indexes
+        finally:
+            gc.callbacks.remove(record)
+            store.close()
+    return results
+
+def run_suite(sizes, backends, only=None, log=None):
+    # Runs every benchmark for each size and backend and returns the results
+    # as a list of {"benchmark", "store", "leads", "seconds"}
+    app = load_app_module()
+    results = []
+    for backend in backends:
+        for count in sizes:
+            with tempfile.TemporaryDirectory() as folder:
+                fill_store(backend, folder, count)
+
+                def timed(name, func, *args):
+                    if only and name not in only:
+                        return None
+                    gc.collect()
+                    start = time.perf_counter()
+                    value = func(*args)
+                    seconds = time.perf_counter() - start
+                    results.append({"benchmark": name, "store": backend, "leads": count, "seconds": round(seconds, 4)})
+                    if log:
+                        print(f"{backend:>6} {count:>7} {name:<20} {seconds:8.3f}s", file=log, flush=True)
+                    return value
+
+                # Opening is the whole load: the JSON store reads every lead, SQLite none
+                store = timed("load", open_store, backend, folder) or open_store(backend, folder)
+                scheduler = app.TaskScheduler(store)
+                tab = app.LeadsTableTab([], store, scheduler)
+                tab.resize(1600, 800)
+
+                def build_table():
+                    tab.show()
+                    app.QApplication.processEvents()
+
+                def fetch_all():
+                    while tab.model.canFetchMore(app.QModelIndex()):
+                        tab.model.fetchMore(app.QModelIndex())
+
+                timed("table_build", build_table)
+                timed("table_fetch_all", fetch_all)
+                timed("search_index_build", search, app, tab, "smith")
+                timed("search", search, app, tab, "garcia")
+                timed("sort_keys_load", sort, app, tab, "Last Name")
+                timed("sort", sort, app, tab, "Last Name", True)
+                timed("notes_search", search_notes, app, tab, "driveway")
+                # Clearing the searches resets the table, so fetch the rows the cycles edit again
+                search_notes(app, tab, "")
+                search(app, tab, "")
+                fetch_all()
+                timed("duplicates", find_duplicates, store)
+                timed("pipeline_stats", load_pipeline_stats, store)
+                area_index = timed("area_index", load_area_index, store) or load_area_index(store)
+                timed("area_batches", regroup_areas, area_index, 5)
+                timed("edit_cycle", edit_cycle, app, tab)
+                timed("delete_cycle", delete_cycle, tab)
+                for name, write in (("export_csv", write_leads_csv), ("export_txt", write_leads_txt), ("export_pdf", write_leads_pdf)):
+                    timed(name, write, store, os.path.join(folder, name.replace("_", ".")))
+                timed("save", save, store)
+                # deleteLater never runs outside an event loop, so stop the
+                # model polling the store before it is closed
+                tab.model.poll_timer.stop()
+                scheduler.shutdown()
+                tab.close()
+                tab.deleteLater()
+                app.QApplication.processEvents()
+                store.close()
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(APP_PATH), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(old, new, threshold):
+    # (benchmark, store, leads, old seconds, new seconds, regressed) for every result in both runs
+    old_seconds = {(result["benchmark"], result["store"], result["leads"]): result["seconds"] for result in old["results"]}
+    rows = []
+    for result in new["results"]:
+        key = (result["benchmark"], result["store"], result["leads"])
+        if key in old_seconds:
+            before, after = old_seconds[key], result["seconds"]
+            # Tiny timings are mostly noise, so they never count as regressions
+            regressed = after > before * (1 + threshold) and after - before > 0.01
+            rows.append(key + (before, after, regressed))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the contractor leads database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    suite = commands.add_parser("suite", help="time the app's main paths at several sizes")
+    suite.add_argument("--sizes", default=",".join(str(size) for size in BENCH_SIZES), help="comma separated lead counts")
+    suite.add_argument("--store", action="append", choices=BENCH_STORES, help="backend to run (repeatable, default: all)")
+    suite.add_argument("--only", action="append", choices=BENCHMARKS, help="benchmark to run (repeatable, default: all)")
+    suite.add_argument("--output", help="write the JSON results here instead of stdout")
+    compare = commands.add_parser("compare", help="compare two suite results")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.2, help="slowdown that counts as a regression (default 0.2 = 20%%)")
+    memory = commands.add_parser("memory", help="dict leads vs Lead records")
+    memory.add_argument("--leads", type=int, default=100000)
+    collector = commands.add_parser("gc", help="garbage collector pauses while indexes are built")
+    collector.add_argument("--leads", type=int, default=100000)
+    collector.add_argument("--store", choices=BENCH_STORES, default="sqlite")
+    args = parser.parse_args(argv)
+
+    if args.command == "suite":
+        sizes = [int(size) for size in args.sizes.split(",")]
+        results = run_suite(sizes, args.store or BENCH_STORES, args.only, log=sys.stderr)
+        report = {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+        else:
+            json.dump(report, sys.stdout, indent=2)
+            print()
+    elif args.command == "compare":
+        with open(args.old) as file:
+            old = json.load(file)
+        with open(args.new) as file:
+            new = json.load(file)
+        rows = compare_results(old, new, args.threshold)
+        for benchmark, store, leads, before, after, regressed in rows:
+            change = f"{(after - before) / before:+7.0%}" if before else "    n/a"
+            print(f"{store:>6} {leads:>7} {benchmark:<20} {before:8.3f}s -> {after:8.3f}s {change}{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+    elif args.command == "memory":
+        results = memory_benchmark(args.leads)
+        print(f"{args.leads} leads")
+        for name, result in results.items():
+            print(f"{name:>5}: {result['held_bytes'] / 2**20:7.1f} MB held, {result['peak_bytes'] / 2**20:7.1f} MB peak, "
+                  f"{result['bytes_per_lead']} bytes/lead, loaded in {result['load_seconds']:.2f}s, every cell read in {result['read_seconds']:.2f}s")
+        saved = 1 - results["Lead"]["held_bytes"] / results["dict"]["held_bytes"]
+        print(f"Lead records use {saved:.0%} less memory")
+    elif args.command == "gc":
+        results = gc_benchmark(args.leads, args.store)
+        print(f"{args.leads} leads, {args.store} store")
+        for name, result in results.items():
+            print(f"{name:>7}: built in {result['build_seconds']:.2f}s, {result['collections']} collections "
+                  f"taking {result['collection_seconds']:.2f}s, longest {result['longest_pause'] * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2496 @@
+"""Data layer for the Contractor Leads Database.
+
+Storage, search, duplicate detection, import and export for leads, with no
+PyQt5 dependency (reportlab is only needed for PDF export). The GUI in
+"concrete leads input.py" is built on top of this module, and it can be
+used on its own from scripts or the command line:
+
+    python leads_db.py count
+    python leads_db.py search smith --status "Good Lead"
+    python leads_db.py export-csv leads.csv
+    python leads_db.py import-csv vendor_list.csv
+    python leads_db.py history 42
+    python leads_db.py notes "stamped driveway"
+    python leads_db.py due
+
+Run "python leads_db.py --help" for every command. Set LEADS_INSTRUMENT=1
+to log how long each operation takes, or LEADS_PROFILE=export_csv (any
+operation name) to capture its next run with cProfile; see Instrumentation.
+"""
+import argparse
+import bisect
+import contextlib
+import csv
+import datetime
+import functools
+import gc
+import getpass
+import heapq
+import inspect
+import itertools
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Mapping, MutableMapping
+
+LEAD_STATUSES = ["In System", "Good Lead", "Contact Later", "Bad Lead", "Passed Along", "Closed"]
+JOB_TYPES = ["Residential", "Commercial", "Unknown"]
+
+# Fields limited to a fixed set of values
+CHOICE_FIELDS = {"Lead Status": LEAD_STATUSES, "Job Type": JOB_TYPES}
+FIELD_DEFAULTS = {"Lead Status": "In System", "Job Type": "Unknown"}
+# Lead Statuses of leads that still need a site visit
+OPEN_STATUSES = ["Good Lead", "Contact Later"]
+
+# Stable identifier stored on every lead so handlers never depend on row positions
+LEAD_ID = "Lead ID"
+# Row version kept by SQLite stores; every write bumps it, so an edit can tell
+# whether the lead changed since it was read
+LEAD_VERSION = "Lead Version"
+
+# Search tokenizing
+TOKEN_RE = re.compile(r"[0-9a-z]+")
+# Notes search snippets wrap each matching word in these, for the caller to
+# turn into brackets or bold text
+NOTES_MATCH_START = "\x02"
+NOTES_MATCH_END = "\x03"
+# Words in a notes snippet
+NOTES_SNIPPET_WORDS = 12
+NON_DIGIT_RE = re.compile(r"\D")
+PHONE_QUERY_RE = re.compile(r"[\d().+-]+")
+
+# Persisted lead fields and the SQLite column each one is stored in
+LEAD_FIELDS = {
+    "First Name": "first_name",
+    "Last Name": "last_name",
+    "Address Line 1": "address1",
+    "Address Line 2": "address2",
+    "City": "city",
+    "State": "state",
+    "Zip": "zip",
+    "Phone": "phone",
+    "Email": "email",
+    "Notes": "notes",
+    "Referred By": "referred_by",
+    "Referred To": "referred_to",
+    "Job Type": "job_type",
+    "Lead Status": "lead_status",
+    "Follow Up": "follow_up",
+}
+# When to next contact a lead, as stored: "2024-05-01" or "2024-05-01 14:30",
+# or blank for none. Stored this way, follow-ups sort by time as plain text.
+FOLLOW_UP_FIELD = "Follow Up"
+# Accepted follow-up formats; the first two are how they are stored
+FOLLOW_UP_FORMATS = ["%Y-%m-%d %H:%M", "%Y-%m-%d", "%m/%d/%Y %H:%M", "%m/%d/%Y"]
+
+# Field for each SQLite column, for reading history back
+COLUMN_FIELDS = {column: field for field, column in LEAD_FIELDS.items()}
+
+# Name recorded with each change in the lead history; the login name if unset
+HISTORY_USER_ENV = "LEADS_USER"
+
+# Attribute that holds each field in a Lead record
+LEAD_SLOTS = dict(LEAD_FIELDS, **{LEAD_ID: "lead_id", LEAD_VERSION: "version"})
+# Fields whose values repeat from lead to lead; interned so leads share one string each
+INTERNED_SLOTS = {LEAD_SLOTS[field] for field in ["Lead Status", "Job Type", "City", "State", "Referred By"]}
+missing = object()
+
+# Instrumentation: LEADS_INSTRUMENT (any value) turns timers and counters on,
+# LEADS_PROFILE names operations, comma separated, to capture with cProfile
+INSTRUMENT_ENV = "LEADS_INSTRUMENT"
+PROFILE_ENV = "LEADS_PROFILE"
+INSTRUMENT_LOG = "leads_instrument.log"
+INSTRUMENT_LOG_BYTES = 1024 * 1024
+INSTRUMENT_LOG_BACKUPS = 3
+# Operations at least this slow are logged as warnings
+SLOW_OPERATION_SECONDS = 0.05
+# Functions listed in the log for each profile
+PROFILE_TOP_FUNCTIONS = 25
+
+class Instrumentation:
+    # Timers around the slow paths and counters for the work they do, for
+    # diagnosing field reports without a debugger. Off by default, when a
+    # timed call costs one attribute check. Once enabled every timed call is
+    # written to a rolling log file and added to the totals in summary().
+    # profile() arms a one-shot cProfile capture of an operation's next run;
+    # the .prof file is saved next to the log and its top functions logged.
+    def __init__(self):
+        self.enabled = False
+        # Names of every timed operation, for choosing one to profile
+        self.operations = set()
+        self.timings = {}
+        self.counters = Counter()
+        self.profile_next = set()
+        self.log_path = None
+        self._logger = None
+        self._profiling = False
+        self._lock = threading.Lock()
+
+    def configure(self, environ=None):
+        environ = os.environ if environ is None else environ
+        if environ.get(INSTRUMENT_ENV):
+            self.enable()
+        for name in environ.get(PROFILE_ENV, "").split(","):
+            if name.strip():
+                self.profile(name.strip())
+
+    def _open_log(self, log_path=INSTRUMENT_LOG):
+        # logging is only imported once instrumentation is wanted
+        import logging
+        import logging.handlers
+        if self._logger is None:
+            self._logger = logging.getLogger("leads")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+        if self.log_path != log_path:
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+                handler.close()
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=INSTRUMENT_LOG_BYTES, backupCount=INSTRUMENT_LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(threadName)s] %(message)s"))
+            self._logger.addHandler(handler)
+            self.log_path = log_path
+
+    def enable(self, log_path=INSTRUMENT_LOG):
+        self._open_log(log_path)
+        if not self.enabled:
+            self.enabled = True
+            self.log(f"Instrumentation on, pid {os.getpid()}")
+
+    def disable(self):
+        if self.enabled:
+            self.log_summary()
+            self.enabled = False
+
+    def profile(self, name):
+        self._open_log(self.log_path or INSTRUMENT_LOG)
+        with self._lock:
+            self.profile_next.add(name)
+        self.log(f"Profiling the next {name}")
+
+    def log(self, message, slow=False):
+        if self._logger is not None:
+            (self._logger.warning if slow else self._logger.info)(message)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += amount
+
+    def record(self, name, seconds):
+        with self._lock:
+            calls, total, longest = self.timings.get(name, (0, 0.0, 0.0))
+            self.timings[name] = (calls + 1, total + seconds, max(longest, seconds))
+        self.log(f"{name} {seconds * 1000:.1f} ms", slow=seconds >= SLOW_OPERATION_SECONDS)
+
+    def call(self, name, func, *args, **kwargs):
+        # func(*args, **kwargs), timed as name
+        if not self.enabled and not self.profile_next:
+            return func(*args, **kwargs)
+        profiler = self._start_profile(name)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                self._finish_profile(name, profiler)
+            if self.enabled:
+                self.record(name, seconds)
+
+    def _start_profile(self, name):
+        with self._lock:
+            if name not in self.profile_next or self._profiling:
+                return None
+            self.profile_next.discard(name)
+            self._profiling = True
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler or a debugger's tracer is already running
+            self._profiling = False
+            self.log(f"Could not profile {name}: another profiler is active", slow=True)
+            return None
+        return profiler
+
+    def _finish_profile(self, name, profiler):
+        import io
+        import pstats
+        profiler.disable()
+        folder = os.path.dirname(os.path.abspath(self.log_path or INSTRUMENT_LOG))
+        path = os.path.join(folder, f"leads-profile-{name}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        profiler.dump_stats(path)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        self.log(f"Profile of {name} saved to {path}\n{text.getvalue()}")
+        self._profiling = False
+
+    def summary(self):
+        # One line per timed operation, slowest total first, then the counters
+        with self._lock:
+            timings = sorted(self.timings.items(), key=lambda item: -item[1][1])
+            counters = sorted(self.counters.items())
+        lines = [f"{name}: {calls} calls, {total * 1000:.1f} ms total, {total / calls * 1000:.1f} ms average, {longest * 1000:.1f} ms longest"
+                 for name, (calls, total, longest) in timings]
+        return lines + [f"{name}: {count}" for name, count in counters]
+
+    def log_summary(self):
+        self.log("Summary\n" + "\n".join(self.summary()))
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}
+            self.counters = Counter()
+
+# The process-wide instrumentation the timers below report to
+instrumentation = Instrumentation()
+
+def instrumented(name):
+    # Decorator timing every call of a function as the operation name. Extra
+    # positional arguments are dropped, as Qt does for a slot that takes fewer
+    # than its signal sends, so timed methods connect to signals directly.
+    instrumentation.operations.add(name)
+
+    def decorate(func):
+        parameters = inspect.signature(func).parameters.values()
+        if any(parameter.kind == parameter.VAR_POSITIONAL for parameter in parameters):
+            accepted = None
+        else:
+            accepted = sum(parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD) for parameter in parameters)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return instrumentation.call(name, func, *args[:accepted], **kwargs)
+        return wrapper
+    return decorate
+
+def log_warning(message, *args):
+    # Problems the data layer recovered from. With no logging configured they
+    # go to stderr; logging is only imported when there is one to report.
+    import logging
+    logging.getLogger("leads_db").warning(message, *args)
+
+class Lead(MutableMapping):
+    # Compact lead record. It reads and writes like the dict it replaces
+    # (lead["Zip"], lead.get(...), dict(lead)) but keeps each field in a slot,
+    # instead of a 15-key dict. Values in INTERNED_SLOTS are interned, so every
+    # lead shares one string per status, job type, city and so on.
+    # A field that was never set is missing, as it would be from a dict. Keys
+    # outside LEAD_SLOTS (from old files) are kept in _extra.
+    __slots__ = tuple(LEAD_SLOTS.values()) + ("_extra",)
+
+    def __init__(self, values=()):
+        self._extra = None
+        for field, value in (values.items() if isinstance(values, Mapping) else values):
+            slot = LEAD_SLOTS.get(field)
+            if slot is None or slot in INTERNED_SLOTS:
+                self[field] = value
+            else:
+                setattr(self, slot, value)
+
+    @classmethod
+    def from_row(cls, row):
+        # (id, *LEAD_FIELDS columns, version), as SqliteLeadsStore selects them
+        lead = cls.__new__(cls)
+        lead._extra = None
+        lead.lead_id = row[0]
+        for slot, value in zip(LEAD_FIELDS.values(), row[1:]):
+            setattr(lead, slot, sys.intern(value) if slot in INTERNED_SLOTS else value)
+        if len(row) > len(LEAD_FIELDS) + 1:
+            lead.version = row[len(LEAD_FIELDS) + 1]
+        return lead
+
+    def get(self, field, default=None):
+        slot = LEAD_SLOTS.get(field)
+        if slot is None:
+            return self._extra.get(field, default) if self._extra else default
+        return getattr(self, slot, default)
+
+    def __getitem__(self, field):
+        value = self.get(field, missing)
+        if value is missing:
+            raise KeyError(field)
+        return value
+
+    def __setitem__(self, field, value):
+        slot = LEAD_SLOTS.get(field)
+        if slot is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[field] = value
+        elif slot in INTERNED_SLOTS and type(value) is str:
+            setattr(self, slot, sys.intern(value))
+        else:
+            setattr(self, slot, value)
+
+    def __delitem__(self, field):
+        slot = LEAD_SLOTS.get(field)
+        if slot is None:
+            if not self._extra or field not in self._extra:
+                raise KeyError(field)
+            del self._extra[field]
+        else:
+            try:
+                delattr(self, slot)
+            except AttributeError:
+                raise KeyError(field) from None
+
+    def __contains__(self, field):
+        return self.get(field, missing) is not missing
+
+    def __iter__(self):
+        for field, slot in LEAD_SLOTS.items():
+            if hasattr(self, slot):
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        return Lead(self)
+
+    def __repr__(self):
+        return f"Lead({dict(self)!r})"
+
+class LeadsStore:
+    # Base class for lead storage backends. Leads are plain dicts keyed by field
+    # name; add_lead assigns the lead's LEAD_ID. Reads are paged by id so a view
+    # never needs the whole database in memory.
+    def count_leads(self):
+        raise NotImplementedError
+
+    def fetch_leads(self, after_id=0, limit=None):
+        # Leads with an id greater than after_id, in id order
+        raise NotImplementedError
+
+    def fetch_leads_by_ids(self, lead_ids):
+        # The given leads, in the order asked for; ids that no longer exist are skipped
+        raise NotImplementedError
+
+    def load_leads(self):
+        return self.fetch_leads()
+
+    def iter_leads(self, page_size=5000):
+        after_id = 0
+        while True:
+            page = self.fetch_leads(after_id, page_size)
+            if not page:
+                return
+            yield from page
+            after_id = page[-1][LEAD_ID]
+
+    def iter_field_values(self, field):
+        # (lead id, value) for one field of every lead
+        for lead in self.iter_leads():
+            yield lead[LEAD_ID], lead.get(field, FIELD_DEFAULTS.get(field, ""))
+
+    def iter_fields(self, fields):
+        # (lead id, *values of fields) for every lead
+        for lead in self.iter_leads():
+            yield (lead[LEAD_ID], *(lead.get(field, FIELD_DEFAULTS.get(field, "")) for field in fields))
+
+    def add_lead(self, lead):
+        raise NotImplementedError
+
+    def add_leads(self, leads):
+        # Bulk insert for imports; backends commit the whole batch at once
+        for lead in leads:
+            self.add_lead(lead)
+
+    def update_lead(self, lead_id, field, value):
+        raise NotImplementedError
+
+    def update_leads(self, changes, versions=None):
+        # Applies (lead_id, field, value) changes; backends commit them together.
+        # versions maps lead ids to the LEAD_VERSION the edits were made
+        # against. Stores shared between clients refuse the edits to a lead
+        # that has moved on since and return its id; the rest return nothing.
+        for lead_id, field, value in changes:
+            self.update_lead(lead_id, field, value)
+        return set()
+
+    def delete_lead(self, lead_id):
+        raise NotImplementedError
+
+    def merge_leads(self, keep_id, changes, delete_ids, versions=None):
+        # Applies the {field: value} changes to one lead and deletes others,
+        # together: backends commit it all at once or not at all. versions
+        # works as for update_leads; if any of the leads has moved on, or is
+        # gone, nothing is changed and False is returned.
+        self.update_leads([(keep_id, field, value) for field, value in changes.items()])
+        for lead_id in delete_ids:
+            self.delete_lead(lead_id)
+        return True
+
+    def latest_change(self):
+        # Position in the store's change log, for changes_since
+        return 0
+
+    def changes_since(self, seq):
+        # (latest position, changes other clients made after seq); see
+        # SqliteLeadsStore. A store only this client writes to has none.
+        return seq, []
+
+    def lead_history(self, lead_id):
+        # [(time, lead id, user, field, old value, new value)] for one lead,
+        # oldest first. An old value of None marks the lead being added, a
+        # new value of None its deletion. Only SQLite stores keep history.
+        return []
+
+    def history_between(self, start, end, limit=None, newest_first=False):
+        # The same for every lead, for changes from start up to but not
+        # including end (both in seconds since the epoch)
+        return []
+
+    def follow_ups_due(self, before):
+        # [(follow-up, lead id)] for follow-ups that sort before before (see
+        # follow_up_key and follow_ups_due_by), soonest first
+        return sorted((follow_up, lead_id) for lead_id, follow_up in self.iter_fields([FOLLOW_UP_FIELD])
+                      if follow_up and follow_up < before)
+
+    def search_notes(self, query, limit=None):
+        # [(lead id, score)] for leads whose Notes contain every word of query
+        # (as a word prefix), best first. This builds a NotesIndex each time;
+        # the real stores keep one.
+        index = NotesIndex()
+        index.build(self)
+        return index.search(query, limit)
+
+    def save_leads(self):
+        pass
+
+    def for_worker_thread(self):
+        # A store handle that is safe to use from another thread
+        return self
+
+    def close(self):
+        pass
+
+class JsonLeadsStore(LeadsStore):
+    # leads_data.json is a snapshot. Every change after it is appended to
+    # leads_data.json.journal and replayed on open, so autosave costs one line
+    # per edit and a crash loses at most the edit being written. Once the
+    # journal grows past COMPACT_AFTER entries a background thread writes a
+    # fresh snapshot and swaps it in with an atomic rename.
+    COMPACT_AFTER = 5000
+
+    def __init__(self, path="leads_data.json"):
+        self.path = path
+        self.journal_path = path + ".journal"
+        # The journal being folded into a snapshot by the compaction thread
+        self.compacting_path = path + ".compacting"
+        self._next_id = 1
+        self._journal = None
+        self._journal_entries = 0
+        self._compaction = None
+        # Built on the first notes search, then kept current by every change
+        self._notes_index = None
+        # Workers share this store (see for_worker_thread), so changes are made one at a time
+        self.lock = threading.RLock()
+        self.leads = self._read_file()
+        self._by_id = {lead[LEAD_ID]: lead for lead in self.leads}
+        # The ids of self.leads, in the same (id) order, for bisecting
+        self._ids = [lead[LEAD_ID] for lead in self.leads]
+        if os.path.exists(self.compacting_path):
+            # A compaction was interrupted; fold everything replayed into a new snapshot now
+            self._write_snapshot([dict(lead) for lead in self.leads])
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_entries = 0
+
+    def _read_file(self):
+        by_id = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as file:
+                    leads = json.load(file, object_hook=Lead)
+            except json.JSONDecodeError:
+                # Keep the damaged file for recovery instead of silently starting empty
+                damaged_path = f"{self.path}.damaged-{int(time.time())}"
+                os.replace(self.path, damaged_path)
+                log_warning("%s could not be read and was moved to %s.", self.path, damaged_path)
+                leads = []
+        else:
+            folder_path = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder_path, exist_ok=True)
+            leads = []
+        self._next_id = max((lead.get(LEAD_ID, 0) for lead in leads), default=0) + 1
+        for lead in leads:
+            if LEAD_ID not in lead:
+                lead[LEAD_ID] = self._next_id
+                self._next_id += 1
+            by_id[lead[LEAD_ID]] = lead
+        for journal_path in (self.compacting_path, self.journal_path):
+            self._replay(journal_path, by_id)
+        self._next_id = max(self._next_id, max(by_id, default=0) + 1)
+        return sorted(by_id.values(), key=lambda lead: lead[LEAD_ID])
+
+    def _replay(self, journal_path, by_id):
+        # Entries only ever set state, so replaying one already in the snapshot is harmless
+        if not os.path.exists(journal_path):
+            return
+        # End of the last whole entry, and whether it still needs its newline
+        good_offset, unterminated = 0, False
+        with open(journal_path, "rb") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # A torn final line from a crash mid-write
+                    break
+                good_offset += len(line)
+                unterminated = not line.endswith(b"\n")
+                if entry["op"] == "add":
+                    by_id[entry["lead"][LEAD_ID]] = Lead(entry["lead"])
+                elif entry["op"] == "update" and entry["id"] in by_id:
+                    by_id[entry["id"]][entry["field"]] = entry["value"]
+                elif entry["op"] == "delete":
+                    by_id.pop(entry["id"], None)
+                if journal_path == self.journal_path:
+                    self._journal_entries += 1
+        if journal_path == self.journal_path:
+            self._repair_journal(good_offset, unterminated)
+
+    def _repair_journal(self, good_offset, unterminated):
+        # Cuts a torn entry off the end of the journal and ends the last whole
+        # one with its newline, so the next entry appended starts on a line of
+        # its own instead of being lost behind the damage on the next replay
+        with open(self.journal_path, "r+b") as file:
+            if file.seek(0, os.SEEK_END) != good_offset:
+                log_warning("%s ended in a torn entry; dropped %d bytes after offset %d.",
+                            self.journal_path, file.tell() - good_offset, good_offset)
+                file.truncate(good_offset)
+            if unterminated:
+                file.seek(good_offset)
+                file.write(b"\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _log(self, entries):
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a")
+        for entry in entries:
+            self._journal.write(json.dumps(entry) + "\n")
+            self._journal_entries += 1
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        if self._journal_entries >= self.COMPACT_AFTER:
+            self.compact(wait=False)
+
+    def count_leads(self):
+        return len(self.leads)
+
+    def fetch_leads(self, after_id=0, limit=None):
+        start = bisect.bisect_right(self._ids, after_id) if after_id else 0
+        return self.leads[start:start + limit if limit else None]
+
+    def fetch_leads_by_ids(self, lead_ids):
+        return [self._by_id[lead_id] for lead_id in lead_ids if lead_id in self._by_id]
+
+    def _add(self, lead):
+        lead[LEAD_ID] = self._next_id
+        self._next_id += 1
+        if not isinstance(lead, Lead):
+            lead = Lead(lead)
+        self.leads.append(lead)
+        self._ids.append(lead[LEAD_ID])
+        self._by_id[lead[LEAD_ID]] = lead
+        if self._notes_index is not None:
+            self._notes_index.set_notes(lead[LEAD_ID], lead.get("Notes", ""))
+        return {"op": "add", "lead": dict(lead)}
+
+    def add_lead(self, lead):
+        with self.lock:
+            self._log([self._add(lead)])
+        return lead[LEAD_ID]
+
+    def add_leads(self, leads):
+        with self.lock:
+            self._log([self._add(lead) for lead in leads])
+
+    def _update(self, lead_id, field, value):
+        # Table rows are usually the same dicts as self.leads, so this is often a no-op
+        if lead_id in self._by_id:
+            self._by_id[lead_id][field] = value
+            if field == "Notes" and self._notes_index is not None:
+                self._notes_index.set_notes(lead_id, value)
+        return {"op": "update", "id": lead_id, "field": field, "value": value}
+
+    def update_lead(self, lead_id, field, value):
+        with self.lock:
+            self._log([self._update(lead_id, field, value)])
+
+    def update_leads(self, changes, versions=None):
+        with self.lock:
+            self._log([self._update(lead_id, field, value) for lead_id, field, value in changes])
+        return set()
+
+    def _delete(self, lead_id):
+        position = bisect.bisect_left(self._ids, lead_id)
+        if position < len(self._ids) and self._ids[position] == lead_id:
+            del self.leads[position]
+            del self._ids[position]
+        self._by_id.pop(lead_id, None)
+        if self._notes_index is not None:
+            self._notes_index.set_notes(lead_id, "")
+        return {"op": "delete", "id": lead_id}
+
+    def delete_lead(self, lead_id):
+        with self.lock:
+            self._log([self._delete(lead_id)])
+
+    def merge_leads(self, keep_id, changes, delete_ids, versions=None):
+        # One journal write; the update comes first, so a crash part way
+        # through can only leave a duplicate behind, never lose its values
+        with self.lock:
+            if keep_id not in self._by_id or any(lead_id not in self._by_id for lead_id in delete_ids):
+                return False
+            self._log([self._update(keep_id, field, value) for field, value in changes.items()]
+                      + [self._delete(lead_id) for lead_id in delete_ids])
+        return True
+
+    def search_notes(self, query, limit=None):
+        with self.lock:
+            if self._notes_index is None:
+                self._notes_index = NotesIndex()
+                self._notes_index.build(self)
+            return self._notes_index.search(query, limit)
+
+    def compact(self, wait=True):
+        # Moves the journal aside and writes the current state as the new
+        # snapshot. The copy is taken here so the thread sees a consistent state.
+        if self._compaction is not None:
+            self._compaction.join()
+        with self.lock:
+            snapshot = [dict(lead) for lead in self.leads]
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.compacting_path)
+            self._journal_entries = 0
+        self._compaction = threading.Thread(target=self._write_snapshot, args=(snapshot,))
+        self._compaction.start()
+        if wait:
+            self._compaction.join()
+
+    def _write_snapshot(self, leads):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(leads, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+
+    @instrumented("save")
+    def save_leads(self):
+        # Every change is already journaled; folding it into the snapshot keeps the next startup quick
+        if self._journal_entries:
+            self.compact()
+
+    def close(self):
+        if self._compaction is not None:
+            self._compaction.join()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+class SqliteLeadsStore(LeadsStore):
+    # One row per lead in a WAL-mode SQLite database. Every add, edit and delete
+    # is its own small transaction, so nothing is lost if the app dies.
+    # Several processes can use the database at once. Every write bumps the
+    # row's version, and update_leads refuses edits made against an older
+    # version instead of overwriting someone else's. Every write is also
+    # recorded in the changes table, tagged with the client that made it, so
+    # other clients can poll changes_since and refresh just those leads.
+    # The history table keeps every field change for good, one row per field
+    # with its old and new value, indexed by lead and by time. Adding a lead
+    # is recorded as its Lead Status being set; deleting one as each of its
+    # non-blank fields being cleared.
+    # Notes are indexed for full-text search by an FTS5 table in the same
+    # file, so edits from any client are searchable at once. Triggers keep it
+    # in step with edits and deletes; adds index their own rows, because an
+    # insert trigger costs ten times what one INSERT ... SELECT does for a
+    # bulk import. Without FTS5 in this SQLite build, search_notes falls back
+    # to the slow LeadsStore version.
+    # A partial index over the follow-ups that are set answers follow_ups_due
+    # without reading leads that have none.
+    # Lead ids are AUTOINCREMENT, so a deleted lead's id is never handed out
+    # again and its history and change log entries stay its own.
+    SCHEMA_VERSION = 6
+    JOURNAL_MODE = "WAL"
+    SYNCHRONOUS = "NORMAL"
+    LEAD_COLUMNS = ", ".join(["id", *LEAD_FIELDS.values(), "version"])
+    # How long change log entries are kept for clients that were offline
+    CHANGE_LOG_SECONDS = 7 * 24 * 3600
+
+    def __init__(self, path="leads_data.db", json_path="leads_data.json", client_id=None, user=None):
+        self.path = path
+        # Worker handles share their client's id, so its own changes are never polled back
+        self.client_id = client_id or os.urandom(8).hex()
+        self.user = user or current_user()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(f"PRAGMA journal_mode={self.JOURNAL_MODE}")
+        self.conn.execute(f"PRAGMA synchronous={self.SYNCHRONOUS}")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            self._create_schema(json_path)
+        self.notes_fts = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'").fetchone() is not None
+        if client_id is None:
+            with self.conn:
+                self.conn.execute("DELETE FROM changes WHERE time < ?", (time.time() - self.CHANGE_LOG_SECONDS,))
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # Takes the write lock up front, so rows read inside can't change
+        # under another client before they are written
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
+
+    def _create_schema(self, json_path):
+        # The version is checked again under the write lock, so clients
+        # opening an old database together migrate it once
+        columns = ", ".join(f"{column} TEXT NOT NULL DEFAULT ''" for column in LEAD_FIELDS.values())
+        with self._transaction():
+            schema_version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version < 1:
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS leads (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns}, version INTEGER NOT NULL DEFAULT 1)")
+                # One-time import of the old JSON file, in the same transaction as the schema
+                if json_path and os.path.exists(json_path):
+                    self._insert_many(JsonLeadsStore(json_path).leads)
+            elif schema_version < 2:
+                self.conn.execute("ALTER TABLE leads ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            if 1 <= schema_version < 5:
+                self.conn.execute("ALTER TABLE leads ADD COLUMN follow_up TEXT NOT NULL DEFAULT ''")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, lead_id INTEGER, "
+                "client TEXT NOT NULL, op TEXT NOT NULL, data TEXT NOT NULL, time REAL NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS changes_time ON changes (time)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS history (lead_id INTEGER NOT NULL, time REAL NOT NULL, "
+                "user TEXT NOT NULL, field TEXT NOT NULL, old TEXT, new TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS history_lead ON history (lead_id, time)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS history_time ON history (time)")
+            if 1 <= schema_version < 6:
+                self._rebuild_leads_table(columns)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS leads_follow_up ON leads (follow_up) WHERE follow_up <> ''")
+            try:
+                self._create_notes_index()
+            except sqlite3.OperationalError:
+                # No FTS5 module in this SQLite build
+                pass
+            self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _rebuild_leads_table(self, columns):
+        # Before version 6 ids were plain rowids, so deleting the newest lead
+        # let the next add take its id along with its history. The table is
+        # copied into an AUTOINCREMENT one whose next id is past every id the
+        # history and change log have seen. Dropping the old table drops its
+        # index and notes triggers; the caller creates them again.
+        self.conn.execute(f"CREATE TABLE leads_new (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns}, version INTEGER NOT NULL DEFAULT 1)")
+        self.conn.execute(f"INSERT INTO leads_new ({self.LEAD_COLUMNS}) SELECT {self.LEAD_COLUMNS} FROM leads")
+        self.conn.execute("DROP TABLE leads")
+        self.conn.execute("ALTER TABLE leads_new RENAME TO leads")
+        last_id = self.conn.execute(
+            "SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM leads UNION ALL SELECT MAX(lead_id) FROM history "
+            "UNION ALL SELECT MAX(lead_id) FROM changes)").fetchone()[0]
+        self.conn.execute("DELETE FROM sqlite_sequence WHERE name = 'leads'")
+        if last_id:
+            self.conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('leads', ?)", (last_id,))
+
+    def _create_notes_index(self):
+        # External content: the index keeps only the terms and reads the notes
+        # text back from leads. The prefix tables make "conc*" a direct lookup.
+        self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(notes, content='leads', content_rowid='id', prefix='2 3')")
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS leads_notes_delete AFTER DELETE ON leads BEGIN "
+            "INSERT INTO notes_fts (notes_fts, rowid, notes) VALUES ('delete', old.id, old.notes); END")
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS leads_notes_update AFTER UPDATE OF notes ON leads BEGIN "
+            "INSERT INTO notes_fts (notes_fts, rowid, notes) VALUES ('delete', old.id, old.notes); "
+            "INSERT INTO notes_fts (rowid, notes) VALUES (new.id, new.notes); END")
+        self.conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+
+    def _insert_many(self, leads):
+        fields = list(LEAD_FIELDS)
+        sql = f"INSERT INTO leads ({', '.join(LEAD_FIELDS.values())}) VALUES ({', '.join('?' * len(fields))})"
+        self.conn.executemany(sql, ([str(lead.get(field, FIELD_DEFAULTS.get(field, ""))) for field in fields] for lead in leads))
+
+    def _log_change(self, lead_id, op, data=None):
+        self.conn.execute(
+            "INSERT INTO changes (lead_id, client, op, data, time) VALUES (?, ?, ?, ?, ?)",
+            (lead_id, self.client_id, op, json.dumps(data or {}), time.time()))
+
+    def _log_history(self, lead_id, deltas):
+        # deltas are (column, old value, new value)
+        now = time.time()
+        self.conn.executemany(
+            "INSERT INTO history (lead_id, time, user, field, old, new) VALUES (?, ?, ?, ?, ?, ?)",
+            [(lead_id, now, self.user, column, old, new) for column, old, new in deltas])
+
+    def _history(self, where, parameters):
+        cursor = self.conn.execute(f"SELECT time, lead_id, user, field, old, new FROM history {where}", parameters)
+        return [(when, lead_id, user, COLUMN_FIELDS.get(column, column), old, new) for when, lead_id, user, column, old, new in cursor]
+
+    def count_leads(self):
+        return self.conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    def fetch_leads(self, after_id=0, limit=None):
+        cursor = self.conn.execute(
+            f"SELECT {self.LEAD_COLUMNS} FROM leads WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, -1 if limit is None else limit))
+        return [Lead.from_row(row) for row in cursor]
+
+    def fetch_leads_by_ids(self, lead_ids):
+        found = {}
+        lead_ids = list(lead_ids)
+        for start in range(0, len(lead_ids), 500):
+            chunk = lead_ids[start:start + 500]
+            cursor = self.conn.execute(
+                f"SELECT {self.LEAD_COLUMNS} FROM leads WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            for row in cursor:
+                found[row[0]] = Lead.from_row(row)
+        return [found[lead_id] for lead_id in lead_ids if lead_id in found]
+
+    def iter_field_values(self, field):
+        return self.conn.execute(f"SELECT id, {LEAD_FIELDS[field]} FROM leads")
+
+    def iter_fields(self, fields):
+        return self.conn.execute(f"SELECT id, {', '.join(LEAD_FIELDS[field] for field in fields)} FROM leads")
+
+    def add_lead(self, lead):
+        fields = [field for field in LEAD_FIELDS if field in lead]
+        sql = f"INSERT INTO leads ({', '.join(LEAD_FIELDS[field] for field in fields)}) VALUES ({', '.join('?' * len(fields))})"
+        with self.conn:
+            cursor = self.conn.execute(sql, [lead[field] for field in fields])
+            self._log_change(cursor.lastrowid, "add")
+            self._log_history(cursor.lastrowid, [("lead_status", None, lead.get("Lead Status", FIELD_DEFAULTS["Lead Status"]))])
+            if self.notes_fts:
+                self.conn.execute("INSERT INTO notes_fts (rowid, notes) VALUES (?, ?)", (cursor.lastrowid, lead.get("Notes", "")))
+        lead[LEAD_ID] = cursor.lastrowid
+        lead[LEAD_VERSION] = 1
+        return lead[LEAD_ID]
+
+    def add_leads(self, leads):
+        # Bulk adds are logged as one "reload" entry rather than a line per lead
+        with self._transaction():
+            last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM leads").fetchone()[0]
+            self._insert_many(leads)
+            self._log_change(None, "reload")
+            self.conn.execute(
+                "INSERT INTO history (lead_id, time, user, field, old, new) "
+                "SELECT id, ?, ?, 'lead_status', NULL, lead_status FROM leads WHERE id > ?",
+                (time.time(), self.user, last_id))
+            if self.notes_fts:
+                self.conn.execute("INSERT INTO notes_fts (rowid, notes) SELECT id, notes FROM leads WHERE id > ?", (last_id,))
+
+    def update_lead(self, lead_id, field, value):
+        self.update_leads([(lead_id, field, value)])
+
+    def update_leads(self, changes, versions=None):
+        # One UPDATE per lead, all in one transaction. The fields' old values
+        # go in the change log, so other clients can update their indexes.
+        by_lead = {}
+        for lead_id, field, value in changes:
+            if field in LEAD_FIELDS:
+                by_lead.setdefault(lead_id, {})[field] = value
+        versions = versions or {}
+        refused = set()
+        with self._transaction():
+            for lead_id, values in by_lead.items():
+                if not self._update_row(lead_id, values, versions.get(lead_id)):
+                    refused.add(lead_id)
+        return refused
+
+    def _update_row(self, lead_id, values, version=None):
+        # Inside a transaction; False if the lead is gone or not at version
+        fields = list(values)
+        row = self.conn.execute(
+            f"SELECT version, {', '.join(LEAD_FIELDS[field] for field in fields)} FROM leads WHERE id = ?", (lead_id,)).fetchone()
+        if row is None or version not in (None, row[0]):
+            return False
+        assignments = ", ".join(f"{LEAD_FIELDS[field]} = ?" for field in fields)
+        self.conn.execute(f"UPDATE leads SET {assignments}, version = version + 1 WHERE id = ?", [values[field] for field in fields] + [lead_id])
+        self._log_change(lead_id, "update", dict(zip(fields, row[1:])))
+        self._log_history(lead_id, [(LEAD_FIELDS[field], old, values[field])
+                                    for field, old in zip(fields, row[1:]) if old != values[field]])
+        return True
+
+    def delete_lead(self, lead_id):
+        with self._transaction():
+            self._delete_row(lead_id)
+
+    def _delete_row(self, lead_id):
+        # Inside a transaction
+        row = self.conn.execute(f"SELECT {self.LEAD_COLUMNS} FROM leads WHERE id = ?", (lead_id,)).fetchone()
+        if row is None:
+            return
+        self.conn.execute("DELETE FROM leads WHERE id = ?", (lead_id,))
+        self._log_change(lead_id, "delete", dict(Lead.from_row(row)))
+        self._log_history(lead_id, [(column, old, None) for column, old in zip(LEAD_FIELDS.values(), row[1:]) if old])
+
+    def merge_leads(self, keep_id, changes, delete_ids, versions=None):
+        versions = versions or {}
+        changes = {field: value for field, value in changes.items() if field in LEAD_FIELDS}
+        with self._transaction():
+            lead_ids = [keep_id, *delete_ids]
+            current = dict(self.conn.execute(
+                f"SELECT id, version FROM leads WHERE id IN ({', '.join('?' * len(lead_ids))})", lead_ids).fetchall())
+            if any(lead_id not in current or versions.get(lead_id) not in (None, current[lead_id]) for lead_id in lead_ids):
+                return False
+            if changes:
+                self._update_row(keep_id, changes)
+            for lead_id in delete_ids:
+                self._delete_row(lead_id)
+        return True
+
+    def latest_change(self):
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, seq):
+        # (latest seq, [(lead id, op, data)]) for changes other clients made
+        # after seq, oldest first. op is "add", "update" with data holding the
+        # changed fields' old values, or "delete" with data holding the deleted
+        # lead. The changes are None when the caller should reload everything:
+        # another client bulk imported, or seq fell out of the pruned log.
+        rows = self.conn.execute("SELECT seq, lead_id, client, op, data FROM changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        if not rows:
+            return seq, []
+        latest = rows[-1][0]
+        if rows[0][0] > seq + 1:
+            return latest, None
+        changes = []
+        for _, lead_id, client, op, data in rows:
+            if client == self.client_id:
+                continue
+            if op == "reload":
+                return latest, None
+            changes.append((lead_id, op, json.loads(data)))
+        return latest, changes
+
+    def lead_history(self, lead_id):
+        return self._history("WHERE lead_id = ? ORDER BY time, rowid", (lead_id,))
+
+    def history_between(self, start, end, limit=None, newest_first=False):
+        order = "time DESC, rowid DESC" if newest_first else "time, rowid"
+        return self._history(f"WHERE time >= ? AND time < ? ORDER BY {order} LIMIT ?", (start, end, -1 if limit is None else limit))
+
+    def search_notes(self, query, limit=None):
+        if not self.notes_fts:
+            return super().search_notes(query, limit)
+        terms = NotesIndex.tokenize(query)
+        if not terms:
+            return []
+        # bm25 is lower for better matches; scores are flipped to match NotesIndex
+        return self.conn.execute(
+            "SELECT rowid, -bm25(notes_fts) FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank LIMIT ?",
+            (" ".join(f'"{term}"*' for term in terms), -1 if limit is None else limit)).fetchall()
+
+    def follow_ups_due(self, before):
+        return self.conn.execute(
+            "SELECT follow_up, id FROM leads WHERE follow_up <> '' AND follow_up < ? ORDER BY follow_up, id", (before,)).fetchall()
+
+    def for_worker_thread(self):
+        # SQLite connections belong to the thread that made them, so workers get their own
+        return type(self)(self.path, json_path=None, client_id=self.client_id, user=self.user)
+
+    def close(self):
+        self.conn.close()
+
+class SharedSqliteLeadsStore(SqliteLeadsStore):
+    # The SQLite store on a shared drive, for several estimators at once.
+    # WAL needs shared memory that network file systems don't provide, so this
+    # uses a rollback journal and full syncs. LEADS_SHARED_DB names the
+    # database; the first client to open it imports the leads_data.json
+    # beside it.
+    JOURNAL_MODE = "DELETE"
+    SYNCHRONOUS = "FULL"
+
+    def __init__(self, path=None, json_path=missing, client_id=None, user=None):
+        path = path or os.environ.get("LEADS_SHARED_DB", "leads_data.db")
+        if json_path is missing:
+            json_path = os.path.join(os.path.dirname(os.path.abspath(path)), "leads_data.json")
+        super().__init__(path, json_path, client_id, user)
+
+def current_user():
+    # LEADS_USER, or the login name; every estimator on a shared drive is told apart by it
+    try:
+        return os.environ.get(HISTORY_USER_ENV) or getpass.getuser()
+    except Exception:
+        return "unknown"
+
+class PrefixIndex:
+    # Maps keys to sets of lead ids and keeps the keys sorted, so a prefix
+    # lookup is a bisect plus a short scan instead of a pass over every lead.
+    # keys is None while bulk loading and is sorted once on the next lookup.
+    def __init__(self):
+        self.ids_by_key = {}
+        self.keys = []
+
+    def add(self, key, lead_id):
+        ids = self.ids_by_key.get(key)
+        if ids is None:
+            self.ids_by_key[key] = {lead_id}
+            if self.keys is not None:
+                bisect.insort(self.keys, key)
+        else:
+            ids.add(lead_id)
+
+    def begin_bulk_load(self):
+        self.keys = None
+
+    def end_bulk_load(self):
+        # Sorted in chunks and merged, so a worker thread doing this never holds
+        # the GIL long enough to stall the GUI
+        if self.keys is None:
+            keys = list(self.ids_by_key)
+            chunks = [sorted(keys[start:start + 50000]) for start in range(0, len(keys), 50000)]
+            self.keys = list(heapq.merge(*chunks))
+
+    def _sorted_keys(self):
+        if self.keys is None:
+            self.keys = sorted(self.ids_by_key)
+        return self.keys
+
+    def discard(self, key, lead_id):
+        ids = self.ids_by_key.get(key)
+        if ids is None:
+            return
+        ids.discard(lead_id)
+        if not ids:
+            del self.ids_by_key[key]
+            if self.keys is not None:
+                del self.keys[bisect.bisect_left(self.keys, key)]
+
+    def exact(self, key):
+        return self.ids_by_key.get(key, set())
+
+    def prefix_keys(self, prefix):
+        keys = self._sorted_keys()
+        start = bisect.bisect_left(keys, prefix)
+        return itertools.takewhile(lambda key: key.startswith(prefix), itertools.islice(keys, start, None))
+
+    def prefix(self, prefix):
+        matches = set()
+        for key in self.prefix_keys(prefix):
+            matches |= self.ids_by_key[key]
+        return matches
+
+class LeadsIndex:
+    # In-memory search index over the store. Built once on first use, then kept
+    # current from the table model's lead_added/lead_updated/lead_removed signals.
+    TEXT_FIELDS = ["First Name", "Last Name", "Email", "Phone"]
+    FILTER_FIELDS = ["Lead Status", "Job Type", "City", "State", "Zip", "Referred By"]
+    AREA_FIELDS = ["City", "State", "Zip"]
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Forget everything; the next search rebuilds from the store
+        self.built = False
+        self.text = PrefixIndex()
+        self.fields = [PrefixIndex() for field in self.FILTER_FIELDS]
+        # lead id -> (tokens, normalized FILTER_FIELDS values), for updates and removals
+        self._keys_by_id = {}
+
+    @staticmethod
+    def normalize(value):
+        return str(value).strip().lower()
+
+    @staticmethod
+    def tokenize(text):
+        return TOKEN_RE.findall(text.lower())
+
+    def _lead_keys(self, lead):
+        tokens = set(TOKEN_RE.findall(f"{lead.get('First Name', '')} {lead.get('Last Name', '')} {lead.get('Email', '')}".lower()))
+        email = lead.get("Email", "").strip().lower()
+        if email:
+            tokens.add(email)
+        # Full phone number plus the local number and last four digits
+        digits = NON_DIGIT_RE.sub("", lead.get("Phone", ""))
+        if digits:
+            tokens.update((digits, digits[-7:], digits[-4:]))
+        values = tuple(str(lead.get(field, FIELD_DEFAULTS.get(field, ""))).strip().lower() for field in self.FILTER_FIELDS)
+        return tokens, values
+
+    def build(self, store):
+        self.begin_build()
+        for lead in store.iter_leads():
+            self._add(lead)
+        self.end_build()
+
+    def begin_build(self):
+        self.text.begin_bulk_load()
+        for index in self.fields:
+            index.begin_bulk_load()
+
+    def end_build(self):
+        # Sorting here keeps the cost off the first search
+        self.text.end_bulk_load()
+        for index in self.fields:
+            index.end_bulk_load()
+        self.built = True
+
+    def _add(self, lead):
+        lead_id = lead[LEAD_ID]
+        tokens, values = self._keys_by_id[lead_id] = self._lead_keys(lead)
+        add_token = self.text.add
+        for token in tokens:
+            add_token(token, lead_id)
+        for index, value in zip(self.fields, values):
+            index.add(value, lead_id)
+
+    def _discard(self, lead_id):
+        keys = self._keys_by_id.pop(lead_id, None)
+        if keys is None:
+            return
+        tokens, values = keys
+        for token in tokens:
+            self.text.discard(token, lead_id)
+        for index, value in zip(self.fields, values):
+            index.discard(value, lead_id)
+
+    def add_lead(self, lead):
+        if self.built:
+            self._add(lead)
+
+    def update_lead(self, lead, field, old_value):
+        if self.built and (field in self.TEXT_FIELDS or field in self.FILTER_FIELDS):
+            self._discard(lead[LEAD_ID])
+            self._add(lead)
+
+    def remove_lead(self, lead):
+        if self.built:
+            self._discard(lead[LEAD_ID])
+
+    def search_terms(self, text):
+        # Prefixes that must each match one of a lead's tokens
+        terms = []
+        for word in text.lower().split():
+            if "@" in word:
+                terms.append(word)
+            elif PHONE_QUERY_RE.fullmatch(word):
+                terms.append(NON_DIGIT_RE.sub("", word) or word)
+            else:
+                terms.extend(self.tokenize(word))
+        return terms
+
+    def _text_matches(self, terms):
+        matches = None
+        for term in terms:
+            ids = self.text.prefix(term)
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                break
+        return matches if matches is not None else set()
+
+    def query(self, text="", filters=None):
+        # Lead ids matching the search text and every filter, or None when
+        # nothing is being filtered
+        terms = self.search_terms(text)
+        filters = {field: self.normalize(value) for field, value in (filters or {}).items() if value}
+        if not terms and not filters:
+            return None
+        candidates = []
+        if terms:
+            candidates.append(self._text_matches(terms))
+        for field, value in filters.items():
+            if field == "Area":
+                area = set()
+                for area_field in self.AREA_FIELDS:
+                    area |= self.fields[self.FILTER_FIELDS.index(area_field)].prefix(value)
+                candidates.append(area)
+            elif field in CHOICE_FIELDS:
+                candidates.append(self.fields[self.FILTER_FIELDS.index(field)].exact(value))
+            else:
+                candidates.append(self.fields[self.FILTER_FIELDS.index(field)].prefix(value))
+        candidates.sort(key=len)
+        matches = set(candidates[0])
+        for ids in candidates[1:]:
+            matches &= ids
+        return matches
+
+    def matches(self, lead_id, text="", filters=None):
+        # Checks a single lead against a query without touching the other leads.
+        # An empty query matches every lead, whether or not it is indexed.
+        terms = self.search_terms(text)
+        filters = {field: self.normalize(value) for field, value in (filters or {}).items() if self.normalize(value)}
+        if not terms and not filters:
+            return True
+        keys = self._keys_by_id.get(lead_id)
+        if keys is None:
+            return False
+        tokens, values = keys
+        values = dict(zip(self.FILTER_FIELDS, values))
+        for term in terms:
+            if not any(token.startswith(term) for token in tokens):
+                return False
+        for field, value in filters.items():
+            if field == "Area":
+                if not any(values[area_field].startswith(value) for area_field in self.AREA_FIELDS):
+                    return False
+            elif field in CHOICE_FIELDS:
+                if values[field] != value:
+                    return False
+            elif not values[field].startswith(value):
+                return False
+        return True
+
+class NotesIndex:
+    # Inverted index over lead Notes for stores without SQLite's FTS5: a
+    # PrefixIndex from each word to the leads using it, plus each lead's word
+    # counts for ranking. Every query word must start some word in the notes;
+    # matches are ranked with BM25, as FTS5 ranks them.
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.words = PrefixIndex()
+        # {lead id: Counter of its words}, and {lead id: its number of words}
+        self.counts = {}
+        self.lengths = {}
+        self.total_words = 0
+
+    @staticmethod
+    def tokenize(text):
+        return TOKEN_RE.findall(str(text or "").lower())
+
+    def build(self, store):
+        self.words.begin_bulk_load()
+        for lead_id, notes in store.iter_field_values("Notes"):
+            self.set_notes(lead_id, notes)
+        self.words.end_bulk_load()
+
+    def set_notes(self, lead_id, notes):
+        old_counts = self.counts.pop(lead_id, None)
+        if old_counts is not None:
+            self.total_words -= self.lengths.pop(lead_id)
+            for word in old_counts:
+                self.words.discard(word, lead_id)
+        words = self.tokenize(notes)
+        counts = Counter(words)
+        if counts:
+            self.counts[lead_id] = counts
+            self.lengths[lead_id] = len(words)
+            self.total_words += len(words)
+            for word in counts:
+                self.words.add(word, lead_id)
+
+    def search(self, query, limit=None):
+        terms = self.tokenize(query)
+        if not terms or not self.counts:
+            return []
+        average_length = self.total_words / len(self.counts)
+        lengths = self.lengths
+        scores = None
+        for term in terms:
+            term_scores = Counter()
+            for word in self.words.prefix_keys(term):
+                lead_ids = self.words.exact(word)
+                idf = math.log(1 + (len(self.counts) - len(lead_ids) + 0.5) / (len(lead_ids) + 0.5))
+                for lead_id in lead_ids:
+                    frequency = self.counts[lead_id][word]
+                    term_scores[lead_id] += idf * frequency * (self.K1 + 1) / (frequency + self.K1 * (1 - self.B + self.B * lengths[lead_id] / average_length))
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = Counter({lead_id: score + term_scores[lead_id] for lead_id, score in scores.items() if lead_id in term_scores})
+            if not scores:
+                return []
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0])) if limit else \
+            sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+def notes_match(notes, query):
+    # Whether every word of query starts some word of notes, as search_notes matches
+    words = NotesIndex.tokenize(notes)
+    return all(any(word.startswith(term) for word in words) for term in NotesIndex.tokenize(query))
+
+def notes_snippet(notes, query, words=NOTES_SNIPPET_WORDS):
+    # The stretch of notes around the first match for query, with matching
+    # words wrapped in NOTES_MATCH_START/END and "..." for the parts cut off.
+    # words=None keeps the whole text.
+    terms = NotesIndex.tokenize(query)
+    parts = str(notes or "").split()
+    matched = [bool(terms) and any(token.startswith(term) for token in TOKEN_RE.findall(part.lower()) for term in terms) for part in parts]
+    start, end = 0, len(parts)
+    if words is not None and len(parts) > words:
+        first = matched.index(True) if True in matched else 0
+        start = max(0, min(first - words // 3, len(parts) - words))
+        end = start + words
+    snippet = " ".join(f"{NOTES_MATCH_START}{part}{NOTES_MATCH_END}" if is_match else part
+                       for part, is_match in zip(parts[start:end], matched[start:end]))
+    return ("..." if start > 0 else "") + snippet + ("..." if end < len(parts) else "")
+
+class DuplicateIndex:
+    # Blocking index for duplicate detection. Leads are only compared with
+    # leads that share a blocking key (phone, email, or last name plus zip),
+    # so finding candidates costs about the size of the matching blocks
+    # instead of comparing every pair. A shared key only makes two leads
+    # worth comparing: each pair is scored on every field they both have
+    # (score), and only pairs scoring DUPLICATE_SCORE count, so a shared office
+    # phone or two different Smiths in one ZIP are not taken for one lead.
+    # Points for each field two leads share, and taken off when both have it
+    # but it differs
+    MATCH_POINTS = {"email": 3, "phone": 2, "address": 2, "last_name": 1, "first_name": 1, "zip": 1}
+    CONFLICT_POINTS = {"email": 1, "phone": 1, "last_name": 2, "first_name": 2}
+    DUPLICATE_SCORE = 3
+    # Blocks with more leads than this are too broad to pair up; their
+    # duplicates are still found through the leads' other keys
+    BLOCK_LIMIT = 50
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.built = False
+        self.blocks = {}
+        self._keys_by_id = {}
+
+    @staticmethod
+    def blocking_keys(lead):
+        keys = set()
+        digits = NON_DIGIT_RE.sub("", lead.get("Phone", ""))
+        if len(digits) >= 7:
+            keys.add(("phone", digits[-10:]))
+        email = lead.get("Email", "").strip().lower()
+        if email:
+            keys.add(("email", email))
+        last_name = " ".join(lead.get("Last Name", "").lower().split())
+        zip_code = lead.get("Zip", "").strip()[:5]
+        if last_name and zip_code:
+            keys.add(("name_zip", f"{last_name}|{zip_code}"))
+        return keys
+
+    def build(self, store):
+        for lead in store.iter_leads():
+            self._add(lead)
+        self.built = True
+
+    def _add(self, lead):
+        lead_id = lead[LEAD_ID]
+        keys = self._keys_by_id[lead_id] = self.blocking_keys(lead)
+        for key in keys:
+            self.blocks.setdefault(key, set()).add(lead_id)
+
+    def _discard(self, lead_id):
+        for key in self._keys_by_id.pop(lead_id, ()):
+            block = self.blocks[key]
+            block.discard(lead_id)
+            if not block:
+                del self.blocks[key]
+
+    def add_lead(self, lead):
+        if self.built:
+            self._add(lead)
+
+    def update_lead(self, lead, field, old_value):
+        if self.built and field in ("Phone", "Email", "Last Name", "Zip"):
+            self._discard(lead[LEAD_ID])
+            self._add(lead)
+
+    def remove_lead(self, lead):
+        if self.built:
+            self._discard(lead[LEAD_ID])
+
+    def candidates(self, lead):
+        # Ids of existing leads that share a blocking key with lead
+        matches = set()
+        for key in self.blocking_keys(lead):
+            matches |= self.blocks.get(key, set())
+        matches.discard(lead.get(LEAD_ID))
+        return matches
+
+    @staticmethod
+    def match_fields(lead):
+        # The fields two leads are scored on, normalized
+        digits = NON_DIGIT_RE.sub("", lead.get("Phone", ""))
+        return {
+            "email": lead.get("Email", "").strip().lower(),
+            "phone": digits[-10:] if len(digits) >= 7 else "",
+            "address": " ".join(TOKEN_RE.findall(lead.get("Address Line 1", "").lower())),
+            "last_name": " ".join(lead.get("Last Name", "").lower().split()),
+            "first_name": " ".join(lead.get("First Name", "").lower().split()),
+            "zip": lead.get("Zip", "").strip()[:5],
+        }
+
+    @classmethod
+    def score(cls, fields, other_fields):
+        # How alike two leads' match_fields are
+        score = 0
+        for field, points in cls.MATCH_POINTS.items():
+            value, other = fields[field], other_fields[field]
+            if not value or not other:
+                continue
+            # "J" and "John" may well be the same first name
+            if value == other or (field == "first_name" and min(len(value), len(other)) == 1 and value[0] == other[0]):
+                score += points
+            else:
+                score -= cls.CONFLICT_POINTS.get(field, 0)
+        return score
+
+    def likely_duplicates(self, lead, store):
+        # Existing leads that score as duplicates of lead, most alike first
+        fields = self.match_fields(lead)
+        scored = [(self.score(fields, self.match_fields(other)), other) for other in store.fetch_leads_by_ids(sorted(self.candidates(lead)))]
+        return [other for score, other in sorted(scored, key=lambda item: -item[0]) if score >= self.DUPLICATE_SCORE]
+
+    def duplicate_pairs(self, store):
+        # {(lead id, lead id): score} for the pairs sharing a blocking key
+        # that score as duplicates. Only leads in those blocks are read.
+        pairs = set()
+        for block in self.blocks.values():
+            if 2 <= len(block) <= self.BLOCK_LIMIT:
+                pairs.update(itertools.combinations(sorted(block), 2))
+        fields = {lead[LEAD_ID]: self.match_fields(lead)
+                  for lead in store.fetch_leads_by_ids(sorted({lead_id for pair in pairs for lead_id in pair}))}
+        scored = {}
+        for first, second in pairs:
+            if first in fields and second in fields:
+                score = self.score(fields[first], fields[second])
+                if score >= self.DUPLICATE_SCORE:
+                    scored[(first, second)] = score
+        return scored
+
+    def duplicate_groups(self, store):
+        # Groups of two or more lead ids joined by duplicate_pairs, found with
+        # a union-find over the pairs
+        parent = {}
+
+        def find(lead_id):
+            root = lead_id
+            while parent[root] != root:
+                root = parent[root]
+            while lead_id != root:
+                parent[lead_id], lead_id = root, parent[lead_id]
+            return root
+
+        for first, second in self.duplicate_pairs(store):
+            parent.setdefault(first, first)
+            parent.setdefault(second, second)
+            root, other = find(first), find(second)
+            if other != root:
+                parent[other] = root
+        groups = {}
+        for lead_id in parent:
+            groups.setdefault(find(lead_id), []).append(lead_id)
+        return sorted((sorted(group) for group in groups.values()), key=lambda group: group[0])
+
+class SortKeys:
+    # Normalized sort keys by field and lead id. A field's keys are loaded the
+    # first time its column is sorted, then kept current from model edits like
+    # the indexes. Choice fields sort in workflow order, their position in
+    # CHOICE_FIELDS, rather than alphabetically.
+    CHOICE_ORDER = {field: {choice: position for position, choice in enumerate(choices)} for field, choices in CHOICE_FIELDS.items()}
+
+    def __init__(self):
+        self.keys = {}
+
+    @classmethod
+    def sort_key(cls, field, value):
+        if field in cls.CHOICE_ORDER:
+            order = cls.CHOICE_ORDER[field]
+            return order.get(value, len(order))
+        return " ".join(str(value).lower().split())
+
+    def _set(self, lead):
+        for field, keys in self.keys.items():
+            keys[lead[LEAD_ID]] = self.sort_key(field, lead.get(field, FIELD_DEFAULTS.get(field, "")))
+
+    def add_lead(self, lead):
+        self._set(lead)
+
+    def update_lead(self, lead, field, old_value):
+        if field in self.keys:
+            self._set(lead)
+
+    def remove_lead(self, lead):
+        for keys in self.keys.values():
+            keys.pop(lead[LEAD_ID], None)
+
+    def sort(self, lead_ids, columns):
+        # Stable multi-column sort. columns is a list of (field, descending),
+        # most significant first; leads that tie on every column keep the
+        # order they came in. Sorting an already sorted list by one new column
+        # is the same as sorting by it and then every earlier column.
+        lead_ids = list(lead_ids)
+        for field, descending in reversed(columns):
+            keys = self.keys[field]
+            try:
+                lead_ids.sort(key=keys.__getitem__, reverse=descending)
+            except KeyError:
+                blank = self.sort_key(field, FIELD_DEFAULTS.get(field, ""))
+                lead_ids.sort(key=lambda lead_id: keys.get(lead_id, blank), reverse=descending)
+        return lead_ids
+
+@instrumented("search_notes")
+def rank_notes(store, query, report_progress=None, is_cancelled=None):
+    # Ids of the leads whose Notes match query, best first
+    if is_cancelled and is_cancelled():
+        # Typing went on before the search started
+        raise TaskCancelled()
+    return [lead_id for lead_id, score in store.search_notes(query)]
+
+@instrumented("load_sort_keys")
+def load_sort_keys(store, fields, report_progress=None, is_cancelled=None):
+    # {field: {lead id: sort key}} for the given fields, for SortKeys.keys
+    loaded = {}
+    for done, field in enumerate(fields):
+        if is_cancelled and is_cancelled():
+            raise TaskCancelled()
+        if report_progress:
+            report_progress(done, len(fields))
+        sort_key = SortKeys.sort_key
+        loaded[field] = {lead_id: sort_key(field, value) for lead_id, value in store.iter_field_values(field)}
+    return loaded
+
+class PipelineStats:
+    # Lead counts for the pipeline dashboard, by Lead Status, Job Type, Referred
+    # By and City/State, plus closed leads per referral source. build reads
+    # the few fields involved once; after that the counts are kept current
+    # from model edits like the indexes, so reading them never scans the leads.
+    # Each lead's groups are remembered, so an edit moves it out of the groups
+    # it was counted in whatever old value it reports, and a change applied
+    # twice (replayed over a build that already had it) counts once.
+    BREAKDOWNS = {
+        "Lead Status": ("Lead Status",),
+        "Job Type": ("Job Type",),
+        "Referred By": ("Referred By",),
+        "City/State": ("City", "State"),
+    }
+    FIELDS = [field for fields in BREAKDOWNS.values() for field in fields]
+    # The Lead Status that counts a lead as converted
+    CONVERTED_STATUS = "Closed"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.total = 0
+        self.counts = {name: Counter() for name in self.BREAKDOWNS}
+        self.converted = Counter()
+        # {lead id: its group in each breakdown}
+        self.groups = {}
+        self.built = False
+
+    @staticmethod
+    def group(values):
+        # "Austin, TX" for ("Austin", "TX"); blank parts are left out
+        return sys.intern(", ".join(value for value in (str(value or "").strip() for value in values) if value))
+
+    def _lead_groups(self, values):
+        # values are the lead's FIELDS, in order
+        groups, position = [], 0
+        for fields in self.BREAKDOWNS.values():
+            groups.append(self.group(values[position:position + len(fields)]))
+            position += len(fields)
+        return tuple(groups)
+
+    def _add_counts(self, counter, key, count):
+        counter[key] += count
+        if counter[key] <= 0:
+            del counter[key]
+
+    def _count(self, groups, count):
+        status, job_type, referred_by, area = groups
+        self.total += count
+        for counter, group in zip(self.counts.values(), groups):
+            self._add_counts(counter, group, count)
+        if status == self.CONVERTED_STATUS:
+            self._add_counts(self.converted, referred_by, count)
+
+    def _set(self, lead_id, groups):
+        old_groups = self.groups.pop(lead_id, None)
+        if old_groups is not None:
+            self._count(old_groups, -1)
+        if groups is not None:
+            self.groups[lead_id] = groups
+            self._count(groups, 1)
+
+    def build(self, store, report_progress=None, is_cancelled=None):
+        self.reset()
+        for lead_id, *values in checked_rows(store, store.iter_fields(self.FIELDS), report_progress, is_cancelled):
+            self._set(lead_id, self._lead_groups(values))
+        self.built = True
+
+    def add_lead(self, lead):
+        self._set(lead[LEAD_ID], self._lead_groups([lead.get(field, FIELD_DEFAULTS.get(field, "")) for field in self.FIELDS]))
+
+    def update_lead(self, lead, field, old_value):
+        if field in self.FIELDS:
+            self.add_lead(lead)
+
+    def remove_lead(self, lead):
+        self._set(lead[LEAD_ID], None)
+
+    def breakdown(self, name):
+        # [(group, leads)] with choice fields in workflow order and everything
+        # else by count, largest first
+        counts = self.counts[name]
+        if name in CHOICE_FIELDS:
+            order = {choice: position for position, choice in enumerate(CHOICE_FIELDS[name])}
+            return sorted(counts.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def conversion_rates(self):
+        # [(referral source, leads, converted leads, conversion rate)], largest source first
+        return [(source, leads, self.converted[source], self.converted[source] / leads)
+                for source, leads in self.breakdown("Referred By")]
+
+@instrumented("pipeline_stats")
+def load_pipeline_stats(store, report_progress=None, is_cancelled=None):
+    # A built PipelineStats
+    stats = PipelineStats()
+    stats.build(store, report_progress, is_cancelled)
+    return stats
+
+# US national ZIP areas by a ZIP's first digit, with the states each covers.
+# The first three digits name a sectional center facility, whose ZIPs lie
+# within a short drive of each other, so they make a visit area.
+ZIP_REGIONS = {
+    "0": ("Northeast", "CT MA ME NH NJ PR RI VT"),
+    "1": ("Mid-Atlantic", "DE NY PA"),
+    "2": ("Capital and Carolinas", "DC MD NC SC VA WV"),
+    "3": ("Southeast", "AL FL GA MS TN"),
+    "4": ("Great Lakes", "IN KY MI OH"),
+    "5": ("Upper Midwest", "IA MN MT ND SD WI"),
+    "6": ("Central", "IL KS MO NE"),
+    "7": ("South Central", "AR LA OK TX"),
+    "8": ("Mountain", "AZ CO ID NM NV UT WY"),
+    "9": ("Pacific", "AK CA HI OR WA"),
+}
+STATE_REGIONS = {state: digit for digit, (name, states) in ZIP_REGIONS.items() for state in states.split()}
+ZIP_PREFIX_RE = re.compile(r"\s*(\d{3})(\d{2})?")
+HOUSE_NUMBER_RE = re.compile(r"\s*(\d+)\W*(.*)")
+# Leads in a visit batch unless another size is asked for
+VISIT_BATCH_SIZE = 8
+
+class AreaIndex:
+    # Open leads (OPEN_STATUSES) grouped into visit areas without any
+    # geocoding: by ZIP prefix, or by city and state for leads without a ZIP,
+    # under the national region the ZIP or state falls in. Each lead's area and
+    # route position are worked out once, on build or edit, and each area's
+    # batches are cached until a lead joins, leaves or moves within it, so
+    # regrouping only sorts the areas that changed.
+    FIELDS = ["Lead Status", "City", "State", "Zip", "Address Line 1"]
+
+    def __init__(self, batch_size=VISIT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.reset()
+
+    def reset(self):
+        # {lead id: (area, place, route key)} for open leads
+        self.leads = {}
+        # {area: {lead id: route key}}
+        self.areas = {}
+        # {area: Counter of "City, ST" places}, to name the area
+        self.places = {}
+        # {area: [[lead id, ...], ...]} for batch_size
+        self.batch_cache = {}
+        self.built = False
+
+    @staticmethod
+    def locate(city, state, zip_code):
+        # (region digit, area) for a lead. An area is a ZIP prefix like "787",
+        # or "austin, tx" when the ZIP is missing; the region is "" when
+        # neither the ZIP nor the state places it.
+        match = ZIP_PREFIX_RE.match(zip_code)
+        if match:
+            return match.group(1)[0], match.group(1)
+        state = state.strip().upper()
+        place = ", ".join(value for value in (city.strip().lower(), state.lower()) if value)
+        return STATE_REGIONS.get(state, ""), place
+
+    @staticmethod
+    def route_key(zip_code, address, lead_id):
+        # Orders an area's leads by ZIP, then street, then house number, so a
+        # batch walks along streets rather than jumping between them
+        match = ZIP_PREFIX_RE.match(zip_code)
+        zip5 = match.group(0).strip() if match else ""
+        match = HOUSE_NUMBER_RE.match(address)
+        if match:
+            return zip5, match.group(2).lower(), int(match.group(1)), lead_id
+        return zip5, address.strip().lower(), 0, lead_id
+
+    def _entry(self, lead_id, values):
+        # values are the lead's FIELDS, in order; None for leads not open
+        status, city, state, zip_code, address = (str(value or "") for value in values)
+        if status not in OPEN_STATUSES:
+            return None
+        area = self.locate(city, state, zip_code)
+        place = PipelineStats.group((city.strip().title(), state.strip().upper()))
+        return area, place, self.route_key(zip_code, address, lead_id)
+
+    def _set(self, lead_id, entry):
+        old_entry = self.leads.pop(lead_id, None)
+        if old_entry == entry:
+            if entry is not None:
+                self.leads[lead_id] = entry
+            return
+        if old_entry is not None:
+            area, place, route_key = old_entry
+            del self.areas[area][lead_id]
+            places = self.places[area]
+            places[place] -= 1
+            if places[place] <= 0:
+                del places[place]
+            if not self.areas[area]:
+                del self.areas[area], self.places[area]
+            self.batch_cache.pop(area, None)
+        if entry is not None:
+            area, place, route_key = entry
+            self.leads[lead_id] = entry
+            self.areas.setdefault(area, {})[lead_id] = route_key
+            self.places.setdefault(area, Counter())[place] += 1
+            self.batch_cache.pop(area, None)
+
+    def build(self, store, report_progress=None, is_cancelled=None):
+        self.reset()
+        for lead_id, *values in checked_rows(store, store.iter_fields(self.FIELDS), report_progress, is_cancelled):
+            entry = self._entry(lead_id, values)
+            if entry is not None:
+                self._set(lead_id, entry)
+        self.built = True
+
+    def add_lead(self, lead):
+        self._set(lead[LEAD_ID], self._entry(lead[LEAD_ID], [lead.get(field, FIELD_DEFAULTS.get(field, "")) for field in self.FIELDS]))
+
+    def update_lead(self, lead, field, old_value):
+        if field in self.FIELDS:
+            self.add_lead(lead)
+
+    def remove_lead(self, lead):
+        self._set(lead[LEAD_ID], None)
+
+    def set_batch_size(self, batch_size):
+        if batch_size != self.batch_size:
+            self.batch_size = batch_size
+            self.batch_cache = {}
+
+    def area_name(self, area):
+        # "787 Austin, TX" for a ZIP prefix, naming its most common place
+        region, key = area
+        if not ZIP_PREFIX_RE.fullmatch(key):
+            place = self.places[area].most_common(1)[0][0]
+            return place or "(no city or state)"
+        places = self.places[area].most_common(2)
+        names = ", ".join(place for place, leads in places if place)
+        return f"{key}xx {names}" if names else f"{key}xx"
+
+    @staticmethod
+    def region_name(region):
+        if region in ZIP_REGIONS:
+            name, states = ZIP_REGIONS[region]
+            return f"{name} ({', '.join(states.split())})"
+        return "Unknown region"
+
+    def regions(self):
+        # [(region, [(area, leads), ...])] in region order with the ZIP
+        # prefixes first, then the areas named by city, and the unplaced last
+        regions = {}
+        for area, leads in self.areas.items():
+            regions.setdefault(area[0], []).append((area, len(leads)))
+        return [(region, sorted(regions[region])) for region in sorted(regions, key=lambda region: region or "~")]
+
+    def batches(self, area):
+        # The area's leads in route order, split into batches of batch_size
+        batches = self.batch_cache.get(area)
+        if batches is None:
+            leads = self.areas.get(area, {})
+            route = [lead_id for route_key, lead_id in sorted((route_key, lead_id) for lead_id, route_key in leads.items())]
+            batches = self.batch_cache[area] = [route[start:start + self.batch_size] for start in range(0, len(route), self.batch_size)]
+        return batches
+
+    def all_batches(self):
+        # [(area, batches)] for every area, in regions() order
+        return [(area, self.batches(area)) for region, areas in self.regions() for area, leads in areas]
+
+@instrumented("area_index")
+def load_area_index(store, report_progress=None, is_cancelled=None):
+    # A built AreaIndex
+    index = AreaIndex()
+    index.build(store, report_progress, is_cancelled)
+    return index
+
+def normalize_follow_up(text):
+    # The stored form of a follow-up typed as any of FOLLOW_UP_FORMATS, or ""
+    # for a blank one; raises ValueError for anything else
+    text = " ".join(str(text or "").split())
+    if not text:
+        return ""
+    for position, date_format in enumerate(FOLLOW_UP_FORMATS):
+        try:
+            when = datetime.datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+        return when.strftime(FOLLOW_UP_FORMATS[position % 2])
+    raise ValueError(f"{text!r} is not a follow-up date like 2024-05-01 or 2024-05-01 14:30")
+
+def follow_up_key(when):
+    # Follow-ups due at datetime when sort at or before this. A follow-up
+    # with no time is due from the start of its day.
+    return when.strftime(FOLLOW_UP_FORMATS[0])
+
+def follow_ups_due_by(day):
+    # Follow-ups due on or before date day sort before this
+    return (day + datetime.timedelta(days=1)).strftime(FOLLOW_UP_FORMATS[1])
+
+class FollowUpQueue:
+    # Follow-ups waiting to come due, in a heap ordered by when they are due,
+    # so checking for due ones only looks at the top. Kept current from model
+    # edits like the indexes. An edit pushes a new entry and leaves the old
+    # one in place: entries that are no longer their lead's follow-up are
+    # dropped as they reach the top, and the heap is rebuilt once they make up
+    # most of it. Follow-ups that have come due are remembered, so a rebuild or
+    # a replayed edit doesn't raise them again; setting a new one does.
+    FIELDS = [FOLLOW_UP_FIELD]
+    # Stale entries allowed beyond the live ones before the heap is rebuilt
+    STALE_ENTRIES = 1000
+
+    def __init__(self, raised=None):
+        # {lead id: follow-up} for follow-ups already raised
+        self.raised = {} if raised is None else raised
+        self.reset()
+
+    def reset(self):
+        # [(follow-up, lead id)], including stale entries
+        self.heap = []
+        # {lead id: follow-up} for follow-ups not yet due
+        self.pending = {}
+        self.built = False
+
+    def _set(self, lead_id, follow_up):
+        if self.raised.get(lead_id) == follow_up:
+            return
+        self.raised.pop(lead_id, None)
+        if self.pending.get(lead_id, "") == follow_up:
+            return
+        self.pending.pop(lead_id, None)
+        if follow_up:
+            self.pending[lead_id] = follow_up
+            heapq.heappush(self.heap, (follow_up, lead_id))
+        if len(self.heap) > 2 * len(self.pending) + self.STALE_ENTRIES:
+            self.heap = [(follow_up, lead_id) for lead_id, follow_up in self.pending.items()]
+            heapq.heapify(self.heap)
+
+    def build(self, store, report_progress=None, is_cancelled=None):
+        self.reset()
+        for lead_id, follow_up in checked_rows(store, store.iter_fields(self.FIELDS), report_progress, is_cancelled):
+            if follow_up and self.raised.get(lead_id) != follow_up:
+                self.pending[lead_id] = follow_up
+        self.heap = [(follow_up, lead_id) for lead_id, follow_up in self.pending.items()]
+        heapq.heapify(self.heap)
+        self.built = True
+
+    def add_lead(self, lead):
+        self._set(lead[LEAD_ID], lead.get(FOLLOW_UP_FIELD) or "")
+
+    def update_lead(self, lead, field, old_value):
+        if field in self.FIELDS:
+            self.add_lead(lead)
+
+    def remove_lead(self, lead):
+        self._set(lead[LEAD_ID], "")
+        self.raised.pop(lead[LEAD_ID], None)
+
+    def next_due(self):
+        # (follow-up, lead id) for the soonest pending follow-up, or None
+        heap = self.heap
+        while heap and self.pending.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def pop_due(self, now):
+        # [(follow-up, lead id)] for the pending follow-ups due by now (a
+        # follow_up_key), soonest first; they are remembered as raised
+        due = []
+        entry = self.next_due()
+        while entry is not None and entry[0] <= now:
+            heapq.heappop(self.heap)
+            follow_up, lead_id = entry
+            del self.pending[lead_id]
+            self.raised[lead_id] = follow_up
+            due.append(entry)
+            entry = self.next_due()
+        return due
+
+@instrumented("follow_up_queue")
+def load_follow_up_queue(store, raised=None, report_progress=None, is_cancelled=None):
+    # A built FollowUpQueue
+    queue = FollowUpQueue(raised)
+    queue.build(store, report_progress, is_cancelled)
+    return queue
+
+# Garbage collector thresholds while indexes are built. The indexes are
+# millions of small sets and tuples, and at the default thresholds the
+# collector runs thousands of times during a build, walking them while
+# holding the GIL; see leads_bench.py gc.
+INDEX_BUILD_GC_THRESHOLDS = (10000, 100, 1000)
+_gc_thresholds_lock = threading.Lock()
+_gc_thresholds_state = {"users": 0, "saved": None}
+
+@contextlib.contextmanager
+def gc_thresholds(thresholds):
+    # Sets the collector's thresholds while the block runs. They are
+    # process-wide, so overlapping blocks share the change and the last one
+    # out puts the old thresholds back. None leaves them alone.
+    if thresholds is None:
+        yield
+        return
+    state = _gc_thresholds_state
+    with _gc_thresholds_lock:
+        if not state["users"]:
+            state["saved"] = gc.get_threshold()
+            gc.set_threshold(*thresholds)
+        state["users"] += 1
+    try:
+        yield
+    finally:
+        with _gc_thresholds_lock:
+            state["users"] -= 1
+            if not state["users"]:
+                gc.set_threshold(*state["saved"])
+
+@instrumented("build_indexes")
+def build_lead_indexes(store, report_progress=None, is_cancelled=None, gc_thresholds_during=INDEX_BUILD_GC_THRESHOLDS):
+    # Builds a LeadsIndex and a DuplicateIndex in one pass over the store, so
+    # both can be built on a worker thread and handed to the GUI when done
+    search_index, duplicate_index = LeadsIndex(), DuplicateIndex()
+    with gc_thresholds(gc_thresholds_during):
+        search_index.begin_build()
+        for lead in checked_rows(store, store.iter_leads(), report_progress, is_cancelled):
+            search_index._add(lead)
+            duplicate_index._add(lead)
+        search_index.end_build()
+    duplicate_index.built = True
+    return search_index, duplicate_index
+
+def merge_lead_fields(keep, others):
+    # Field changes that fill the kept lead's blanks from its duplicates and
+    # append their notes
+    changes = {}
+    for field in LEAD_FIELDS:
+        if field in CHOICE_FIELDS or field == "Notes":
+            continue
+        if not keep.get(field):
+            value = next((other[field] for other in others if other.get(field)), "")
+            if value:
+                changes[field] = value
+    notes = [keep.get("Notes", "")]
+    for other in others:
+        if other.get("Notes") and other["Notes"] not in notes:
+            notes.append(other["Notes"])
+    notes = "\n".join(note for note in notes if note)
+    if notes != keep.get("Notes", ""):
+        changes["Notes"] = notes
+    return changes
+
+STORE_BACKENDS = {"sqlite": SqliteLeadsStore, "json": JsonLeadsStore, "shared": SharedSqliteLeadsStore}
+
+@instrumented("load")
+def open_leads_store(backend=None):
+    # LEADS_STORE=json keeps the old single-file behaviour
+    backend = backend or os.environ.get("LEADS_STORE", "sqlite")
+    return STORE_BACKENDS[backend]()
+
+# Fields written by the exports, in column order
+EXPORT_FIELDS = ["First Name", "Last Name", "Address Line 1", "Address Line 2", "City", "State", "Zip", "Phone", "Email", "Notes", "Job Type", "Lead Status", "Referred By", "Referred To", "Follow Up"]
+
+class TaskCancelled(Exception):
+    pass
+
+def checked_rows(store, rows, report_progress=None, is_cancelled=None, every=5000):
+    # Yields rows read from store. Every so many it reports how far through
+    # the store's leads it is and raises TaskCancelled if the task was
+    # cancelled, for builds that run as scheduler tasks.
+    if not report_progress and not is_cancelled:
+        yield from rows
+        return
+    total = store.count_leads() if report_progress else 0
+    for done, row in enumerate(rows, 1):
+        yield row
+        if done % every == 0:
+            if is_cancelled and is_cancelled():
+                raise TaskCancelled()
+            if report_progress:
+                report_progress(done, total)
+
+@instrumented("export_csv")
+def write_leads_csv(store, file_name, report_progress=None, is_cancelled=None):
+    # Streams every lead from the store to file_name a page at a time. A
+    # cancelled export leaves no partial file behind.
+    total = store.count_leads()
+    done = 0
+    try:
+        with open(file_name, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(EXPORT_FIELDS)
+            for lead in store.iter_leads(page_size=1000):
+                writer.writerow([lead.get(field, FIELD_DEFAULTS.get(field, "")) for field in EXPORT_FIELDS])
+                done += 1
+                if done % 1000 == 0:
+                    if is_cancelled and is_cancelled():
+                        raise TaskCancelled()
+                    if report_progress:
+                        report_progress(done, total)
+    except TaskCancelled:
+        os.remove(file_name)
+        raise
+    if report_progress:
+        report_progress(done, total)
+    return done
+
+@instrumented("export_txt")
+def write_leads_txt(store, file_name, report_progress=None, is_cancelled=None):
+    # Same as write_leads_csv, as one "Field: value" block per lead
+    total = store.count_leads()
+    done = 0
+    try:
+        with open(file_name, "w") as file:
+            for lead in store.iter_leads(page_size=1000):
+                for field in EXPORT_FIELDS:
+                    file.write(f"{field}: {lead.get(field, FIELD_DEFAULTS.get(field, ''))}\n")
+                file.write("\n")
+                done += 1
+                if done % 1000 == 0:
+                    if is_cancelled and is_cancelled():
+                        raise TaskCancelled()
+                    if report_progress:
+                        report_progress(done, total)
+    except TaskCancelled:
+        os.remove(file_name)
+        raise
+    if report_progress:
+        report_progress(done, total)
+    return done
+
+# PDF export layout: each page is its own table with a fixed number of rows
+PDF_COLUMNS = [("Name", 110), ("Address", 170), ("Phone", 80), ("Email", 130), ("Job Type", 65), ("Lead Status", 70), ("Notes", 115)]
+PDF_ROWS_PER_PAGE = 30
+
+def pdf_row(lead):
+    def clip(text, width):
+        # Keep cells on one line so every page holds exactly PDF_ROWS_PER_PAGE rows
+        limit = width // 4
+        text = " ".join(str(text).split())
+        return text if len(text) <= limit else text[:limit - 1] + "\u2026"
+    name = f"{lead.get('First Name', '')} {lead.get('Last Name', '')}".strip()
+    address = ", ".join(part for part in (lead.get(field, "") for field in ("Address Line 1", "Address Line 2", "City", "State", "Zip")) if part)
+    values = [name, address, lead.get("Phone", ""), lead.get("Email", ""), lead.get("Job Type", ""), lead.get("Lead Status", ""), lead.get("Notes", "")]
+    return [clip(value, width) for value, (_, width) in zip(values, PDF_COLUMNS)]
+
+@instrumented("export_pdf")
+def write_leads_pdf(store, file_name, statuses=None, job_types=None, report_progress=None, is_cancelled=None):
+    # Lays out and draws one page-sized table at a time, so memory and layout
+    # work stay per page. statuses/job_types optionally limit which leads go in.
+    # reportlab is only imported when a PDF is actually written.
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.lib import colors
+    from reportlab.pdfgen.canvas import Canvas
+    from reportlab.platypus import Table, TableStyle
+
+    table_style = TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                              ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                              ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                              ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                              ('FONTSIZE', (0, 0), (-1, -1), 7),
+                              ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+                              ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                              ('GRID', (0, 0), (-1, -1), 1, colors.black)])
+    total = store.count_leads()
+    page_width, page_height = landscape(letter)
+    pdf = Canvas(file_name, pagesize=(page_width, page_height))
+    header = [title for title, _ in PDF_COLUMNS]
+    widths = [width for _, width in PDF_COLUMNS]
+    scanned = written = 0
+
+    def draw_page(rows):
+        table = Table([header] + rows, colWidths=widths)
+        table.setStyle(table_style)
+        _, height = table.wrapOn(pdf, page_width, page_height)
+        table.drawOn(pdf, (page_width - sum(widths)) / 2, page_height - 36 - height)
+        pdf.showPage()
+
+    rows = []
+    try:
+        for lead in store.iter_leads(page_size=1000):
+            scanned += 1
+            if (not statuses or lead.get("Lead Status") in statuses) and (not job_types or lead.get("Job Type") in job_types):
+                rows.append(pdf_row(lead))
+                written += 1
+                if len(rows) == PDF_ROWS_PER_PAGE:
+                    draw_page(rows)
+                    rows = []
+            if scanned % 1000 == 0:
+                if is_cancelled and is_cancelled():
+                    raise TaskCancelled()
+                if report_progress:
+                    report_progress(scanned, total)
+        if rows or not written:
+            draw_page(rows)
+        pdf.save()
+    except TaskCancelled:
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        raise
+    if report_progress:
+        report_progress(scanned, total)
+    return written
+
+# Import column headers, lowercased with spaces and punctuation removed, and the lead field each fills
+IMPORT_COLUMN_ALIASES = {
+    "firstname": "First Name", "first": "First Name",
+    "lastname": "Last Name", "last": "Last Name", "surname": "Last Name",
+    "address": "Address Line 1", "address1": "Address Line 1", "addressline1": "Address Line 1", "street": "Address Line 1",
+    "address2": "Address Line 2", "addressline2": "Address Line 2",
+    "city": "City",
+    "state": "State", "st": "State",
+    "zip": "Zip", "zipcode": "Zip", "postalcode": "Zip",
+    "phone": "Phone", "phonenumber": "Phone", "telephone": "Phone",
+    "email": "Email", "emailaddress": "Email",
+    "notes": "Notes",
+    "referredby": "Referred By", "referral": "Referred By", "source": "Referred By",
+    "referredto": "Referred To",
+    "jobtype": "Job Type", "type": "Job Type",
+    "leadstatus": "Lead Status", "status": "Lead Status",
+    "followup": "Follow Up", "followupdate": "Follow Up", "callback": "Follow Up",
+}
+ZIP_RE = re.compile(r"\d{5}(-\d{4})?")
+EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+def map_import_columns(header):
+    # Column position -> lead field; "Name" columns are split into first and last
+    mapping = {}
+    for position, column in enumerate(header):
+        key = re.sub(r"[^a-z0-9]", "", column.lower())
+        if key in ("name", "fullname", "contactname"):
+            mapping[position] = "Name"
+        elif key in IMPORT_COLUMN_ALIASES:
+            mapping[position] = IMPORT_COLUMN_ALIASES[key]
+    return mapping
+
+def import_row_to_lead(row, mapping):
+    # Builds a lead in the add_lead schema and returns it with a list of problems
+    lead = {field: "" for field in LEAD_FIELDS}
+    lead.update(FIELD_DEFAULTS)
+    for position, field in mapping.items():
+        value = row[position].strip() if position < len(row) else ""
+        if field == "Name":
+            first, _, last = value.partition(" ")
+            lead["First Name"], lead["Last Name"] = first, last.strip()
+        elif value:
+            lead[field] = value
+    errors = []
+    if not lead["First Name"] and not lead["Last Name"]:
+        errors.append("missing name")
+    if lead["Zip"] and not ZIP_RE.fullmatch(lead["Zip"]):
+        errors.append("invalid zip")
+    if lead["Email"] and not EMAIL_RE.fullmatch(lead["Email"]):
+        errors.append("invalid email")
+    if lead["Phone"]:
+        digits = NON_DIGIT_RE.sub("", lead["Phone"])
+        if len(digits) == 11 and digits.startswith("1"):
+            digits = digits[1:]
+        if len(digits) != 10:
+            errors.append("invalid phone")
+    try:
+        lead[FOLLOW_UP_FIELD] = normalize_follow_up(lead[FOLLOW_UP_FIELD])
+    except ValueError:
+        errors.append("invalid follow up")
+    for field, choices in CHOICE_FIELDS.items():
+        match = [choice for choice in choices if choice.lower() == lead[field].lower()]
+        if match:
+            lead[field] = match[0]
+        else:
+            errors.append(f"unknown {field.lower()}")
+    return lead, errors
+
+@instrumented("import_csv")
+def import_leads_csv(store, file_name, rejects_file_name, report_progress=None, is_cancelled=None, batch_size=1000):
+    # Streams file_name into the store in batched transactions. Rows that fail
+    # validation are written to rejects_file_name with an Errors column. A
+    # cancelled import stops after the batch it was adding; the batches
+    # already added stay, and the result counts them with "cancelled" set.
+    total = os.path.getsize(file_name)
+    read = 0
+    imported = rejected = 0
+    cancelled = False
+    batch = []
+
+    def lines(file):
+        nonlocal read
+        for line in file:
+            read += len(line)
+            yield line
+
+    with open(file_name, "r", newline="", encoding="utf-8-sig", errors="replace") as csvfile, \
+            open(rejects_file_name, "w", newline="") as rejects_file:
+        reader = csv.reader(lines(csvfile))
+        header = next(reader, [])
+        mapping = map_import_columns(header)
+        rejects = csv.writer(rejects_file)
+        rejects.writerow(header + ["Errors"])
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            lead, errors = import_row_to_lead(row, mapping)
+            if errors:
+                rejects.writerow(row + ["; ".join(errors)])
+                rejected += 1
+                continue
+            batch.append(lead)
+            if len(batch) >= batch_size:
+                store.add_leads(batch)
+                imported += len(batch)
+                batch = []
+                if is_cancelled and is_cancelled():
+                    cancelled = True
+                    break
+                if report_progress:
+                    report_progress(min(read, total), total)
+        if batch:
+            store.add_leads(batch)
+            imported += len(batch)
+    if not rejected:
+        os.remove(rejects_file_name)
+    if report_progress and not cancelled:
+        report_progress(total, total)
+    return {"imported": imported, "rejected": rejected, "rejects_file": rejects_file_name if rejected else None,
+            "cancelled": cancelled}
+
+def new_lead(values=None):
+    # A lead with every field present, as ContractorInputTab.add_lead builds it
+    lead = Lead({field: "" for field in LEAD_FIELDS})
+    lead.update(FIELD_DEFAULTS)
+    lead.update(values or {})
+    return lead
+
+def search_leads(store, text="", filters=None, limit=None):
+    # One-off search for scripts. The GUI keeps a LeadsIndex alive instead.
+    index = LeadsIndex()
+    index.build(store)
+    lead_ids = index.query(text, filters)
+    if lead_ids is None:
+        return store.fetch_leads(limit=limit)
+    return store.fetch_leads_by_ids(sorted(lead_ids)[:limit])
+
+def print_progress(done, total):
+    print(f"\r{done}/{total}", end="", file=sys.stderr, flush=True)
+
+def parse_field_values(pairs):
+    values = {}
+    for pair in pairs:
+        field, separator, value = pair.partition("=")
+        if not separator or field not in LEAD_FIELDS:
+            raise SystemExit(f"Expected FIELD=VALUE with one of: {', '.join(LEAD_FIELDS)}")
+        if field == FOLLOW_UP_FIELD:
+            try:
+                value = normalize_follow_up(value)
+            except ValueError as error:
+                raise SystemExit(str(error))
+        values[field] = value
+    return values
+
+def parse_day(text):
+    # Local midnight at the start of a YYYY-MM-DD day
+    try:
+        return datetime.datetime.combine(datetime.date.fromisoformat(text), datetime.time())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, not {text!r}")
+
+def format_history_entry(entry):
+    when, lead_id, user, field, old, new = entry
+    if old is None:
+        change = f"{new} (lead added)"
+    elif new is None:
+        change = f"{old} (lead deleted)"
+    else:
+        change = f"{old} -> {new}"
+    return f"{datetime.datetime.fromtimestamp(when):%Y-%m-%d %H:%M:%S}\t{lead_id}\t{user}\t{field}\t{change}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Work with the contractor leads database without the GUI.")
+    parser.add_argument("--store", choices=sorted(STORE_BACKENDS), help="storage backend (default: LEADS_STORE or sqlite)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("count", help="print the number of leads")
+
+    search = commands.add_parser("search", help="print matching leads as CSV")
+    search.add_argument("text", nargs="?", default="", help="name, email or phone prefix")
+    search.add_argument("--status", help="Lead Status to match")
+    search.add_argument("--job-type", help="Job Type to match")
+    search.add_argument("--area", help="City, State or Zip prefix")
+    search.add_argument("--referred-by", help="Referred By prefix")
+    search.add_argument("--limit", type=int)
+
+    add = commands.add_parser("add", help="add a lead from FIELD=VALUE pairs and print its id")
+    add.add_argument("values", nargs="+", metavar="FIELD=VALUE")
+
+    update = commands.add_parser("update", help="set fields on a lead from FIELD=VALUE pairs")
+    update.add_argument("lead_id", type=int)
+    update.add_argument("values", nargs="+", metavar="FIELD=VALUE")
+    update.add_argument("--if-version", type=int, help="only update if the lead is still at this version")
+
+    delete = commands.add_parser("delete", help="delete a lead")
+    delete.add_argument("lead_id", type=int)
+
+    for name, help_text in (("export-csv", "export every lead to CSV"), ("export-txt", "export every lead to a text file"), ("export-pdf", "export leads to PDF")):
+        export = commands.add_parser(name, help=help_text)
+        export.add_argument("file_name")
+        if name == "export-pdf":
+            export.add_argument("--status", action="append", help="only leads with this Lead Status (repeatable)")
+            export.add_argument("--job-type", action="append", help="only leads with this Job Type (repeatable)")
+
+    import_csv = commands.add_parser("import-csv", help="import leads from a CSV file")
+    import_csv.add_argument("file_name")
+    import_csv.add_argument("--rejects", help="where to write rejected rows (default: <file>_rejects.csv)")
+
+    commands.add_parser("duplicates", help="print groups of likely duplicate lead ids")
+
+    commands.add_parser("stats", help="print lead counts by status, job type, referral source and area")
+
+    history = commands.add_parser("history", help="print one lead's history, or every change in a date range")
+    history.add_argument("lead_id", type=int, nargs="?", help="the lead (default: every lead)")
+    history.add_argument("--since", type=parse_day, help="first day, YYYY-MM-DD")
+    history.add_argument("--until", type=parse_day, help="last day, YYYY-MM-DD")
+    history.add_argument("--limit", type=int)
+
+    notes = commands.add_parser("notes", help="search lead Notes, best matches first")
+    notes.add_argument("query")
+    notes.add_argument("--limit", type=int, default=20)
+
+    areas = commands.add_parser("areas", help="print open leads grouped into visit batches by area")
+    areas.add_argument("--batch-size", type=int, default=VISIT_BATCH_SIZE, help="leads per visit batch")
+
+    due = commands.add_parser("due", help="print follow-ups due today or earlier, soonest first")
+    due.add_argument("--until", type=parse_day, help="include follow-ups due up to this YYYY-MM-DD day")
+
+    watch = commands.add_parser("watch", help="print changes other clients make to the store until interrupted")
+    watch.add_argument("--interval", type=float, default=1.0, help="seconds between polls")
+
+    args = parser.parse_args(argv)
+    instrumentation.configure()
+    store = open_leads_store(args.store)
+    try:
+        if args.command == "count":
+            print(store.count_leads())
+        elif args.command == "search":
+            filters = {"Lead Status": args.status, "Job Type": args.job_type, "Area": args.area, "Referred By": args.referred_by}
+            writer = csv.writer(sys.stdout)
+            writer.writerow([LEAD_ID] + EXPORT_FIELDS)
+            for lead in search_leads(store, args.text, filters, args.limit):
+                writer.writerow([lead[LEAD_ID]] + [lead.get(field, "") for field in EXPORT_FIELDS])
+        elif args.command == "add":
+            print(store.add_lead(new_lead(parse_field_values(args.values))))
+        elif args.command == "update":
+            if not store.fetch_leads_by_ids([args.lead_id]):
+                raise SystemExit(f"No lead with id {args.lead_id}")
+            changes = [(args.lead_id, field, value) for field, value in parse_field_values(args.values).items()]
+            if store.update_leads(changes, {args.lead_id: args.if_version}):
+                raise SystemExit(f"Lead {args.lead_id} is no longer at version {args.if_version}")
+        elif args.command == "delete":
+            if not store.fetch_leads_by_ids([args.lead_id]):
+                raise SystemExit(f"No lead with id {args.lead_id}")
+            store.delete_lead(args.lead_id)
+        elif args.command == "export-csv":
+            written = write_leads_csv(store, args.file_name, report_progress=print_progress)
+            print(f"\nWrote {written} leads to {args.file_name}", file=sys.stderr)
+        elif args.command == "export-txt":
+            written = write_leads_txt(store, args.file_name, report_progress=print_progress)
+            print(f"\nWrote {written} leads to {args.file_name}", file=sys.stderr)
+        elif args.command == "export-pdf":
+            written = write_leads_pdf(store, args.file_name, args.status, args.job_type, report_progress=print_progress)
+            print(f"\nWrote {written} leads to {args.file_name}", file=sys.stderr)
+        elif args.command == "import-csv":
+            rejects = args.rejects or os.path.splitext(args.file_name)[0] + "_rejects.csv"
+            result = import_leads_csv(store, args.file_name, rejects, report_progress=print_progress)
+            print(f"\nImported {result['imported']} leads, rejected {result['rejected']}.", file=sys.stderr)
+            if result["rejects_file"]:
+                print(f"Rejected rows were written to {result['rejects_file']}", file=sys.stderr)
+        elif args.command == "duplicates":
+            index = DuplicateIndex()
+            index.build(store)
+            for group in index.duplicate_groups(store):
+                print(" ".join(str(lead_id) for lead_id in group))
+        elif args.command == "stats":
+            stats = PipelineStats()
+            stats.build(store)
+            print(f"{stats.total} leads")
+            for name in stats.BREAKDOWNS:
+                print(f"\n{name}")
+                for group, leads in stats.breakdown(name):
+                    print(f"  {group or '(blank)'}\t{leads}")
+            print(f"\nConversion to {stats.CONVERTED_STATUS} by Referred By")
+            for source, leads, converted, rate in stats.conversion_rates():
+                print(f"  {source or '(none)'}\t{converted}/{leads}\t{rate:.1%}")
+        elif args.command == "history":
+            start = args.since.timestamp() if args.since else 0
+            end = (args.until + datetime.timedelta(days=1)).timestamp() if args.until else float("inf")
+            if args.lead_id is None:
+                entries = store.history_between(start, end, args.limit)
+            else:
+                entries = [entry for entry in store.lead_history(args.lead_id) if start <= entry[0] < end][:args.limit]
+            for entry in entries:
+                print(format_history_entry(entry))
+        elif args.command == "notes":
+            results = store.search_notes(args.query, args.limit)
+            leads = {lead[LEAD_ID]: lead for lead in store.fetch_leads_by_ids([lead_id for lead_id, _ in results])}
+            for lead_id, score in results:
+                lead = leads[lead_id]
+                snippet = notes_snippet(lead.get("Notes", ""), args.query).replace(NOTES_MATCH_START, "[").replace(NOTES_MATCH_END, "]")
+                print(f"{lead_id}\t{score:.2f}\t{lead.get('First Name', '')} {lead.get('Last Name', '')}\t{snippet}")
+        elif args.command == "areas":
+            if args.batch_size < 1:
+                raise SystemExit("--batch-size must be at least 1")
+            index = AreaIndex(args.batch_size)
+            index.build(store)
+            for region, areas in index.regions():
+                print(index.region_name(region))
+                for area, leads in areas:
+                    print(f"  {index.area_name(area)}\t{leads}")
+                    for number, batch in enumerate(index.batches(area), 1):
+                        print(f"    batch {number}: {' '.join(str(lead_id) for lead_id in batch)}")
+        elif args.command == "due":
+            due = store.follow_ups_due(follow_ups_due_by((args.until or datetime.datetime.now()).date()))
+            leads = {lead[LEAD_ID]: lead for lead in store.fetch_leads_by_ids([lead_id for _, lead_id in due])}
+            for follow_up, lead_id in due:
+                lead = leads[lead_id]
+                print(f"{follow_up}\t{lead_id}\t{lead.get('First Name', '')} {lead.get('Last Name', '')}\t{lead.get('Phone', '')}\t{lead.get('Lead Status', '')}")
+        elif args.command == "watch":
+            seq = store.latest_change()
+            try:
+                while True:
+                    time.sleep(args.interval)
+                    seq, changes = store.changes_since(seq)
+                    if changes is None:
+                        print("reload", flush=True)
+                    for lead_id, op, data in changes or []:
+                        print(op, lead_id, " ".join(data) if op == "update" else "", flush=True)
+            except KeyboardInterrupt:
+                pass
+        store.save_leads()
+    finally:
+        store.close()
+        if instrumentation.enabled:
+            instrumentation.log_summary()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+from leads_db import LEAD_ID, SqliteLeadsStore
+
+LEADS_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "leads_db.py")
+
+
+def run(tmp_path, *args):
+    return subprocess.run([sys.executable, LEADS_DB, "--store", "sqlite", *args], cwd=tmp_path, capture_output=True, text=True)
+
+
+def stored_ids(tmp_path):
+    store = SqliteLeadsStore(str(tmp_path / "leads_data.db"), json_path=None)
+    try:
+        return [lead[LEAD_ID] for lead in store.load_leads()]
+    finally:
+        store.close()
+
+
+def test_add_then_count(tmp_path):
+    added = run(tmp_path, "add", "First Name=Ann", "City=Austin")
+    assert added.returncode == 0
+    lead_id = int(added.stdout)
+    assert run(tmp_path, "count").stdout.strip() == "1"
+    assert stored_ids(tmp_path) == [lead_id]
+
+
+def test_delete_removes_the_lead(tmp_path):
+    lead_id = int(run(tmp_path, "add", "First Name=Ann").stdout)
+    kept_id = int(run(tmp_path, "add", "First Name=Bob").stdout)
+    assert run(tmp_path, "delete", str(lead_id)).returncode == 0
+    assert stored_ids(tmp_path) == [kept_id]
+
+
+def test_delete_of_a_missing_lead_fails(tmp_path):
+    lead_id = int(run(tmp_path, "add", "First Name=Ann").stdout)
+    missing = run(tmp_path, "delete", str(lead_id + 1))
+    assert missing.returncode != 0 and f"No lead with id {lead_id + 1}" in missing.stderr
+    assert stored_ids(tmp_path) == [lead_id]
+
+
+def test_update_of_a_missing_lead_fails(tmp_path):
+    missing = run(tmp_path, "update", "7", "City=Waco")
+    assert missing.returncode != 0 and "No lead with id 7" in missing.stderr
+
+
+def test_update_sets_fields(tmp_path):
+    lead_id = int(run(tmp_path, "add", "First Name=Ann").stdout)
+    assert run(tmp_path, "update", str(lead_id), "City=Dallas").returncode == 0
+    found = run(tmp_path, "search", "Ann")
+    assert found.returncode == 0 and "Dallas" in found.stdout
@@ -0,0 +1,73 @@
+import pytest
+
+from leads_db import LEAD_ID, LEAD_VERSION, DuplicateIndex, JsonLeadsStore, SqliteLeadsStore
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        store = JsonLeadsStore(str(tmp_path / "leads_data.json"))
+    else:
+        store = SqliteLeadsStore(str(tmp_path / "leads_data.db"), json_path=None, user="ann")
+    yield store
+    store.close()
+
+
+def groups(store):
+    index = DuplicateIndex()
+    index.build(store)
+    return index.duplicate_groups(store)
+
+
+def test_shared_office_phone_is_not_a_duplicate(store):
+    store.add_lead({"First Name": "Ann", "Last Name": "Lee", "Phone": "512-555-0100", "Zip": "78701"})
+    store.add_lead({"First Name": "Bob", "Last Name": "Ortiz", "Phone": "(512) 555-0100", "Zip": "78701"})
+
+    assert groups(store) == []
+
+
+def test_different_people_with_one_name_and_zip_are_not_duplicates(store):
+    store.add_lead({"First Name": "Ann", "Last Name": "Smith", "Phone": "512-555-0100", "Zip": "78701"})
+    store.add_lead({"First Name": "Carl", "Last Name": "Smith", "Phone": "512-555-0199", "Zip": "78701"})
+
+    assert groups(store) == []
+
+
+def test_groups_are_not_chained_through_unrelated_leads(store):
+    # Ann and A. Smith are one person; Carl only shares their office phone
+    ann = store.add_lead({"First Name": "Ann", "Last Name": "Smith", "Phone": "512-555-0100", "Zip": "78701"})
+    initial = store.add_lead({"First Name": "A", "Last Name": "Smith", "Email": "ann@example.com", "Zip": "78701"})
+    store.add_lead({"First Name": "Carl", "Last Name": "Ortiz", "Phone": "512-555-0100", "Zip": "78701"})
+
+    assert [sorted(group) for group in groups(store)] == [sorted([ann, initial])]
+
+
+def test_merge_deletes_and_updates_together(store):
+    keep = store.add_lead({"First Name": "Ann", "Last Name": "Smith", "Phone": "512-555-0100"})
+    other = store.add_lead({"First Name": "Ann", "Last Name": "Smith", "Email": "ann@example.com"})
+
+    assert store.merge_leads(keep, {"Email": "ann@example.com"}, [other])
+
+    leads = store.load_leads()
+    assert [(lead[LEAD_ID], lead["Email"]) for lead in leads] == [(keep, "ann@example.com")]
+
+
+def test_merge_against_an_old_version_changes_nothing(tmp_path):
+    path = str(tmp_path / "leads_data.db")
+    first = SqliteLeadsStore(path, json_path=None, user="ann")
+    second = SqliteLeadsStore(path, json_path=None, user="bob")
+    try:
+        keep = first.add_lead({"First Name": "Ann", "Phone": "512-555-0100"})
+        other = first.add_lead({"First Name": "Ann", "Email": "ann@example.com"})
+        versions = {lead[LEAD_ID]: lead[LEAD_VERSION] for lead in first.fetch_leads_by_ids([keep, other])}
+        second.update_leads([(other, "City", "Austin")])
+
+        assert not first.merge_leads(keep, {"Email": "ann@example.com"}, [other], versions)
+
+        leads = {lead[LEAD_ID]: lead for lead in first.load_leads()}
+        assert sorted(leads) == [keep, other]
+        assert leads[keep]["Email"] == ""
+        assert leads[keep][LEAD_VERSION] == versions[keep]
+    finally:
+        first.close()
+        second.close()
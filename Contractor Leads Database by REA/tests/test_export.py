@@ -0,0 +1,67 @@
+import csv
+import os
+
+import pytest
+
+import leads_db
+from leads_db import SqliteLeadsStore, TaskCancelled, write_leads_csv, write_leads_pdf
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteLeadsStore(str(tmp_path / "leads_data.db"), json_path=None)
+    yield store
+    store.close()
+
+
+def add_leads(store, count):
+    store.add_leads([{"First Name": "Ann", "Last Name": f"Lee{number}"} for number in range(count)])
+
+
+def test_csv_export_writes_every_lead(store, tmp_path):
+    add_leads(store, 3)
+    path = str(tmp_path / "leads.csv")
+    assert write_leads_csv(store, path) == 3
+    with open(path, newline="") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == leads_db.EXPORT_FIELDS
+    assert [row[rows[0].index("Last Name")] for row in rows[1:]] == ["Lee0", "Lee1", "Lee2"]
+
+
+def test_cancelled_csv_export_removes_the_partial_file(store, tmp_path):
+    add_leads(store, 2500)
+    path = str(tmp_path / "leads.csv")
+    with pytest.raises(TaskCancelled):
+        write_leads_csv(store, path, is_cancelled=lambda: True)
+    assert not os.path.exists(path)
+
+
+def test_cancelled_pdf_export_removes_the_partial_file(store, tmp_path):
+    pytest.importorskip("reportlab")
+    add_leads(store, 2500)
+    path = str(tmp_path / "leads.pdf")
+    with pytest.raises(TaskCancelled):
+        write_leads_pdf(store, path, is_cancelled=lambda: True)
+    assert not os.path.exists(path)
+
+
+def test_pdf_export_keeps_only_the_chosen_statuses_and_job_types(store, tmp_path, monkeypatch):
+    pytest.importorskip("reportlab")
+    store.add_leads([
+        {"First Name": "Ann", "Lead Status": "New", "Job Type": "Driveway"},
+        {"First Name": "Bob", "Lead Status": "Won", "Job Type": "Driveway"},
+        {"First Name": "Cy", "Lead Status": "New", "Job Type": "Patio"},
+        {"First Name": "Di", "Lead Status": "Lost", "Job Type": "Driveway"},
+    ])
+    drawn = []
+    pdf_row = leads_db.pdf_row
+    monkeypatch.setattr(leads_db, "pdf_row", lambda lead: drawn.append(lead["First Name"]) or pdf_row(lead))
+    path = str(tmp_path / "leads.pdf")
+
+    assert write_leads_pdf(store, path, statuses=["New", "Won"], job_types=["Driveway"]) == 2
+    assert drawn == ["Ann", "Bob"]
+    assert os.path.getsize(path) > 0
+
+    drawn.clear()
+    assert write_leads_pdf(store, path, statuses=["New"]) == 2
+    assert drawn == ["Ann", "Cy"]
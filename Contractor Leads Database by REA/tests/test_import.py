@@ -0,0 +1,54 @@
+import csv
+import os
+
+import pytest
+
+from leads_db import SqliteLeadsStore, import_leads_csv
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteLeadsStore(str(tmp_path / "leads_data.db"), json_path=None)
+    yield store
+    store.close()
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["First Name", "Last Name", "Email"])
+        writer.writerows(rows)
+
+
+def test_cancelled_import_reports_what_it_kept(store, tmp_path):
+    source, rejects = str(tmp_path / "leads.csv"), str(tmp_path / "leads_rejects.csv")
+    write_csv(source, [("Ann", f"Lee{number}", "not an email" if number % 10 == 0 else "") for number in range(1, 51)])
+    batches = []
+
+    result = import_leads_csv(store, source, rejects, is_cancelled=lambda: batches.append(1) or len(batches) >= 2, batch_size=10)
+
+    assert result["cancelled"]
+    assert result["imported"] == store.count_leads() == 20
+    assert result["rejected"] == 2
+    assert result["rejects_file"] == rejects
+    with open(rejects, newline="") as file:
+        assert len(list(csv.reader(file))) == 3
+
+
+def test_cancelled_import_without_rejects_leaves_no_rejects_file(store, tmp_path):
+    source, rejects = str(tmp_path / "leads.csv"), str(tmp_path / "leads_rejects.csv")
+    write_csv(source, [("Ann", f"Lee{number}", "") for number in range(1, 51)])
+
+    result = import_leads_csv(store, source, rejects, is_cancelled=lambda: True, batch_size=10)
+
+    assert (result["cancelled"], result["imported"], result["rejected"], result["rejects_file"]) == (True, 10, 0, None)
+    assert not os.path.exists(rejects)
+
+
+def test_finished_import_is_not_marked_cancelled(store, tmp_path):
+    source, rejects = str(tmp_path / "leads.csv"), str(tmp_path / "leads_rejects.csv")
+    write_csv(source, [("Ann", "Lee", "")])
+
+    result = import_leads_csv(store, source, rejects)
+
+    assert (result["cancelled"], result["imported"], result["rejected"]) == (False, 1, 0)
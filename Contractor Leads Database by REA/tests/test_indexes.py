@@ -0,0 +1,304 @@
+import datetime
+import gc
+
+import pytest
+
+from leads_db import (
+    FOLLOW_UP_FIELD, LEAD_ID, AreaIndex, FollowUpQueue, LeadsIndex, NotesIndex, PrefixIndex, SortKeys, TaskCancelled,
+    build_lead_indexes, follow_up_key, follow_ups_due_by, gc_thresholds, load_area_index, load_follow_up_queue,
+    load_pipeline_stats, normalize_follow_up,
+)
+
+
+class Store:
+    # Just enough of a store for build_lead_indexes
+    def __init__(self, count):
+        self.leads = [{"Lead ID": lead_id, "First Name": "Ann", "Last Name": f"Lee{lead_id}"} for lead_id in range(1, count + 1)]
+
+    def count_leads(self):
+        return len(self.leads)
+
+    def iter_leads(self):
+        return iter(self.leads)
+
+    def iter_fields(self, fields):
+        for lead in self.leads:
+            yield (lead["Lead ID"], *(lead.get(field, "") for field in fields))
+
+
+def test_build_puts_the_collector_back_as_it_was():
+    before = gc.get_threshold()
+    search_index, duplicate_index = build_lead_indexes(Store(10))
+
+    assert gc.get_threshold() == before
+    assert gc.isenabled()
+    assert not gc.get_freeze_count()
+    assert search_index.built and duplicate_index.built
+
+
+def test_cancelled_build_puts_the_collector_back():
+    before = gc.get_threshold()
+    with pytest.raises(TaskCancelled):
+        build_lead_indexes(Store(5000), is_cancelled=lambda: True)
+
+    assert gc.get_threshold() == before
+    assert not gc.get_freeze_count()
+
+
+def test_failed_build_puts_the_collector_back():
+    class BrokenStore(Store):
+        def iter_leads(self):
+            yield from self.leads
+            raise OSError("disk went away")
+
+    before = gc.get_threshold()
+    with pytest.raises(OSError):
+        build_lead_indexes(BrokenStore(10))
+
+    assert gc.get_threshold() == before
+    assert gc.isenabled()
+    assert not gc.get_freeze_count()
+
+
+def test_overlapping_changes_restore_once_the_last_ends():
+    before = gc.get_threshold()
+    first = gc_thresholds((5000, 20, 20))
+    second = gc_thresholds((5000, 20, 20))
+    first.__enter__()
+    second.__enter__()
+    first.__exit__(None, None, None)
+    assert gc.get_threshold() == (5000, 20, 20)
+    second.__exit__(None, None, None)
+
+    assert gc.get_threshold() == before
+
+
+@pytest.mark.parametrize("load", [load_pipeline_stats, load_area_index, load_follow_up_queue])
+def test_summary_loads_report_progress_and_stop_when_cancelled(load):
+    progress = []
+    assert load(Store(12000), report_progress=lambda done, total: progress.append((done, total))).built
+    assert progress == [(5000, 12000), (10000, 12000)]
+
+    with pytest.raises(TaskCancelled):
+        load(Store(12000), is_cancelled=lambda: True)
+
+
+def test_notes_index_ranks_edited_notes_as_a_fresh_build_does():
+    index = NotesIndex()
+    index.set_notes(1, "Concrete driveway, concrete steps")
+    index.set_notes(2, "Concrete patio")
+    index.set_notes(3, "Asphalt")
+    index.set_notes(1, "Concrete")
+    index.set_notes(3, "")
+    fresh = NotesIndex()
+    fresh.set_notes(1, "Concrete")
+    fresh.set_notes(2, "Concrete patio")
+
+    assert index.lengths == {1: 1, 2: 2}
+    assert index.total_words == 3
+    assert index.search("conc") == fresh.search("conc")
+    # The shorter note is the better match
+    assert [lead_id for lead_id, score in index.search("concrete")] == [1, 2]
+
+
+def follow_up(lead_id, when):
+    return {LEAD_ID: lead_id, FOLLOW_UP_FIELD: when}
+
+
+def test_due_follow_ups_skip_entries_left_by_edits_and_deletes():
+    queue = FollowUpQueue()
+    for lead_id, when in [(1, "2030-01-01"), (2, "2030-01-02"), (3, "2030-01-03")]:
+        queue.add_lead(follow_up(lead_id, when))
+    queue.update_lead(follow_up(1, "2030-02-01"), FOLLOW_UP_FIELD, "2030-01-01")
+    queue.remove_lead(follow_up(2, "2030-01-02"))
+
+    assert queue.next_due() == ("2030-01-03", 3)
+    assert queue.pop_due("2030-01-31 00:00") == [("2030-01-03", 3)]
+    assert queue.pop_due("2030-02-01 08:00") == [("2030-02-01", 1)]
+    assert queue.pop_due("2031-01-01 00:00") == []
+    assert queue.heap == []
+
+
+def test_follow_ups_without_a_time_are_due_from_the_start_of_their_day():
+    queue = FollowUpQueue()
+    queue.add_lead(follow_up(1, normalize_follow_up("2030-01-02 9:30")))
+    queue.add_lead(follow_up(2, normalize_follow_up("1/2/2030")))
+    queue.add_lead(follow_up(3, normalize_follow_up(" 01/01/2030  23:59 ")))
+
+    assert queue.pop_due(follow_up_key(datetime.datetime(2030, 1, 2))) == [("2030-01-01 23:59", 3), ("2030-01-02", 2)]
+    assert queue.pop_due(follow_up_key(datetime.datetime(2030, 1, 2, 9, 29))) == []
+    assert queue.pop_due(follow_up_key(datetime.datetime(2030, 1, 2, 9, 30))) == [("2030-01-02 09:30", 1)]
+    assert "2030-01-02 23:59" < follow_ups_due_by(datetime.date(2030, 1, 2)) <= "2030-01-03"
+
+
+def test_follow_ups_are_stored_in_one_form():
+    assert normalize_follow_up("") == ""
+    assert normalize_follow_up("2030-1-2") == "2030-01-02"
+    assert normalize_follow_up("12/31/2030 7:05") == "2030-12-31 07:05"
+    with pytest.raises(ValueError):
+        normalize_follow_up("next Tuesday")
+
+
+def test_snoozed_follow_up_comes_due_again():
+    queue = FollowUpQueue()
+    queue.add_lead(follow_up(1, "2030-01-02"))
+    assert queue.pop_due("2030-01-02 08:00") == [("2030-01-02", 1)]
+    # A replayed edit or a rebuild leaves a raised follow-up alone
+    queue.update_lead(follow_up(1, "2030-01-02"), FOLLOW_UP_FIELD, "")
+    assert queue.pop_due("2030-01-02 09:00") == []
+    store = Store(1)
+    store.leads[0][FOLLOW_UP_FIELD] = "2030-01-02"
+    assert load_follow_up_queue(store, dict(queue.raised)).pop_due("2030-01-02 09:00") == []
+
+    # Snoozed until tomorrow, as the reminder dialog does
+    queue.update_lead(follow_up(1, "2030-01-03"), FOLLOW_UP_FIELD, "2030-01-02")
+
+    assert queue.raised == {}
+    assert queue.pop_due("2030-01-02 23:59") == []
+    assert queue.pop_due("2030-01-03 00:00") == [("2030-01-03", 1)]
+
+
+@pytest.fixture
+def sort_keys():
+    sort_keys = SortKeys()
+    sort_keys.keys = {"Last Name": {}, "First Name": {}, "Lead Status": {}}
+    for lead_id, first, last, status in [(1, "Amy", "carter", "Closed"), (2, "Ben", "Adams", "Good Lead"),
+                                         (3, "cal", "Adams ", "In System"), (4, "Dee", "Baker", "Good Lead")]:
+        sort_keys.add_lead({LEAD_ID: lead_id, "First Name": first, "Last Name": last, "Lead Status": status})
+    return sort_keys
+
+
+def test_sort_breaks_ties_by_the_next_column(sort_keys):
+    # Case and spacing don't count
+    assert sort_keys.sort([1, 2, 3, 4], [("Last Name", False), ("First Name", True)]) == [3, 2, 4, 1]
+    assert sort_keys.sort([4, 3, 2, 1], [("Last Name", False)]) == [3, 2, 4, 1]
+    assert sort_keys.sort([1, 2, 3, 4], [("Last Name", False)]) == [2, 3, 4, 1]
+
+
+def test_descending_sort_keeps_ties_in_the_order_they_came(sort_keys):
+    assert sort_keys.sort([1, 2, 3, 4], [("Last Name", True)]) == [1, 4, 2, 3]
+    assert sort_keys.sort([1, 2, 3, 4], [("Lead Status", True), ("Last Name", False)]) == [1, 2, 4, 3]
+
+
+def test_choice_fields_sort_in_workflow_order(sort_keys):
+    assert sort_keys.sort([1, 2, 3, 4], [("Lead Status", False)]) == [3, 2, 4, 1]
+
+
+def test_sort_keys_follow_edits_adds_and_removals(sort_keys):
+    sort_keys.update_lead({LEAD_ID: 1, "First Name": "Amy", "Last Name": "Aaron", "Lead Status": "Closed"}, "Last Name", "carter")
+    sort_keys.remove_lead({LEAD_ID: 4})
+    sort_keys.add_lead({LEAD_ID: 5, "First Name": "Eve", "Last Name": "Zed"})
+
+    assert sort_keys.sort([1, 2, 3, 5], [("Last Name", False)]) == [1, 2, 3, 5]
+    # A lead whose keys are gone sorts as blank
+    assert sort_keys.sort([2, 4], [("Last Name", False)]) == [4, 2]
+    assert sort_keys.sort([5, 1], [("Lead Status", False)]) == [5, 1]
+
+
+def test_leads_are_located_by_zip_prefix_then_city_and_state():
+    assert AreaIndex.locate("Austin", "TX", "78701-1234") == ("7", "787")
+    assert AreaIndex.locate("", "", " 787") == ("7", "787")
+    assert AreaIndex.locate(" Austin ", " tx", "") == ("7", "austin, tx")
+    assert AreaIndex.locate("Austin", "", "N/A") == ("", "austin")
+    assert AreaIndex.locate("", "", "") == ("", "")
+
+
+def open_lead(lead_id, address="", city="", state="", zip_code="", status="Good Lead"):
+    return {LEAD_ID: lead_id, "Lead Status": status, "Address Line 1": address, "City": city, "State": state, "Zip": zip_code}
+
+
+@pytest.fixture
+def areas():
+    areas = AreaIndex(batch_size=2)
+    for lead in [open_lead(1, "12 Oak St", "Austin", "TX", "78701"), open_lead(2, "3 Oak St", "Austin", "TX", "78701"),
+                 open_lead(3, "100 Elm St", "Austin", "TX", "78701"), open_lead(4, "5 Pine Rd", "Round Rock", "TX", "78702"),
+                 open_lead(5, "7 Main St", "Waco", "tx"), open_lead(6, "1 Bay Rd"), open_lead(7, "9 Oak St", zip_code="78701", status="Closed")]:
+        areas.add_lead(lead)
+    return areas
+
+
+def test_batches_follow_streets_within_a_zip_prefix(areas):
+    # Closed leads need no visit
+    assert areas.batches(("7", "787")) == [[3, 2], [1, 4]]
+
+    areas.update_lead(open_lead(3, "100 Elm St", "Austin", "TX", "78701", status="Closed"), "Lead Status", "Good Lead")
+    areas.update_lead(open_lead(7, "9 Oak St", zip_code="78701"), "Lead Status", "Closed")
+
+    assert areas.batches(("7", "787")) == [[2, 7], [1, 4]]
+
+
+def test_regions_list_zip_areas_then_places_then_the_unplaced(areas):
+    assert areas.regions() == [("7", [(("7", "787"), 4), (("7", "waco, tx"), 1)]), ("", [(("", ""), 1)])]
+    assert [areas.area_name(area) for region, area_leads in areas.regions() for area, leads in area_leads] == [
+        "787xx Austin, TX, Round Rock, TX", "Waco, TX", "(no city or state)"]
+    assert [areas.region_name(region) for region, area_leads in areas.regions()] == [
+        "South Central (AR, LA, OK, TX)", "Unknown region"]
+
+    areas.remove_lead({LEAD_ID: 6})
+    assert [region for region, area_leads in areas.regions()] == ["7"]
+
+
+def test_prefix_lookups_follow_adds_and_discards():
+    index = PrefixIndex()
+    index.begin_bulk_load()
+    for key, lead_id in [("carter", 1), ("carl", 2), ("car", 3), ("baker", 4), ("carter", 5)]:
+        index.add(key, lead_id)
+    index.end_bulk_load()
+
+    assert index.prefix("car") == {1, 2, 3, 5}
+    assert index.prefix("cart") == {1, 5}
+    assert index.exact("car") == {3}
+    index.discard("carter", 1)
+    index.discard("car", 3)
+    index.add("carver", 6)
+    assert index.prefix("car") == {2, 5, 6}
+    assert index.keys == ["baker", "carl", "carter", "carver"]
+
+
+@pytest.fixture
+def search_index():
+    store = Store(0)
+    store.leads = [
+        {LEAD_ID: 1, "First Name": "Amy", "Last Name": "Carter", "Email": "amy.carter@example.com", "Phone": "(512) 555-0100",
+         "Lead Status": "Good Lead", "City": "Austin", "State": "TX", "Zip": "78701"},
+        {LEAD_ID: 2, "First Name": "Carl", "Last Name": "Baker", "Phone": "254-555-0199", "City": "Waco", "State": "TX"},
+        {LEAD_ID: 3, "First Name": "Ben", "Last Name": "Adams", "Lead Status": "Good Lead", "City": "Round Rock", "Zip": "78664"},
+    ]
+    index = LeadsIndex()
+    index.build(store)
+    return index
+
+
+@pytest.mark.parametrize("text, filters, expected", [
+    ("car", None, {1, 2}),
+    ("amy car", None, {1}),
+    ("CARTER", None, {1}),
+    ("amy.carter@ex", None, {1}),
+    ("(512) 555-0100", None, {1}),
+    ("0199", None, {2}),
+    ("555-01", None, {1, 2}),
+    ("512", None, {1}),
+    ("car", {"Lead Status": "Good Lead"}, {1}),
+    ("", {"Lead Status": "good"}, set()),
+    ("", {"Area": "787"}, {1}),
+    ("", {"Area": "tx"}, {1, 2}),
+    ("", {"City": "round", "Lead Status": ""}, {3}),
+    ("zed", {"City": "austin"}, set()),
+])
+def test_query_matches_word_prefixes_and_filters(search_index, text, filters, expected):
+    assert search_index.query(text, filters) == expected
+    assert {lead_id for lead_id in (1, 2, 3) if search_index.matches(lead_id, text, filters)} == expected
+
+
+def test_empty_query_filters_nothing(search_index):
+    assert search_index.query("  ", {"City": ""}) is None
+
+
+def test_query_follows_edits_and_removals(search_index):
+    lead = {LEAD_ID: 3, "First Name": "Ben", "Last Name": "Carson", "Lead Status": "Closed"}
+    search_index.update_lead(lead, "Last Name", "Adams")
+    search_index.remove_lead({LEAD_ID: 1})
+
+    assert search_index.query("car") == {2, 3}
+    assert search_index.query("adams") == set()
+    assert search_index.query("", {"Lead Status": "Closed"}) == {3}
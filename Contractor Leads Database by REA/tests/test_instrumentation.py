@@ -0,0 +1,82 @@
+import glob
+
+import pytest
+
+from leads_db import Instrumentation, instrumented
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "leads_instrument.log")
+
+
+@pytest.fixture
+def instruments(log_path):
+    instruments = Instrumentation()
+    instruments.enable(log_path)
+    yield instruments
+    instruments.disable()
+
+
+def read(path):
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+def test_timed_calls_and_counters_are_logged_and_summed(instruments, log_path):
+    assert instruments.call("search", sorted, [3, 1, 2]) == [1, 2, 3]
+    instruments.call("search", sorted, [])
+    instruments.count("rows fetched", 50)
+    instruments.count("rows fetched", 25)
+    instruments.log_summary()
+
+    assert instruments.timings["search"][0] == 2
+    assert instruments.counters["rows fetched"] == 75
+    summary = instruments.summary()
+    assert summary[0].startswith("search: 2 calls") and summary[-1] == "rows fetched: 75"
+    log = read(log_path)
+    assert log.count(" search ") == 2 and "rows fetched: 75" in log
+
+
+def test_nothing_is_recorded_while_disabled():
+    instruments = Instrumentation()
+    instruments.call("search", sorted, [])
+    instruments.count("rows fetched")
+
+    assert instruments.timings == {} and not instruments.counters
+
+
+def test_profiled_call_that_raises_is_still_timed_and_saved(instruments, log_path, tmp_path):
+    def broken():
+        raise ValueError("bad row")
+
+    instruments.profile("import")
+    with pytest.raises(ValueError):
+        instruments.call("import", broken)
+
+    assert instruments.profile_next == set()
+    assert not instruments._profiling
+    assert instruments.timings["import"][0] == 1
+    assert glob.glob(str(tmp_path / "leads-profile-import-*.prof"))
+    assert "Profile of import saved to" in read(log_path)
+    # The next capture can start, and calls after it are only timed
+    instruments.profile("import")
+    assert instruments.call("import", sum, [1, 2]) == 3
+    assert instruments.call("import", sum, [3]) == 3
+    assert not instruments._profiling
+    assert read(log_path).count("Profile of import saved to") == 2
+
+
+def test_timed_functions_drop_arguments_they_do_not_take():
+    class Tab:
+        @instrumented("test_apply_filters")
+        def apply_filters(self):
+            return "filtered"
+
+    @instrumented("test_passes_everything")
+    def passes_everything(*args):
+        return args
+
+    # As Qt calls a slot connected to textChanged(str)
+    assert Tab().apply_filters("smith") == "filtered"
+    assert passes_everything(1, 2, 3) == (1, 2, 3)
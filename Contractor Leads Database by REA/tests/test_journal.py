@@ -0,0 +1,140 @@
+import glob
+import json
+import os
+
+import pytest
+
+from leads_db import LEAD_ID, JsonLeadsStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "leads_data.json")
+
+
+def crash(store):
+    # Leaves the store the way a killed process would: journaled, never saved
+    store.close()
+
+
+def names(store):
+    return [lead["First Name"] for lead in store.load_leads()]
+
+
+def test_changes_are_replayed_after_a_crash(path):
+    store = JsonLeadsStore(path)
+    lead_id = store.add_lead({"First Name": "Ann"})
+    store.update_lead(lead_id, "Notes", "pour in May")
+    crash(store)
+
+    store = JsonLeadsStore(path)
+    assert names(store) == ["Ann"]
+    assert store.fetch_leads_by_ids([lead_id])[0]["Notes"] == "pour in May"
+
+
+def test_torn_entry_is_cut_off_so_later_sessions_are_kept(path):
+    store = JsonLeadsStore(path)
+    first_id = store.add_lead({"First Name": "Ann"})
+    crash(store)
+    with open(path + ".journal", "ab") as file:
+        file.write(b'{"op": "update", "id": 1, "fie')
+
+    store = JsonLeadsStore(path)
+    assert names(store) == ["Ann"]
+    second_id = store.add_lead({"First Name": "Bob"})
+    store.update_lead(first_id, "Notes", "second session")
+    crash(store)
+
+    store = JsonLeadsStore(path)
+    assert names(store) == ["Ann", "Bob"]
+    assert store.fetch_leads_by_ids([first_id])[0]["Notes"] == "second session"
+    assert store.fetch_leads_by_ids([second_id])[0][LEAD_ID] == second_id
+
+
+def test_whole_entry_missing_its_newline_is_kept(path):
+    store = JsonLeadsStore(path)
+    lead_id = store.add_lead({"First Name": "Ann"})
+    crash(store)
+    with open(path + ".journal", "a") as file:
+        file.write(json.dumps({"op": "update", "id": lead_id, "field": "City", "value": "Austin"}))
+
+    store = JsonLeadsStore(path)
+    store.add_lead({"First Name": "Bob"})
+    crash(store)
+
+    store = JsonLeadsStore(path)
+    assert names(store) == ["Ann", "Bob"]
+    assert store.fetch_leads_by_ids([lead_id])[0]["City"] == "Austin"
+
+
+def test_damaged_snapshot_is_moved_aside_with_a_warning(path, caplog):
+    with open(path, "w") as file:
+        file.write('[{"First Name": "Ann"')
+
+    store = JsonLeadsStore(path)
+
+    assert names(store) == []
+    assert "could not be read and was moved to" in caplog.text
+    assert glob.glob(path + ".damaged-*")
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(path):
+    store = JsonLeadsStore(path)
+    lead_id = store.add_lead({"First Name": "Ann"})
+    store.update_lead(lead_id, "City", "Austin")
+    store.compact()
+    crash(store)
+
+    assert not os.path.exists(path + ".journal")
+    with open(path) as file:
+        assert [(lead["First Name"], lead["City"]) for lead in json.load(file)] == [("Ann", "Austin")]
+    assert names(JsonLeadsStore(path)) == ["Ann"]
+
+
+def test_interrupted_compaction_is_finished_on_open(path):
+    store = JsonLeadsStore(path)
+    first_id = store.add_lead({"First Name": "Ann"})
+    crash(store)
+    # Killed after the journal was moved aside, before the snapshot was written
+    os.replace(path + ".journal", path + ".compacting")
+    store = JsonLeadsStore(path)
+    store.add_lead({"First Name": "Bob"})
+    crash(store)
+    os.replace(path + ".journal", path + ".compacting")
+    with open(path + ".journal", "w") as file:
+        file.write(json.dumps({"op": "update", "id": first_id, "field": "City", "value": "Waco"}) + "\n")
+
+    store = JsonLeadsStore(path)
+
+    assert names(store) == ["Ann", "Bob"]
+    assert store.fetch_leads_by_ids([first_id])[0]["City"] == "Waco"
+    assert not os.path.exists(path + ".compacting")
+    assert not os.path.exists(path + ".journal")
+
+
+def test_journal_compacts_itself_once_it_grows(path, monkeypatch):
+    monkeypatch.setattr(JsonLeadsStore, "COMPACT_AFTER", 10)
+    store = JsonLeadsStore(path)
+    store.add_leads([{"First Name": f"Lead {number}"} for number in range(3)])
+    for number in range(12):
+        store.update_lead(1, "Notes", f"edit {number}")
+    store.close()
+
+    with open(path) as file:
+        assert len(json.load(file)) == 3
+    store = JsonLeadsStore(path)
+    assert store.fetch_leads_by_ids([1])[0]["Notes"] == "edit 11"
+
+
+def test_save_without_changes_leaves_the_snapshot_alone(path):
+    store = JsonLeadsStore(path)
+    store.add_lead({"First Name": "Ann"})
+    store.save_leads()
+    modified = os.path.getmtime(path)
+    store.close()
+
+    store = JsonLeadsStore(path)
+    store.save_leads()
+    store.close()
+
+    assert os.path.getmtime(path) == modified
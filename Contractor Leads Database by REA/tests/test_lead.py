@@ -0,0 +1,63 @@
+import pytest
+
+from leads_db import LEAD_FIELDS, LEAD_ID, LEAD_VERSION, Lead
+
+
+def test_fields_are_read_written_and_deleted_like_a_dict():
+    lead = Lead({"First Name": "Ann"})
+    lead["City"] = "Austin"
+
+    assert (lead["First Name"], lead["City"], lead.get("Zip"), lead.get("Zip", "")) == ("Ann", "Austin", None, "")
+    assert "City" in lead and "Zip" not in lead
+    del lead["City"]
+    assert "City" not in lead
+    with pytest.raises(KeyError):
+        lead["City"]
+    with pytest.raises(KeyError):
+        del lead["City"]
+    assert len(lead) == 1
+
+
+def test_fields_from_old_files_are_kept_beside_the_slots():
+    lead = Lead({"First Name": "Ann", "Fax": "512-555-0100"})
+
+    assert lead["Fax"] == "512-555-0100"
+    assert list(lead) == ["First Name", "Fax"]
+    del lead["Fax"]
+    with pytest.raises(KeyError):
+        del lead["Fax"]
+    assert dict(lead) == {"First Name": "Ann"}
+
+
+def test_dict_round_trip_keeps_every_field_in_field_order():
+    values = {LEAD_VERSION: 3, "Notes": "slab", LEAD_ID: 7, "First Name": "Ann", "Lead Status": "Good Lead"}
+    lead = Lead(values)
+
+    assert dict(lead) == values
+    assert list(lead) == [field for field in [*LEAD_FIELDS, LEAD_ID, LEAD_VERSION] if field in values]
+    assert Lead(dict(lead)) == lead == values
+    copy = lead.copy()
+    copy["Notes"] = "driveway"
+    assert lead["Notes"] == "slab"
+
+
+def test_repeated_values_are_shared():
+    # Built at run time, so they start out as separate strings
+    first = Lead({"Lead Status": "".join(["Good", " Lead"]), "City": "".join(["Aus", "tin"])})
+    second = Lead({})
+    second["Lead Status"] = "".join(["Good ", "Lead"])
+    second["City"] = "".join(["Au", "stin"])
+
+    assert first["Lead Status"] is second["Lead Status"]
+    assert first["City"] is second["City"]
+
+
+def test_from_row_reads_a_sqlite_row():
+    columns = {field: "" for field in LEAD_FIELDS}
+    columns.update({"First Name": "Ann", "Lead Status": "".join(["Clo", "sed"])})
+    lead = Lead.from_row((5, *columns.values(), 2))
+
+    assert lead[LEAD_ID] == 5 and lead[LEAD_VERSION] == 2
+    assert dict(lead) == {**columns, LEAD_ID: 5, LEAD_VERSION: 2}
+    assert lead["Lead Status"] is Lead({"Lead Status": "Closed"})["Lead Status"]
+    assert LEAD_VERSION not in Lead.from_row((5, *columns.values()))
@@ -0,0 +1,43 @@
+import os
+
+
+def write_logo(path, width=600, height=300):
+    from PyQt5.QtGui import QImage
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(0x336699)
+    assert image.save(path)
+
+
+def test_missing_logo_gives_an_empty_pixmap(app, tmp_path):
+    assert app.load_logo(str(tmp_path / "logo.png")).isNull()
+
+
+def test_scaled_logo_is_cached_once_and_reused(app, tmp_path):
+    path = str(tmp_path / "logo.png")
+    cache_path = str(tmp_path / "logo.150px.png")
+    write_logo(path)
+
+    pixmap = app.load_logo(path)
+    assert (pixmap.width(), pixmap.height()) == (150, 75)
+    assert os.path.exists(cache_path)
+
+    # A second launch reads the cache instead of scaling and saving again
+    logo_time = os.path.getmtime(path)
+    os.utime(cache_path, (logo_time + 10, logo_time + 10))
+    pixmap = app.load_logo(path)
+    assert (pixmap.width(), pixmap.height()) == (150, 75)
+    assert os.path.getmtime(cache_path) == logo_time + 10
+
+
+def test_changed_logo_replaces_the_cache(app, tmp_path):
+    path = str(tmp_path / "logo.png")
+    cache_path = str(tmp_path / "logo.150px.png")
+    write_logo(path)
+    app.load_logo(path)
+
+    write_logo(path, 300, 300)
+    logo_time = os.path.getmtime(path)
+    os.utime(cache_path, (logo_time - 10, logo_time - 10))
+    pixmap = app.load_logo(path)
+    assert (pixmap.width(), pixmap.height()) == (150, 150)
+    assert os.path.getmtime(cache_path) > logo_time - 10
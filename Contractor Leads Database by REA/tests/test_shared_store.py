@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from leads_db import LEAD_ID, LEAD_VERSION, SqliteLeadsStore
+
+LEADS_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "leads_db.py")
+
+
+@pytest.fixture
+def stores(tmp_path):
+    # Two clients on one database file, as two estimators' apps would be
+    path = str(tmp_path / "leads_data.db")
+    first = SqliteLeadsStore(path, json_path=None, user="ann")
+    second = SqliteLeadsStore(path, json_path=None, user="bob")
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_edit_against_an_old_version_is_refused(stores):
+    first, second = stores
+    lead_id = first.add_lead({"First Name": "Ann"})
+    seen_by_second = second.fetch_leads_by_ids([lead_id])[0]
+
+    assert first.update_leads([(lead_id, "City", "Austin")], {lead_id: 1}) == set()
+    refused = second.update_leads([(lead_id, "City", "Waco")], {lead_id: seen_by_second[LEAD_VERSION]})
+
+    assert refused == {lead_id}
+    lead = second.fetch_leads_by_ids([lead_id])[0]
+    assert (lead["City"], lead[LEAD_VERSION]) == ("Austin", 2)
+
+
+def test_changes_since_lists_other_clients_changes(stores):
+    first, second = stores
+    seq = second.latest_change()
+    lead_id = first.add_lead({"First Name": "Ann", "City": "Austin"})
+    first.update_leads([(lead_id, "City", "Waco")])
+    first.delete_lead(lead_id)
+
+    latest, changes = second.changes_since(seq)
+    assert [(changed_id, op) for changed_id, op, data in changes] == [(lead_id, "add"), (lead_id, "update"), (lead_id, "delete")]
+    # The update carries the value from before it
+    assert changes[1][2] == {"City": "Austin"}
+    # A client's own changes are never polled back to it
+    assert first.changes_since(seq) == (latest, [])
+    assert second.changes_since(latest) == (latest, [])
+
+
+def test_gap_in_the_change_log_asks_for_a_reload(stores):
+    first, second = stores
+    lead_id = first.add_lead({"First Name": "Ann"})
+    seq = second.latest_change()
+    first.update_leads([(lead_id, "City", "Austin")])
+    first.update_leads([(lead_id, "City", "Waco")])
+    # As pruning old entries would leave it
+    with first.conn:
+        first.conn.execute("DELETE FROM changes WHERE seq = ?", (seq + 1,))
+
+    latest, changes = second.changes_since(seq)
+    assert changes is None
+    assert latest == first.latest_change()
+
+
+def test_bulk_import_asks_for_a_reload(stores):
+    first, second = stores
+    seq = second.latest_change()
+    first.add_leads([{"First Name": "Ann"}, {"First Name": "Bob"}])
+    assert second.changes_since(seq)[1] is None
+
+
+def test_clients_in_separate_processes(tmp_path):
+    store = SqliteLeadsStore(str(tmp_path / "leads_data.db"), json_path=None)
+    try:
+        lead_id = store.add_lead({"First Name": "Ann"})
+        seq = store.latest_change()
+        store.update_leads([(lead_id, "City", "Austin")], {lead_id: 1})
+
+        def update(version, city):
+            return subprocess.run([sys.executable, LEADS_DB, "--store", "sqlite", "update", str(lead_id), "--if-version", str(version), f"City={city}"],
+                                  cwd=tmp_path, capture_output=True, text=True)
+
+        stale = update(1, "Waco")
+        assert stale.returncode != 0 and "no longer at version 1" in stale.stderr
+        assert update(2, "Dallas").returncode == 0
+
+        latest, changes = store.changes_since(seq)
+        assert [(changed_id, op, data) for changed_id, op, data in changes] == [(lead_id, "update", {"City": "Austin"})]
+        lead = store.fetch_leads_by_ids([lead_id])[0]
+        assert (lead["City"], lead[LEAD_VERSION], lead[LEAD_ID]) == ("Dallas", 3, lead_id)
+    finally:
+        store.close()
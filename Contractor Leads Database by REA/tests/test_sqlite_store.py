@@ -0,0 +1,156 @@
+import json
+import sqlite3
+
+import pytest
+
+from leads_db import LEAD_FIELDS, LEAD_ID, LEAD_VERSION, JsonLeadsStore, SqliteLeadsStore, new_lead
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "leads_data.db"), str(tmp_path / "leads_data.json")
+
+
+def test_json_leads_and_their_journal_move_into_a_new_database(paths):
+    db_path, json_path = paths
+    json_store = JsonLeadsStore(json_path)
+    json_store.add_leads([{"First Name": "Ann", "Notes": "slab pour"}, {"First Name": "Bob"}])
+    json_store.save_leads()
+    json_store.update_lead(2, "City", "Waco")
+    json_store.close()
+
+    store = SqliteLeadsStore(db_path, json_path=json_path)
+    try:
+        leads = store.load_leads()
+        assert [(lead[LEAD_ID], lead["First Name"], lead["City"]) for lead in leads] == [(1, "Ann", ""), (2, "Bob", "Waco")]
+        assert [lead_id for lead_id, score in store.search_notes("sla")] == [1]
+    finally:
+        store.close()
+
+
+def test_json_file_is_only_migrated_once(paths):
+    db_path, json_path = paths
+    with open(json_path, "w") as file:
+        json.dump([{"First Name": "Ann"}], file)
+    SqliteLeadsStore(db_path, json_path=json_path).close()
+
+    store = SqliteLeadsStore(db_path, json_path=json_path)
+    try:
+        assert store.count_leads() == 1
+    finally:
+        store.close()
+
+
+def first_schema(db_path):
+    # A version 1 database, before follow-ups, row versions and history
+    columns = ", ".join(f"{column} TEXT NOT NULL DEFAULT ''" for field, column in LEAD_FIELDS.items() if field != "Follow Up")
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE leads (id INTEGER PRIMARY KEY, {columns})")
+    conn.execute("PRAGMA user_version = 1")
+    return conn
+
+
+def test_first_schema_is_upgraded_in_place(paths):
+    db_path, json_path = paths
+    conn = first_schema(db_path)
+    conn.execute("INSERT INTO leads (first_name, notes) VALUES ('Ann', 'driveway quote')")
+    conn.commit()
+    conn.close()
+
+    store = SqliteLeadsStore(db_path, json_path=None)
+    try:
+        lead = store.load_leads()[0]
+        assert (lead["First Name"], lead["Follow Up"], lead[LEAD_VERSION]) == ("Ann", "", 1)
+        assert store.update_leads([(1, "Follow Up", "2030-01-01")], {1: 1}) == set()
+        assert store.follow_ups_due("2031-01-01") == [("2030-01-01", 1)]
+        assert [lead_id for lead_id, score in store.search_notes("drive")] == [1]
+    finally:
+        store.close()
+
+
+def test_upgrade_hands_out_ids_past_every_lead_in_the_history(paths):
+    db_path, json_path = paths
+    conn = first_schema(db_path)
+    conn.execute("INSERT INTO leads (first_name) VALUES ('Ann')")
+    # Lead 2 was deleted, and only the history remembers it
+    conn.execute("CREATE TABLE history (lead_id INTEGER NOT NULL, time REAL NOT NULL, "
+                 "user TEXT NOT NULL, field TEXT NOT NULL, old TEXT, new TEXT)")
+    conn.execute("INSERT INTO history VALUES (2, 1, 'ann', 'first_name', 'Bob', NULL)")
+    conn.commit()
+    conn.close()
+
+    store = SqliteLeadsStore(db_path, json_path=None)
+    try:
+        assert store.add_lead({"First Name": "Cy"}) == 3
+        store.delete_lead(3)
+        assert store.add_lead({"First Name": "Dee"}) == 4
+    finally:
+        store.close()
+
+
+@pytest.fixture
+def store(paths):
+    store = SqliteLeadsStore(paths[0], json_path=None, user="ann")
+    yield store
+    store.close()
+
+
+def test_edit_to_a_deleted_lead_is_refused(store):
+    lead_id = store.add_lead({"First Name": "Ann"})
+    store.delete_lead(lead_id)
+
+    assert store.update_leads([(lead_id, "City", "Austin")], {lead_id: 1}) == {lead_id}
+
+
+def test_unversioned_edit_always_applies(store):
+    lead_id = store.add_lead({"First Name": "Ann"})
+    store.update_leads([(lead_id, "City", "Austin")])
+
+    assert store.update_leads([(lead_id, "City", "Waco")]) == set()
+    assert store.fetch_leads_by_ids([lead_id])[0][LEAD_VERSION] == 3
+
+
+def test_history_records_adds_edits_and_deletes(store):
+    lead_id = store.add_lead(new_lead({"First Name": "Ann"}))
+    store.update_leads([(lead_id, "City", "Austin"), (lead_id, "First Name", "Ann")])
+    store.delete_lead(lead_id)
+
+    changes = [(user, field, old, new) for when, changed_id, user, field, old, new in store.lead_history(lead_id)]
+    assert changes[:2] == [("ann", "Lead Status", None, "In System"), ("ann", "City", "", "Austin")]
+    assert sorted(changes[2:]) == [("ann", "City", "Austin", None), ("ann", "First Name", "Ann", None),
+                                   ("ann", "Job Type", "Unknown", None), ("ann", "Lead Status", "In System", None)]
+
+
+def test_new_lead_does_not_take_a_deleted_leads_id_or_history(store):
+    store.add_lead({"First Name": "Ann"})
+    bob = store.add_lead({"First Name": "Bob"})
+    store.update_leads([(bob, "City", "Austin")])
+    store.delete_lead(bob)
+    cy = store.add_lead({"First Name": "Cy"})
+    store.add_leads([{"First Name": "Dee"}])
+
+    assert cy == bob + 1
+    assert [entry[3:] for entry in store.lead_history(cy)] == [("Lead Status", None, "In System")]
+    assert store.conn.execute("SELECT op FROM changes WHERE lead_id = ?", (cy,)).fetchall() == [("add",)]
+
+
+def test_history_between_is_limited_to_its_window(store):
+    lead_id = store.add_lead({"First Name": "Ann"})
+    store.update_leads([(lead_id, "City", "Austin")])
+    when = store.lead_history(lead_id)[-1][0]
+
+    assert [entry[3] for entry in store.history_between(when, when + 1, newest_first=True)][:1] == ["City"]
+    assert store.history_between(when + 1, when + 2) == []
+
+
+def test_notes_search_follows_edits_and_deletes(store):
+    first = store.add_lead({"First Name": "Ann", "Notes": "Concrete driveway, concrete steps"})
+    second = store.add_lead({"First Name": "Bob", "Notes": "Concrete patio"})
+
+    assert [lead_id for lead_id, score in store.search_notes("concrete")] == [first, second]
+    assert [lead_id for lead_id, score in store.search_notes("concr patio")] == [second]
+
+    store.update_leads([(second, "Notes", "Asphalt patio")])
+    assert [lead_id for lead_id, score in store.search_notes("concrete")] == [first]
+    store.delete_lead(first)
+    assert store.search_notes("concrete") == []
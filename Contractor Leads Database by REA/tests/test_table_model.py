@@ -0,0 +1,235 @@
+import time
+
+import pytest
+
+from leads_db import LEAD_ID, JsonLeadsStore, SqliteLeadsStore
+
+
+@pytest.fixture
+def table(app, tmp_path):
+    path = str(tmp_path / "leads_data.db")
+    store = SqliteLeadsStore(path, json_path=None)
+    store.add_leads([{"First Name": "Amy", "Last Name": "Carter"}, {"First Name": "Ben", "Last Name": "Adams"}, {"First Name": "Cal", "Last Name": "Baker"}])
+    other = SqliteLeadsStore(path, json_path=None)
+    scheduler = app.TaskScheduler(store)
+    tab = app.LeadsTableTab([], store, scheduler)
+    tab.model.poll_timer.stop()
+    yield tab, other
+    scheduler.shutdown()
+    tab.deleteLater()
+    store.close()
+    other.close()
+
+
+@pytest.fixture
+def json_table(app, tmp_path):
+    store = JsonLeadsStore(str(tmp_path / "leads_data.json"))
+    store.add_leads([{"First Name": "Amy", "Last Name": "Carter"}, {"First Name": "Ben", "Last Name": "Adams"}, {"First Name": "Cal", "Last Name": "Baker"}])
+    scheduler = app.TaskScheduler(store)
+    tab = app.LeadsTableTab([], store, scheduler)
+    tab.model.poll_timer.stop()
+    yield tab
+    scheduler.shutdown()
+    tab.deleteLater()
+    store.close()
+
+
+def wait_for_tasks(app, scheduler):
+    deadline = time.time() + 10
+    while scheduler.tasks and time.time() < deadline:
+        app.QApplication.processEvents()
+    app.QApplication.processEvents()
+
+
+def wait_for_notes_search(app, tab):
+    deadline = time.time() + 10
+    while tab.notes_timer.isActive() and time.time() < deadline:
+        app.QApplication.processEvents()
+    wait_for_tasks(app, tab.scheduler)
+
+
+def shown_ids(tab):
+    model = tab.model
+    while model.canFetchMore():
+        model.fetchMore()
+    return [lead[LEAD_ID] for lead in model.leads_list]
+
+
+def test_lead_added_by_another_client_appears_in_a_sorted_view(app, table):
+    tab, other = table
+    tab.table.horizontalHeader().setSortIndicator(app.TABLE_COLUMNS.index("Last Name"), app.Qt.AscendingOrder)
+    wait_for_tasks(app, tab.scheduler)
+    before = shown_ids(tab)
+
+    carl_id = other.add_lead({"First Name": "Carl", "Last Name": "Zed"})
+    tab.model.poll_changes()
+
+    assert shown_ids(tab) == before + [carl_id]
+    assert tab.model.rowCount() == tab.model._total == 4
+
+
+def sort_by(app, tab, field, order):
+    tab.table.horizontalHeader().setSortIndicator(app.TABLE_COLUMNS.index(field), order)
+    wait_for_tasks(app, tab.scheduler)
+
+
+def test_sorted_view_breaks_ties_by_the_column_sorted_before(app, table):
+    tab, other = table
+    amy, ben, cal = shown_ids(tab)
+    tab.model.update_lead(cal, "Last Name", "Adams")
+
+    sort_by(app, tab, "First Name", app.Qt.DescendingOrder)
+    assert shown_ids(tab) == [cal, ben, amy]
+    sort_by(app, tab, "Last Name", app.Qt.AscendingOrder)
+    assert shown_ids(tab) == [cal, ben, amy]
+    sort_by(app, tab, "Last Name", app.Qt.DescendingOrder)
+    assert shown_ids(tab) == [amy, cal, ben]
+    assert tab.sort_columns == [("Last Name", True), ("First Name", True)]
+
+
+def test_new_lead_shows_last_until_the_view_is_sorted_again(app, table):
+    tab, other = table
+    amy, ben, cal = shown_ids(tab)
+    sort_by(app, tab, "Last Name", app.Qt.AscendingOrder)
+    assert shown_ids(tab) == [ben, cal, amy]
+
+    dee = tab.model.append_lead({"First Name": "Dee", "Last Name": "Abbot"})
+    assert shown_ids(tab) == [ben, cal, amy, dee]
+    assert tab.model.rowCount() == 4
+
+    sort_by(app, tab, "Last Name", app.Qt.DescendingOrder)
+    sort_by(app, tab, "Last Name", app.Qt.AscendingOrder)
+    assert shown_ids(tab) == [dee, ben, cal, amy]
+
+
+def test_lead_added_by_another_client_appears_in_a_notes_search(app, table):
+    tab, other = table
+    tab.notes_filter.setText("slab")
+    wait_for_notes_search(app, tab)
+    assert shown_ids(tab) == []
+
+    carl_id = other.add_lead({"First Name": "Carl", "Notes": "slab pour"})
+    other.add_lead({"First Name": "Dora", "Notes": "driveway"})
+    tab.model.poll_changes()
+
+    assert shown_ids(tab) == [carl_id]
+
+
+def test_notes_search_waits_for_typing_to_pause(app, table, monkeypatch):
+    tab, other = table
+    searches = []
+    # Searches run against the worker thread's own handle for the store
+    monkeypatch.setattr(SqliteLeadsStore, "search_notes", lambda store, query, limit=None: searches.append(query) or [])
+    for length in range(1, len("slab") + 1):
+        tab.notes_filter.setText("slab"[:length])
+    assert searches == []
+
+    wait_for_notes_search(app, tab)
+
+    assert searches == ["slab"]
+    assert shown_ids(tab) == []
+
+
+def test_lead_added_by_another_client_is_filtered_by_search(app, table):
+    tab, other = table
+    tab.search_input.setText("carl")
+    wait_for_tasks(app, tab.scheduler)
+    assert shown_ids(tab) == []
+
+    carl_id = other.add_lead({"First Name": "Carl", "Last Name": "Zed"})
+    other.add_lead({"First Name": "Dora", "Last Name": "Young"})
+    tab.model.poll_changes()
+
+    assert shown_ids(tab) == [carl_id]
+
+
+def test_merge_keeps_the_oldest_lead_and_removes_the_others(app, table):
+    tab, other = table
+    amy, ben, cal = shown_ids(tab)
+    tab.model.update_lead(ben, "Phone", "512-555-0100")
+
+    assert tab.merge_duplicates([amy, ben])
+
+    assert shown_ids(tab) == [amy, cal]
+    assert tab.model.leads_list[0]["Phone"] == "512-555-0100"
+    assert [lead[LEAD_ID] for lead in other.load_leads()] == [amy, cal]
+    assert other.fetch_leads_by_ids([amy])[0]["Phone"] == "512-555-0100"
+
+
+def test_merge_on_a_json_store_updates_the_indexes(app, json_table):
+    tab = json_table
+    amy, ben, cal = shown_ids(tab)
+    tab.model.update_lead(ben, "Email", "acarter@example.com")
+    tab.search_input.setText("acarter")
+    wait_for_tasks(app, tab.scheduler)
+    assert shown_ids(tab) == [ben]
+    updates = []
+    tab.model.lead_updated.connect(lambda lead, field, old_value: updates.append((lead[LEAD_ID], field, old_value)))
+
+    assert tab.merge_duplicates([amy, ben])
+
+    assert updates == [(amy, "Email", "")]
+    tab.apply_filters()
+    assert shown_ids(tab) == [amy]
+
+
+def test_edits_are_written_when_the_user_stops_editing(app, table):
+    tab, other = table
+    amy, ben, cal = shown_ids(tab)
+    tab.model.update_lead(amy, "City", "Austin")
+    tab.editor_closed(None, app.QAbstractItemDelegate.EditNextItem)
+    assert other.fetch_leads_by_ids([amy])[0]["City"] == ""
+
+    tab.editor_closed(None, app.QAbstractItemDelegate.NoHint)
+
+    assert other.fetch_leads_by_ids([amy])[0]["City"] == "Austin"
+
+
+def test_dashboard_replays_changes_made_while_it_loads(app, table):
+    tab, other = table
+    dashboard = app.DashboardTab(tab, tab.scheduler)
+    dashboard.stats.load()
+    amy = shown_ids(tab)[0]
+    tab.model.update_lead(amy, "Lead Status", "Closed")
+    wait_for_tasks(app, tab.scheduler)
+
+    assert dashboard.stats.value.built
+    assert dict(dashboard.stats.value.breakdown("Lead Status")) == {"In System": 2, "Closed": 1}
+
+
+def test_cancelled_dashboard_load_is_not_restarted(app, table):
+    tab, other = table
+    dashboard = app.DashboardTab(tab, tab.scheduler)
+    dashboard.stats.is_wanted = lambda: True
+    starts = []
+
+    def cancelled_load(store, report_progress=None, is_cancelled=None):
+        raise app.TaskCancelled()
+
+    def start_load():
+        starts.append(1)
+        return tab.run_task("Counting leads...", cancelled_load)
+
+    dashboard.stats.start_task = start_load
+    dashboard.stats.load()
+    tab.model.update_lead(shown_ids(tab)[0], "Lead Status", "Closed")
+    dashboard.stats.task.cancel()
+    wait_for_tasks(app, tab.scheduler)
+
+    assert starts == [1]
+    assert dashboard.stats.task is None
+    assert dashboard.total_label.text() == "Counts are not loaded."
+
+
+def test_cancelled_import_tells_the_user_what_was_kept(app, table, monkeypatch):
+    tab, other = table
+    messages = []
+    monkeypatch.setattr(app.QMessageBox, "information", lambda parent, title, text: messages.append((title, text)))
+    other.add_lead({"First Name": "Dora"})
+
+    tab.import_finished({"imported": 1, "rejected": 2, "rejects_file": "leads_rejects.csv", "cancelled": True})
+
+    assert len(shown_ids(tab)) == 4
+    (title, text), = messages
+    assert title == "Import Cancelled"
+    assert "1 leads imported" in text and "2 rows were rejected" in text and "leads_rejects.csv" in text
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from leads_db import LEAD_ID, LEAD_VERSION, Lead, SqliteLeadsStore
+
+
+class Store:
+    # Records update_leads calls and refuses the leads in refused
+    def __init__(self, refused=()):
+        self.writes = []
+        self.refused = set(refused)
+
+    def update_leads(self, changes, versions=None):
+        self.writes.append((changes, versions))
+        return self.refused & {lead_id for lead_id, field, value in changes}
+
+
+def lead(lead_id, version=1):
+    return Lead({LEAD_ID: lead_id, LEAD_VERSION: version})
+
+
+def test_edits_to_one_field_collapse_into_the_last(app):
+    store = Store()
+    writes = app.WriteBehindQueue(store)
+    first, second = lead(1), lead(2)
+    writes.queue(first, "City", "Aus")
+    writes.queue(second, "City", "Waco")
+    writes.queue(first, "City", "Austin")
+    writes.flush()
+
+    assert store.writes == [([(2, "City", "Waco"), (1, "City", "Austin")], {1: 1, 2: 1})]
+    assert (first[LEAD_VERSION], second[LEAD_VERSION]) == (2, 2)
+    writes.flush()
+    assert len(store.writes) == 1
+
+
+def test_edits_are_written_once_typing_pauses(app):
+    store = Store()
+    writes = app.WriteBehindQueue(store)
+    writes.timer.setInterval(20)
+    writes.queue(lead(1), "City", "Austin")
+    writes.queue(lead(1), "State", "TX")
+    assert store.writes == []
+
+    deadline = time.time() + 5
+    while writes.timer.isActive() and time.time() < deadline:
+        app.QApplication.processEvents()
+
+    assert store.writes == [([(1, "City", "Austin"), (1, "State", "TX")], {1: 1})]
+
+
+def test_discarded_lead_is_not_written(app):
+    store = Store()
+    writes = app.WriteBehindQueue(store)
+    writes.queue(lead(1), "City", "Austin")
+    writes.queue(lead(2), "City", "Waco")
+    writes.discard_lead(1)
+    writes.flush()
+
+    assert store.writes == [([(2, "City", "Waco")], {2: 1})]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    path = str(tmp_path / "leads_data.db")
+    first = SqliteLeadsStore(path, json_path=None, user="ann")
+    second = SqliteLeadsStore(path, json_path=None, user="bob")
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_edits_refused_by_a_shared_store_are_reported(app, stores):
+    first, second = stores
+    ann = first.add_lead({"First Name": "Ann"})
+    bob = first.add_lead({"First Name": "Bob"})
+    seen_ann, seen_bob = first.fetch_leads_by_ids([ann, bob])
+    second.update_leads([(ann, "City", "Waco")])
+    writes = app.WriteBehindQueue(first)
+    conflicts = []
+    writes.conflicted.connect(conflicts.append)
+
+    writes.queue(seen_ann, "City", "Austin")
+    writes.queue(seen_ann, "State", "TX")
+    writes.queue(seen_bob, "City", "Austin")
+    writes.flush()
+
+    assert conflicts == [{ann: {"City": "Austin", "State": "TX"}}]
+    assert (seen_ann[LEAD_VERSION], seen_bob[LEAD_VERSION]) == (1, 2)
+    ann_now, bob_now = second.fetch_leads_by_ids([ann, bob])
+    assert (ann_now["City"], ann_now["State"], bob_now["City"]) == ("Waco", "", "Austin")